@@ -0,0 +1,113 @@
+"""
+In-process publish/subscribe of live events, served as Server-Sent Events
+
+Same events and wire format as the Django backend (inventory_app/events.py):
+uploads publish "detection" and "counts" events after their commit and
+GET /api/v1/events streams them. Each subscriber has a bounded queue
+(SSE_QUEUE_SIZE); a subscriber that falls that far behind is dropped and
+its stream ends with a "reset" event. Reconnecting clients get the events
+after their Last-Event-ID replayed from the last SSE_HISTORY events.
+
+Everything runs on the application's event loop, so an idle subscriber
+is one suspended coroutine and a small queue. Events only reach clients
+of the worker process that published them.
+"""
+import asyncio
+import json
+import os
+from collections import deque
+from typing import AsyncIterator, Deque, Dict, Optional, Set, Tuple
+
+SSE_QUEUE_SIZE = int(os.getenv("SSE_QUEUE_SIZE", 100))
+SSE_HISTORY = int(os.getenv("SSE_HISTORY", 256))
+SSE_MAX_SUBSCRIBERS = int(os.getenv("SSE_MAX_SUBSCRIBERS", 10000))
+SSE_HEARTBEAT = float(os.getenv("SSE_HEARTBEAT", 15))
+
+# Reconnect delay for EventSource, and a comment so proxies see bytes at once
+PREAMBLE = b"retry: 3000\n: connected\n\n"
+KEEPALIVE = b": keepalive\n\n"
+
+_DROPPED = object()
+
+
+def format_event(event_id: Optional[int], event: str, data) -> bytes:
+    """One SSE message"""
+    payload = json.dumps(data, default=str, ensure_ascii=False, separators=(",", ":"))
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: {payload}\n\n".encode("utf-8")
+
+
+class EventBroker:
+    """Fans published events out to subscriber queues"""
+
+    def __init__(self, queue_size: int = SSE_QUEUE_SIZE, history: int = SSE_HISTORY,
+                 max_subscribers: int = SSE_MAX_SUBSCRIBERS):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self._history: Deque[Tuple[int, bytes]] = deque(maxlen=history)
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._last_id = 0
+        self.dropped = 0
+
+    def publish(self, event: str, data) -> int:
+        """Send an event to every subscriber; returns its id"""
+        self._last_id += 1
+        message = format_event(self._last_id, event, data)
+        self._history.append((self._last_id, message))
+        for subscriber in list(self._subscribers):
+            try:
+                subscriber.put_nowait(message)
+            except asyncio.QueueFull:
+                self._drop(subscriber)
+        return self._last_id
+
+    def _drop(self, subscriber: asyncio.Queue):
+        self._subscribers.discard(subscriber)
+        self.dropped += 1
+        while not subscriber.empty():
+            subscriber.get_nowait()
+        subscriber.put_nowait(_DROPPED)
+
+    def subscribe(self, last_event_id: Optional[int] = None) -> Optional[asyncio.Queue]:
+        """A new subscriber queue holding the events after last_event_id; None when full"""
+        if len(self._subscribers) >= self.max_subscribers:
+            return None
+        subscriber = asyncio.Queue(self.queue_size)
+        if last_event_id is not None:
+            missed = [message for event_id, message in self._history if event_id > last_event_id]
+            oldest = self._history[0][0] if self._history else self._last_id + 1
+            if not oldest - 1 <= last_event_id <= self._last_id or len(missed) > self.queue_size:
+                subscriber.put_nowait(format_event(None, "reset", {"reason": "missed events"}))
+            else:
+                for message in missed:
+                    subscriber.put_nowait(message)
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: asyncio.Queue):
+        self._subscribers.discard(subscriber)
+
+    def stats(self) -> Dict[str, int]:
+        return {"subscribers": len(self._subscribers), "dropped": self.dropped}
+
+    async def stream(self, subscriber: asyncio.Queue, is_disconnected) -> AsyncIterator[bytes]:
+        """Messages for a StreamingResponse, with keepalive comments while idle"""
+        try:
+            yield PREAMBLE
+            while True:
+                try:
+                    message = await asyncio.wait_for(subscriber.get(), SSE_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    if await is_disconnected():
+                        return
+                    yield KEEPALIVE
+                    continue
+                if message is _DROPPED:
+                    yield format_event(None, "reset", {"reason": "too slow"})
+                    return
+                yield message
+        finally:
+            self.unsubscribe(subscriber)
+
+
+broker = EventBroker()
@@ -0,0 +1,85 @@
+"""
+Minimal HTTP load generator for comparing request concurrency
+
+Usage:
+    python -m app.loadtest http://localhost:8000/api/v1/analytics/weekly --concurrency 1,8,32
+
+For each concurrency level it keeps that many keep-alive connections busy
+for --duration seconds and reports requests per second and latency
+percentiles. If the server serializes on database calls, throughput stays
+flat as concurrency grows and latency grows with it.
+"""
+import argparse
+import asyncio
+import time
+from typing import Dict, List
+from urllib.parse import urlsplit
+
+
+async def _worker(host: str, port: int, request: bytes, deadline: float, latencies: List[float], errors: List[int]):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            writer.write(request)
+            await writer.drain()
+            status_line = await reader.readline()
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                if name.lower() == "content-length":
+                    length = int(value.strip())
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - start)
+            if not status_line.split(b" ")[1].startswith(b"2"):
+                errors.append(1)
+    finally:
+        writer.close()
+
+
+async def run_level(url: str, concurrency: int, duration: float) -> Dict:
+    """Drive url with concurrency connections for duration seconds"""
+    parts = urlsplit(url)
+    path = parts.path + (f"?{parts.query}" if parts.query else "")
+    request = (
+        f"GET {path or '/'} HTTP/1.1\r\nHost: {parts.netloc}\r\n"
+        f"Connection: keep-alive\r\n\r\n"
+    ).encode("ascii")
+    latencies: List[float] = []
+    errors: List[int] = []
+    deadline = time.perf_counter() + duration
+    await asyncio.gather(*[
+        _worker(parts.hostname, parts.port or 80, request, deadline, latencies, errors)
+        for _ in range(concurrency)
+    ])
+    latencies.sort()
+
+    def percentile(p: float) -> float:
+        return latencies[min(int(len(latencies) * p), len(latencies) - 1)] * 1000 if latencies else 0.0
+
+    return {
+        "concurrency": concurrency,
+        "requests_per_s": round(len(latencies) / duration, 1),
+        "p50_ms": round(percentile(0.50), 1),
+        "p99_ms": round(percentile(0.99), 1),
+        "errors": len(errors),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("url")
+    parser.add_argument("--concurrency", default="1,8,32", help="Comma-separated concurrency levels")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per level")
+    args = parser.parse_args()
+
+    for level in (int(c) for c in args.concurrency.split(",")):
+        result = asyncio.run(run_level(args.url, level, args.duration))
+        print("  ".join(f"{key}={value}" for key, value in result.items()))
+
+
+if __name__ == "__main__":
+    main()
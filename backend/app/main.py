@@ -1,10 +1,12 @@
 """
 FastAPI main application entry point
 """
-from fastapi import FastAPI
+import asyncio
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
-from app.database import engine, Base
-from app.routers import images, analytics, recommendations, products
+from app.database import engine, async_engine, async_read_engine, Base, READ_DATABASE_URL, heartbeat_loop
+from app.metrics import MetricsMiddleware, instrument_engine, render_metrics
+from app.routers import images, analytics, recommendations, products, events
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
@@ -24,11 +26,19 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request duration, SQL and stage histograms (app/metrics.py); added last so it wraps everything
+app.add_middleware(MetricsMiddleware)
+instrument_engine(engine)
+instrument_engine(async_engine.sync_engine)
+if async_read_engine is not None:
+    instrument_engine(async_read_engine.sync_engine)
+
 # Include routers
 app.include_router(images.router, prefix="/api/v1", tags=["images"])
 app.include_router(analytics.router, prefix="/api/v1", tags=["analytics"])
 app.include_router(recommendations.router, prefix="/api/v1", tags=["recommendations"])
 app.include_router(products.router, prefix="/api/v1", tags=["products"])
+app.include_router(events.router, prefix="/api/v1", tags=["events"])
 
 
 @app.get("/")
@@ -41,5 +51,27 @@ async def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape target"""
+    return Response(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.on_event("startup")
+async def start_heartbeat():
+    """Stamp the primary so get_read_db can measure replica lag (app/database.py)"""
+    if READ_DATABASE_URL and not READ_DATABASE_URL.startswith("sqlite"):
+        app.state.heartbeat = asyncio.create_task(heartbeat_loop())
+
+
+@app.on_event("shutdown")
+async def dispose_engine():
+    if getattr(app.state, "heartbeat", None) is not None:
+        app.state.heartbeat.cancel()
+    await async_engine.dispose()
+    if async_read_engine is not None:
+        await async_read_engine.dispose()
+
+
 
 
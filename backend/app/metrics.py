@@ -0,0 +1,221 @@
+"""
+Per-request performance metrics in the Prometheus text format
+
+Same metrics as the Django backend (inventory_app/metrics.py):
+MetricsMiddleware times every request and counts the SQL statements it
+ran (SQLAlchemy cursor events on every engine), span() marks the
+'decode', 'infer', 'postprocess', 'storage' and 'db' stages of an
+upload, and GET /metrics serves the histograms:
+
+    http_request_duration_seconds{method, route, status}
+    http_request_db_queries{method, route}
+    http_request_db_seconds{method, route}
+    stage_duration_seconds{stage}
+
+route is the path template of the matched route. With SERVER_TIMING the
+current request's figures are also sent in a Server-Timing header.
+Durations run to the response headers, and metrics are per worker
+process.
+"""
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Sequence, Tuple
+from sqlalchemy import event
+from starlette.routing import Match
+
+SERVER_TIMING = os.getenv("SERVER_TIMING", "false").lower() in ("1", "true", "yes")
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+METHODS = ("GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS")
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Prometheus histogram with one series per combination of label values"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str], buckets: Sequence[float]):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [count per bucket..., count above the last bucket, sum]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = sorted((labels, list(series)) for labels, series in self._series.items())
+        for labels, series in snapshot:
+            label_text = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, labels))
+            prefix = label_text + "," if label_text else ""
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{_format_number(bound)}"}} {cumulative}')
+            cumulative += series[len(self.buckets)]
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {cumulative}')
+            braces = f"{{{label_text}}}" if label_text else ""
+            lines.append(f"{self.name}_sum{braces} {series[-1]!r}")
+            lines.append(f"{self.name}_count{braces} {cumulative}")
+        return lines
+
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Time to produce the response, in seconds.",
+    ("method", "route", "status"), DURATION_BUCKETS
+)
+REQUEST_QUERIES = Histogram(
+    "http_request_db_queries", "SQL queries run by the request.",
+    ("method", "route"), QUERY_BUCKETS
+)
+REQUEST_QUERY_SECONDS = Histogram(
+    "http_request_db_seconds", "Time spent in SQL queries by the request, in seconds.",
+    ("method", "route"), DURATION_BUCKETS
+)
+STAGE_SECONDS = Histogram(
+    "stage_duration_seconds", "Time spent in a named processing stage, in seconds.",
+    ("stage",), DURATION_BUCKETS
+)
+REGISTRY = (REQUEST_SECONDS, REQUEST_QUERIES, REQUEST_QUERY_SECONDS, STAGE_SECONDS)
+
+
+def render_metrics() -> bytes:
+    """Every metric in the Prometheus text exposition format"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+class RequestTimings:
+    """Stage and SQL times of one request"""
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self.queries = 0
+        self.query_time = 0.0
+        self._lock = threading.Lock()
+
+    def add_stage(self, name: str, seconds: float):
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def add_query(self, seconds: float):
+        with self._lock:
+            self.queries += 1
+            self.query_time += seconds
+
+    def server_timing(self, total: float) -> str:
+        """Server-Timing header value; durations in milliseconds"""
+        entries = [f"total;dur={total * 1000:.1f}", f'sql;dur={self.query_time * 1000:.1f};desc="{self.queries} queries"']
+        with self._lock:
+            entries.extend(f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.stages.items())
+        return ", ".join(entries)
+
+
+_current: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+
+@contextmanager
+def span(name: str):
+    """Time a processing stage, for stage_duration_seconds and the current request's Server-Timing"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, name)
+        timings = _current.get()
+        if timings is not None:
+            timings.add_stage(name, elapsed)
+
+
+def instrument_engine(engine):
+    """Count and time the statements of a (sync) engine towards the current request"""
+    @event.listens_for(engine, "before_cursor_execute")
+    def before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_started"].pop()
+        timings = _current.get()
+        if timings is not None:
+            timings.add_query(time.perf_counter() - started)
+
+
+def _route(scope) -> str:
+    """Path template of the route that handles the request"""
+    app = scope.get("app")
+    for route in getattr(app, "routes", ()):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", "unmatched")
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording duration, SQL statements and stages of every request"""
+
+    def __init__(self, app, server_timing: bool = SERVER_TIMING):
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = _current.set(timings)
+        started = time.perf_counter()
+        recorded = False
+
+        def record(status: int) -> float:
+            nonlocal recorded
+            recorded = True
+            elapsed = time.perf_counter() - started
+            method = scope["method"] if scope["method"] in METHODS else "other"
+            route = _route(scope)
+            REQUEST_SECONDS.observe(elapsed, method, route, str(status))
+            REQUEST_QUERIES.observe(timings.queries, method, route)
+            REQUEST_QUERY_SECONDS.observe(timings.query_time, method, route)
+            return elapsed
+
+        async def send_with_metrics(message):
+            if message["type"] == "http.response.start":
+                elapsed = record(message["status"])
+                if self.server_timing:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", timings.server_timing(elapsed).encode("latin-1")))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            if not recorded:
+                record(500)
+            _current.reset(token)
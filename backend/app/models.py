@@ -36,6 +36,12 @@ class Image(models.Model):
     confidence_summary = models.TextField(null=True, blank=True)  # JSON string
     uploaded_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Backs keyset pagination over (date, id)
+            models.Index(fields=["date", "id"], name="image_date_id_idx"),
+        ]
+
     def __str__(self):
         return f"{self.id} - {self.path}"
 
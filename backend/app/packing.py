@@ -0,0 +1,151 @@
+"""
+Compact binary (MessagePack) responses for mobile clients
+
+Same wire format as the Django backend (inventory_app/packing.py): the
+MessagePack map {"strings": [...], "data": value}, where every non-empty
+list of objects sharing the same keys becomes a column table
+
+    {"$table": row count, "fields": [...], "columns": [...]}
+
+with columns ["int", dtype, bytes] (delta-encoded), ["float", bytes]
+(float64), ["str", dtype, bytes] (indices into strings, -1 for null),
+["table", table] or ["any", [...]].
+
+Routers created with route_class=PackedRoute and
+default_response_class=PackedResponse answer requests sending
+Accept: application/msgpack in this format and everything else in JSON.
+The payload is still built and validated through response_model first.
+"""
+from contextvars import ContextVar
+from typing import Any, Dict, List
+import numpy as np
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+
+try:
+    import msgpack
+except ImportError:  # binary responses are unavailable without msgpack
+    msgpack = None
+
+
+MEDIA_TYPE = "application/msgpack"
+
+_INT_DTYPES = ("<i1", "<i2", "<i4", "<i8")
+
+# Accept header of the request being handled, read by PackedResponse.render
+_accept: ContextVar[str] = ContextVar("accept", default="")
+
+
+def _int_dtype(low: int, high: int) -> str:
+    for dtype in _INT_DTYPES:
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return dtype
+    return "<i8"
+
+
+class _Packer:
+    def __init__(self):
+        self.strings: List[str] = []
+        self._index: Dict[str, int] = {}
+
+    def intern(self, text: str) -> int:
+        index = self._index.get(text)
+        if index is None:
+            index = self._index[text] = len(self.strings)
+            self.strings.append(text)
+        return index
+
+    def value(self, value):
+        if isinstance(value, dict):
+            return {key: self.value(item) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            if value and all(isinstance(item, dict) for item in value):
+                keys = value[0].keys()
+                if all(item.keys() == keys for item in value):
+                    return self.table(value, list(keys))
+            return [self.value(item) for item in value]
+        return value
+
+    def table(self, rows: List[dict], fields: List[str]) -> Dict:
+        return {
+            "$table": len(rows),
+            "fields": fields,
+            "columns": [self.column([row[field] for row in rows]) for field in fields],
+        }
+
+    def column(self, values: List[Any]) -> List:
+        types = {type(value) for value in values}
+        if types == {int}:
+            deltas = np.diff(np.array(values, dtype=np.int64), prepend=0)
+            dtype = _int_dtype(int(deltas.min()), int(deltas.max()))
+            return ["int", dtype, deltas.astype(dtype).tobytes()]
+        if float in types and types <= {int, float}:
+            return ["float", np.array(values, dtype="<f8").tobytes()]
+        if str in types and types <= {str, type(None)}:
+            indices = [self.intern(value) if value is not None else -1 for value in values]
+            dtype = _int_dtype(-1, max(indices))
+            return ["str", dtype, np.array(indices, dtype=dtype).tobytes()]
+        if types == {dict}:
+            packed = self.value(values)
+            if isinstance(packed, dict):
+                return ["table", packed]
+        return ["any", [self.value(value) for value in values]]
+
+
+def pack(data) -> bytes:
+    """Encode a JSON-compatible payload (as produced by jsonable_encoder)"""
+    packer = _Packer()
+    packed = packer.value(data)
+    return msgpack.packb({"strings": packer.strings, "data": packed}, use_bin_type=True)
+
+
+def wants_packed(accept: str) -> bool:
+    """Whether an Accept header prefers MessagePack over JSON"""
+    if msgpack is None or "msgpack" not in accept:
+        return False
+    quality = {}
+    for part in accept.split(","):
+        media_range, _, params = part.partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        quality[media_range.strip().lower()] = q
+    packed = max(quality.get(MEDIA_TYPE, 0.0), quality.get("application/x-msgpack", 0.0))
+    json = max(quality.get(key, 0.0) for key in ("application/json", "application/*", "*/*"))
+    return packed > 0 and packed >= json
+
+
+class PackedResponse(JSONResponse):
+    """JSON response that switches to MessagePack when the request asked for it"""
+
+    def render(self, content: Any) -> bytes:
+        if wants_packed(_accept.get()):
+            self.media_type = MEDIA_TYPE
+            return pack(content)
+        return super().render(content)
+
+    def init_headers(self, headers=None) -> None:
+        super().init_headers(headers)
+        self.raw_headers.append((b"vary", b"Accept"))
+
+
+class PackedRoute(APIRoute):
+    """Route whose responses are negotiated between JSON and MessagePack"""
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def route_handler(request):
+            token = _accept.set(request.headers.get("accept", ""))
+            try:
+                return await handler(request)
+            finally:
+                _accept.reset(token)
+
+        return route_handler
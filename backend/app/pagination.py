@@ -0,0 +1,81 @@
+"""
+Keyset (cursor) pagination helpers for list endpoints
+"""
+import base64
+import json
+from datetime import date, datetime
+from typing import Any, List, Optional, Sequence, Tuple
+from fastapi import HTTPException, Request, Response
+from sqlalchemy import Select, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Pack the sort-key values of the last row into an opaque token"""
+    raw = json.dumps([v.isoformat() if hasattr(v, "isoformat") else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, columns: Sequence[Any]) -> List[Any]:
+    """Unpack a token produced by encode_cursor, coercing values to the column types"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8"))
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError("cursor length mismatch")
+        coerced = []
+        for column, value in zip(columns, values):
+            python_type = column.type.python_type
+            if python_type is datetime:
+                value = datetime.fromisoformat(value)
+            elif python_type is date:
+                value = date.fromisoformat(value)
+            else:
+                value = python_type(value)
+            coerced.append(value)
+        return coerced
+    except (ValueError, TypeError, UnicodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+async def paginate_keyset(
+    db: AsyncSession,
+    stmt: Select,
+    keys: Sequence[Tuple[Any, bool]],
+    cursor: Optional[str],
+    limit: int
+) -> Tuple[list, Optional[str]]:
+    """
+    Return one page of stmt ordered by keys and the cursor of the next page.
+
+    keys is a list of (column, descending) pairs whose last entry must be
+    unique so the ordering is total. Every page is an index range scan.
+    """
+    columns = [column for column, _ in keys]
+    if cursor:
+        values = decode_cursor(cursor, columns)
+        clauses = []
+        for i, (column, descending) in enumerate(keys):
+            term = column < values[i] if descending else column > values[i]
+            clauses.append(and_(*[columns[j] == values[j] for j in range(i)], term))
+        stmt = stmt.where(or_(*clauses))
+
+    ordering = [column.desc() if descending else column.asc() for column, descending in keys]
+    rows = list((await db.scalars(stmt.order_by(*ordering).limit(limit + 1))).all())
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([getattr(rows[-1], column.key) for column in columns])
+    return rows, next_cursor
+
+
+def set_pagination_headers(response: Response, request: Request, next_cursor: Optional[str]):
+    """Advertise the next page via X-Next-Cursor and a Link header"""
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+        response.headers["Link"] = f'<{request.url.include_query_params(cursor=next_cursor)}>; rel="next"'
@@ -2,9 +2,11 @@
 Analytics endpoints for data analysis
 """
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import date, timedelta
-from app.database import get_db
+from itertools import groupby
+from app.database import get_read_db
 from app.models import Product, DailyCount
 from app.schemas import WeeklyAnalyticsResponse, AnalyticsSummary
 from app.services.analytics_service import AnalyticsService
@@ -16,7 +18,7 @@ analytics_service = AnalyticsService()
 @router.get("/analytics/weekly", response_model=WeeklyAnalyticsResponse)
 async def get_weekly_analytics(
     days: int = 7,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db(max_lag=300))
 ):
     """
     Get weekly analytics for all products
@@ -25,16 +27,23 @@ async def get_weekly_analytics(
     end_date = date.today()
     start_date = end_date - timedelta(days=days - 1)
 
-    # Get all products with counts in the period
-    products = db.query(Product).all()
+    # All counts in the period in one query, grouped by product
+    rows = (await db.execute(
+        select(DailyCount.product_id, DailyCount.date, DailyCount.count)
+        .where(DailyCount.date >= start_date, DailyCount.date <= end_date)
+        .order_by(DailyCount.product_id, DailyCount.date)
+    )).all()
+    series = {
+        product_id: list(group)
+        for product_id, group in groupby(rows, key=lambda r: r.product_id)
+    }
+    products = (await db.scalars(
+        select(Product).where(Product.id.in_(list(series)))
+    )).all()
     summaries = []
 
     for product in products:
-        counts = db.query(DailyCount).filter(
-            DailyCount.product_id == product.id,
-            DailyCount.date >= start_date,
-            DailyCount.date <= end_date
-        ).order_by(DailyCount.date).all()
+        counts = series[product.id]
 
         if len(counts) >= 2:  # Need at least 2 data points
             count_values = [c.count for c in counts]
@@ -57,13 +66,17 @@ async def get_weekly_analytics(
 @router.get("/analytics/daily")
 async def get_daily_summary(
     target_date: date = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db(max_lag=60))
 ):
     """Get daily summary for a specific date"""
     if target_date is None:
         target_date = date.today()
 
-    counts = db.query(DailyCount).filter(DailyCount.date == target_date).all()
+    counts = (await db.execute(
+        select(DailyCount.product_id, Product.name, DailyCount.count)
+        .join(Product, Product.id == DailyCount.product_id)
+        .where(DailyCount.date == target_date)
+    )).all()
     
     return {
         "date": target_date,
@@ -72,7 +85,7 @@ async def get_daily_summary(
         "products": [
             {
                 "product_id": c.product_id,
-                "product_name": c.product.name,
+                "product_name": c.name,
                 "count": c.count
             }
             for c in counts
@@ -0,0 +1,32 @@
+"""
+Live event stream (Server-Sent Events)
+"""
+from fastapi import APIRouter, Header, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import Optional
+from app.events import broker
+
+router = APIRouter()
+
+
+@router.get("/events")
+async def events(request: Request, last_event_id: Optional[int] = Header(None)):
+    """
+    Stream "detection" and "counts" events published by uploads; resumes
+    after the Last-Event-ID header when the client reconnects
+    """
+    if last_event_id is None and "last_event_id" in request.query_params:
+        try:
+            last_event_id = int(request.query_params["last_event_id"])
+        except ValueError:
+            last_event_id = None
+    subscriber = broker.subscribe(last_event_id)
+    if subscriber is None:
+        return JSONResponse(
+            {"detail": "Too many event subscribers"}, status_code=503, headers={"Retry-After": "30"}
+        )
+    return StreamingResponse(
+        broker.stream(subscriber, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
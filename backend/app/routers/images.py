@@ -1,18 +1,23 @@
 """
 Image upload and processing endpoints
 """
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Request, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
 import os
-from app.database import get_db
+from app.database import get_async_db
+from app.pagination import paginate_keyset, set_pagination_headers, MAX_PAGE_SIZE
 from app.models import Image, Product, DailyCount
 from app.schemas import ImageUploadResponse, DetectionResult
 from app.services.inference_service import InferenceService
 from app.services.storage_service import StorageService
-from typing import List
+from app.packing import PackedResponse, PackedRoute
+from app.events import broker
+from app.metrics import span
+from typing import List, Optional
 
-router = APIRouter()
+router = APIRouter(route_class=PackedRoute, default_response_class=PackedResponse)
 
 # Initialize services
 inference_service = InferenceService()
@@ -22,7 +27,7 @@ storage_service = StorageService()
 @router.post("/images/upload", response_model=ImageUploadResponse)
 async def upload_image(
     file: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Upload a shelf image, run YOLO inference, and store results
@@ -43,59 +48,84 @@ async def upload_image(
             processing_time = time.time() - start_time
 
             # Upload to storage (S3 or local)
-            storage_path = await storage_service.upload_file(tmp_path, file.filename)
-
-            # Save image metadata
-            confidence_summary = str({d["product_name"]: d["confidence"] for d in detections})
-            db_image = Image(
-                date=datetime.now(),
-                path=storage_path,
-                confidence_summary=confidence_summary
-            )
-            db.add(db_image)
-            db.flush()
-
-            # Update daily counts
-            today = datetime.now().date()
-            detection_results = []
-            total_products = 0
-
-            for detection in detections:
-                product_name = detection["product_name"]
-                count = detection["count"]
-                confidence = detection["confidence"]
-
-                # Get or create product
-                product = db.query(Product).filter(Product.name == product_name).first()
-                if not product:
-                    product = Product(name=product_name, category=None)
-                    db.add(product)
-                    db.flush()
-
-                # Update or create daily count
-                daily_count = db.query(DailyCount).filter(
-                    DailyCount.product_id == product.id,
-                    DailyCount.date == today
-                ).first()
-
-                if daily_count:
-                    daily_count.count = count
-                else:
-                    daily_count = DailyCount(
-                        product_id=product.id,
-                        date=today,
-                        count=count
-                    )
-                    db.add(daily_count)
-
-                detection_results.append(DetectionResult(
-                    product_name=product_name,
-                    count=count,
-                    confidence=confidence
-                ))
-                total_products += count
-
-            db.commit()
+            with span("storage"):
+                storage_path = await storage_service.upload_file(tmp_path, file.filename)
+
+            # Image row, products and daily counts
+            with span("db"):
+                # Save image metadata
+                confidence_summary = str({d["product_name"]: d["confidence"] for d in detections})
+                db_image = Image(
+                    date=datetime.now(),
+                    path=storage_path,
+                    confidence_summary=confidence_summary
+                )
+                db.add(db_image)
+                await db.flush()
+
+                # Update daily counts
+                today = datetime.now().date()
+                detection_results = []
+                total_products = 0
+                product_counts = {}
+
+                for detection in detections:
+                    product_name = detection["product_name"]
+                    count = detection["count"]
+                    confidence = detection["confidence"]
+
+                    # Get or create product
+                    product = (await db.scalars(
+                        select(Product).where(Product.name == product_name).limit(1)
+                    )).first()
+                    if not product:
+                        product = Product(name=product_name, category=None)
+                        db.add(product)
+                        await db.flush()
+
+                    # Update or create daily count
+                    daily_count = (await db.scalars(
+                        select(DailyCount).where(
+                            DailyCount.product_id == product.id,
+                            DailyCount.date == today
+                        ).limit(1)
+                    )).first()
+
+                    if daily_count:
+                        daily_count.count = count
+                    else:
+                        daily_count = DailyCount(
+                            product_id=product.id,
+                            date=today,
+                            count=count
+                        )
+                        db.add(daily_count)
+
+                    product_counts[product_name] = (product.id, count)
+                    detection_results.append(DetectionResult(
+                        product_name=product_name,
+                        count=count,
+                        confidence=confidence
+                    ))
+                    total_products += count
+
+                await db.commit()
+
+            # Push to live dashboards (app/events.py)
+            broker.publish("detection", {
+                "image_id": db_image.image_id,
+                "date": db_image.date.isoformat(),
+                "path": storage_path,
+                "detections": [result.dict() for result in detection_results],
+                "total_products": total_products,
+            })
+            broker.publish("counts", {
+                "date": today.isoformat(),
+                "counts": [
+                    {"product_id": product_id, "product_name": name, "count": count}
+                    for name, (product_id, count) in product_counts.items()
+                ],
+            })
 
             return ImageUploadResponse(
                 image_id=db_image.image_id,
@@ -110,17 +140,29 @@ async def upload_image(
                 os.remove(tmp_path)
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
 
 
 @router.get("/images")
 async def get_images(
+    request: Request,
+    response: Response,
     limit: int = 10,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get recent images"""
-    images = db.query(Image).order_by(Image.date.desc()).limit(limit).all()
+    """Get recent images, newest first, one keyset page at a time"""
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        limit = 10
+    images, next_cursor = await paginate_keyset(
+        db,
+        select(Image),
+        keys=[(Image.date, True), (Image.id, True)],
+        cursor=cursor,
+        limit=limit
+    )
+    set_pagination_headers(response, request, next_cursor)
     return images
 
 
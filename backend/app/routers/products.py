@@ -1,53 +1,85 @@
 """
 Product management endpoints
 """
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
-from app.database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from app.database import get_async_db
+from app.pagination import paginate_keyset, set_pagination_headers, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 from app.models import Product, DailyCount
 from app.schemas import ProductResponse, ProductCreate, DailyCountResponse
+from app.packing import PackedResponse, PackedRoute
 from datetime import date, timedelta
 
-router = APIRouter()
+router = APIRouter(route_class=PackedRoute, default_response_class=PackedResponse)
 
 
 @router.get("/products", response_model=List[ProductResponse])
-async def get_products(db: Session = Depends(get_db)):
-    """Get all products"""
-    products = db.query(Product).all()
+async def get_products(
+    request: Request,
+    response: Response,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get products, newest first, one keyset page at a time"""
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        limit = DEFAULT_PAGE_SIZE
+    products, next_cursor = await paginate_keyset(
+        db,
+        select(Product),
+        keys=[(Product.id, True)],
+        cursor=cursor,
+        limit=limit
+    )
+    set_pagination_headers(response, request, next_cursor)
     return products
 
 
 @router.post("/products", response_model=ProductResponse)
 async def create_product(
     product: ProductCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Create a new product"""
     db_product = Product(**product.dict())
     db.add(db_product)
-    db.commit()
-    db.refresh(db_product)
+    await db.commit()
+    await db.refresh(db_product)
     return db_product
 
 
 @router.get("/products/{product_id}/counts", response_model=List[DailyCountResponse])
 async def get_product_counts(
+    request: Request,
+    response: Response,
     product_id: int,
     days: int = 7,
-    db: Session = Depends(get_db)
+    limit: int = 366,
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get daily counts for a specific product"""
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        limit = 366
     start_date = date.today() - timedelta(days=days)
-    counts = db.query(DailyCount).filter(
-        DailyCount.product_id == product_id,
-        DailyCount.date >= start_date
-    ).order_by(DailyCount.date).all()
+    # (product_id, date) is unique, so date alone is a total order here
+    counts, next_cursor = await paginate_keyset(
+        db,
+        select(DailyCount).where(
+            DailyCount.product_id == product_id,
+            DailyCount.date >= start_date
+        ),
+        keys=[(DailyCount.date, False)],
+        cursor=cursor,
+        limit=limit
+    )
     
-    if not counts:
+    if not counts and not cursor:
         raise HTTPException(status_code=404, detail="Product not found or no counts available")
     
+    set_pagination_headers(response, request, next_cursor)
     return counts
 
 
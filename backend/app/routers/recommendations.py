@@ -2,21 +2,24 @@
 Weekly recommendation engine endpoints
 """
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import date, datetime, timedelta
-from app.database import get_db
+from itertools import groupby
+from app.database import get_read_db
 from app.models import Product, DailyCount
 from app.schemas import RecommendationsResponse, RecommendationItem
 from app.services.recommendation_service import RecommendationService
+from app.packing import PackedResponse, PackedRoute
 
-router = APIRouter()
+router = APIRouter(route_class=PackedRoute, default_response_class=PackedResponse)
 recommendation_service = RecommendationService()
 
 
 @router.get("/recommendations/weekly", response_model=RecommendationsResponse)
 async def get_weekly_recommendations(
     days: int = 7,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db(max_lag=300))
 ):
     """
     Get weekly investment and restocking recommendations
@@ -28,16 +31,23 @@ async def get_weekly_recommendations(
     end_date = date.today()
     start_date = end_date - timedelta(days=days - 1)
 
-    # Get all products with sufficient data
-    products = db.query(Product).all()
+    # All counts in the period in one query, grouped by product
+    rows = (await db.execute(
+        select(DailyCount.product_id, DailyCount.date, DailyCount.count)
+        .where(DailyCount.date >= start_date, DailyCount.date <= end_date)
+        .order_by(DailyCount.product_id, DailyCount.date)
+    )).all()
+    series = {
+        product_id: list(group)
+        for product_id, group in groupby(rows, key=lambda r: r.product_id)
+    }
+    products = (await db.scalars(
+        select(Product).where(Product.id.in_(list(series)))
+    )).all()
     product_data = []
 
     for product in products:
-        counts = db.query(DailyCount).filter(
-            DailyCount.product_id == product.id,
-            DailyCount.date >= start_date,
-            DailyCount.date <= end_date
-        ).order_by(DailyCount.date).all()
+        counts = series[product.id]
 
         if len(counts) >= 3:  # Need at least 3 data points for meaningful analysis
             count_values = [c.count for c in counts]
@@ -63,3 +73,6 @@ async def get_weekly_recommendations(
         generated_at=datetime.now()
     )
 
+
+
+
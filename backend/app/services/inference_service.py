@@ -7,6 +7,7 @@ from typing import List, Dict
 import onnxruntime as ort
 import cv2
 from pathlib import Path
+from app.metrics import span
 
 
 class InferenceService:
@@ -112,17 +113,21 @@ class InferenceService:
         """
         if self.session is None:
             # Mock inference for development
-            return self._mock_inference(image_path)
+            with span("infer"):
+                return self._mock_inference(image_path)
         
         try:
             # Preprocess
-            input_array = self._preprocess_image(image_path)
+            with span("decode"):
+                input_array = self._preprocess_image(image_path)
             
             # Run inference
-            outputs = self.session.run(self.output_names, {self.input_name: input_array})
+            with span("infer"):
+                outputs = self.session.run(self.output_names, {self.input_name: input_array})
             
             # Postprocess
-            detections = self._postprocess_output(outputs)
+            with span("postprocess"):
+                detections = self._postprocess_output(outputs)
             
             # Count by class/product
             product_counts = {}
@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import Product, DailyCount, Image
+from .models import (
+    Product, DailyCount, Image, CountObservation, HourlyCount,
+    CategoryDailyRollup, CategoryWeeklyRollup, ProductMonthlyRollup, IdempotencyKey, UploadSession
+)
 
 
 @admin.register(Product)
@@ -24,4 +27,54 @@ class ImageAdmin(admin.ModelAdmin):
     date_hierarchy = 'date'
 
 
+@admin.register(CountObservation)
+class CountObservationAdmin(admin.ModelAdmin):
+    list_display = ['id', 'product', 'observed_at', 'count', 'image']
+    list_filter = ['observed_at']
+    search_fields = ['product__name']
+    date_hierarchy = 'observed_at'
+
+
+@admin.register(HourlyCount)
+class HourlyCountAdmin(admin.ModelAdmin):
+    list_display = ['id', 'product', 'hour', 'count', 'min_count', 'max_count', 'observations']
+    list_filter = ['hour']
+    search_fields = ['product__name']
+    date_hierarchy = 'hour'
+
+
+@admin.register(CategoryDailyRollup)
+class CategoryDailyRollupAdmin(admin.ModelAdmin):
+    list_display = ['id', 'category', 'day', 'total', 'samples']
+    list_filter = ['category']
+    date_hierarchy = 'day'
+
+
+@admin.register(CategoryWeeklyRollup)
+class CategoryWeeklyRollupAdmin(admin.ModelAdmin):
+    list_display = ['id', 'category', 'week', 'total', 'samples']
+    list_filter = ['category']
+    date_hierarchy = 'week'
+
+
+@admin.register(ProductMonthlyRollup)
+class ProductMonthlyRollupAdmin(admin.ModelAdmin):
+    list_display = ['id', 'product', 'month', 'total', 'samples']
+    search_fields = ['product__name']
+    date_hierarchy = 'month'
+
+
+@admin.register(IdempotencyKey)
+class IdempotencyKeyAdmin(admin.ModelAdmin):
+    list_display = ['id', 'scope', 'key', 'status_code', 'created_at', 'expires_at']
+    list_filter = ['scope', 'status_code']
+    search_fields = ['key']
+    exclude = ['response']
+
 
+@admin.register(UploadSession)
+class UploadSessionAdmin(admin.ModelAdmin):
+    list_display = ['id', 'filename', 'offset', 'length', 'status', 'created_at', 'expires_at']
+    list_filter = ['status']
+    search_fields = ['id', 'filename']
+    exclude = ['result']
@@ -0,0 +1,148 @@
+"""
+Admission control in front of inference
+
+At most UPLOAD_MAX_IN_FLIGHT uploads of a process run inference at the
+same time; up to UPLOAD_MAX_QUEUE more wait for a slot, highest priority
+first, and anything beyond that is turned away at once with 503 and a
+Retry-After estimate instead of piling onto the CPU. A request arriving
+at a full queue with a higher priority than the lowest waiter takes its
+place, so a manager checking one shelf is not stuck behind a bulk
+re-scan.
+
+Every request also carries a deadline (X-Request-Timeout seconds, or
+UPLOAD_DEADLINE): a request whose deadline passes while it waits is
+dropped before it reaches the model, since its client has given up.
+"""
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Optional
+from django.conf import settings
+
+
+PRIORITIES = {'low': 0, 'normal': 1, 'high': 2}
+
+
+class Rejected(Exception):
+    """Raised when a request is not admitted; retry_after is a hint in seconds"""
+
+    def __init__(self, message: str, retry_after: int = 1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Overloaded(Rejected):
+    """The wait queue is full (or the request was displaced by a higher priority one)"""
+
+
+class DeadlineExceeded(Rejected):
+    """The request's deadline passed before it could start"""
+
+
+class _Waiter:
+    __slots__ = ('priority', 'seq', 'admitted', 'evicted')
+
+    def __init__(self, priority: int, seq: int):
+        self.priority = priority
+        self.seq = seq
+        self.admitted = False
+        self.evicted = False
+
+    def __lt__(self, other):
+        # Heap order: highest priority first, then arrival order
+        return (-self.priority, self.seq) < (-other.priority, other.seq)
+
+
+class AdmissionController:
+    """Bounded concurrency with a bounded priority wait queue"""
+
+    def __init__(self, max_in_flight: Optional[int] = None, max_queue: Optional[int] = None):
+        self.max_in_flight = max_in_flight or getattr(settings, 'UPLOAD_MAX_IN_FLIGHT', 2)
+        self.max_queue = max_queue if max_queue is not None else getattr(settings, 'UPLOAD_MAX_QUEUE', 8)
+        self.in_flight = 0
+        self._waiting: List[_Waiter] = []
+        self._condition = threading.Condition()
+        self._seq = itertools.count()
+        self._service_time = 1.0  # moving average of seconds per admitted request
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely to be free for a new request"""
+        backlog = len(self._waiting) + self.in_flight
+        return max(1, round(self._service_time * backlog / self.max_in_flight))
+
+    def _acquire(self, priority: int, deadline: float):
+        with self._condition:
+            if self.in_flight < self.max_in_flight and not self._waiting:
+                self.in_flight += 1
+                return
+            if len(self._waiting) >= self.max_queue:
+                lowest = max(self._waiting) if self._waiting else None
+                if lowest is None or lowest.priority >= priority:
+                    raise Overloaded('Too many uploads in progress', self.retry_after())
+                # Displace the lowest priority, most recent waiter
+                self._waiting.remove(lowest)
+                heapq.heapify(self._waiting)
+                lowest.evicted = True
+                self._condition.notify_all()
+
+            waiter = _Waiter(priority, next(self._seq))
+            heapq.heappush(self._waiting, waiter)
+            try:
+                while not waiter.admitted:
+                    remaining = deadline - time.monotonic()
+                    if waiter.evicted:
+                        raise Overloaded('Displaced by a higher priority upload', self.retry_after())
+                    if remaining <= 0:
+                        raise DeadlineExceeded('Deadline passed while waiting for inference', self.retry_after())
+                    self._condition.wait(remaining)
+            except Rejected:
+                if not waiter.evicted:
+                    self._waiting.remove(waiter)
+                    heapq.heapify(self._waiting)
+                raise
+
+    def _release(self, elapsed: float):
+        with self._condition:
+            self._service_time = 0.8 * self._service_time + 0.2 * elapsed
+            if self._waiting:
+                # Hand the slot straight to the next waiter
+                heapq.heappop(self._waiting).admitted = True
+                self._condition.notify_all()
+            else:
+                self.in_flight -= 1
+
+    @contextmanager
+    def admit(self, priority: int = PRIORITIES['normal'], deadline: Optional[float] = None):
+        """
+        Hold an inference slot for the duration of the block.
+
+        deadline is a time.monotonic() value; raises Overloaded or
+        DeadlineExceeded instead of entering the block.
+        """
+        deadline = deadline if deadline is not None else time.monotonic() + getattr(settings, 'UPLOAD_DEADLINE', 30)
+        self._acquire(priority, deadline)
+        started = time.monotonic()
+        try:
+            if started >= deadline:
+                raise DeadlineExceeded('Deadline passed before inference started', self.retry_after())
+            yield
+        finally:
+            self._release(time.monotonic() - started)
+
+
+def request_priority(request) -> int:
+    """Priority named by the X-Priority header or ?priority= (low, normal, high)"""
+    name = request.META.get('HTTP_X_PRIORITY') or request.GET.get('priority') or 'normal'
+    return PRIORITIES.get(name.strip().lower(), PRIORITIES['normal'])
+
+
+def request_deadline(request, received: float) -> float:
+    """Monotonic deadline from X-Request-Timeout (seconds), capped by UPLOAD_DEADLINE"""
+    limit = getattr(settings, 'UPLOAD_DEADLINE', 30)
+    try:
+        timeout = float(request.META.get('HTTP_X_REQUEST_TIMEOUT', limit))
+    except ValueError:
+        timeout = limit
+    return received + min(max(timeout, 0.0), limit)
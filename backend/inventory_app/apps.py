@@ -5,5 +5,15 @@ class InventoryAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'inventory_app'
 
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from .database import configure_sqlite
+        connection_created.connect(configure_sqlite, dispatch_uid='inventory_app.configure_sqlite')
+
+        from django.db.models.signals import post_delete
+        from .changes import record_deletion
+        from .models import Product, Image
+        for model in (Product, Image):
+            post_delete.connect(record_deletion, sender=model, dispatch_uid=f'inventory_app.tombstone.{model.__name__}')
 
 
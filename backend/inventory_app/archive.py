@@ -0,0 +1,293 @@
+"""
+Monthly archival of DailyCount rows to memory-mapped column files
+
+Closed months are moved out of the daily_counts table into one partition
+directory per month under COUNT_ARCHIVE_PATH:
+
+    2025-01/product.npy   int32  Product.id
+    2025-01/date.npy      int32  days since 1970-01-01
+    2025-01/count.npy     int32
+    manifest.json         {"partitions": {"2025-01": {"rows": ..., "min_date": ..., "max_date": ...}}}
+
+Rows are sorted by (product, date), the order readers group by. The
+columns are plain .npy files rather than a compressed archive so they can
+be opened with mmap_mode='r': reading a year touches only the pages that
+are needed and costs no decompression, at 12 bytes per row.
+
+Readers call DailyCountArchive.read_window(), which unions the hot table
+with every partition overlapping the window. If a (product, date) exists
+in both places (a late write into an archived month) the hot row wins,
+and the next archive run merges it into the partition. Deleting a
+product purges its rows from the partitions (purge_product).
+"""
+import json
+import os
+import shutil
+from datetime import date, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import numpy as np
+from django.conf import settings
+from .models import DailyCount
+from .database import write_transaction
+
+
+EPOCH = date(1970, 1, 1)
+COLUMNS = ('product', 'date', 'count')
+
+
+def month_key(day: date) -> str:
+    return f'{day.year:04d}-{day.month:02d}'
+
+
+def month_bounds(key: str) -> Tuple[date, date]:
+    """First day of the month and first day of the next month"""
+    year, month = (int(part) for part in key.split('-'))
+    start = date(year, month, 1)
+    end = date(year + month // 12, month % 12 + 1, 1)
+    return start, end
+
+
+def to_days(day: date) -> int:
+    return (day - EPOCH).days
+
+
+def days_to_dates(days: np.ndarray) -> List[date]:
+    return days.astype(np.int64).view('datetime64[D]').tolist()
+
+
+def rows_to_columns(rows: List[Tuple[int, date, int]]) -> Tuple[np.ndarray, ...]:
+    """Split (product_id, date, count) tuples into int32 columns"""
+    if not rows:
+        empty = np.empty(0, dtype=np.int32)
+        return empty, empty, empty
+    product, day, count = zip(*rows)
+    return (
+        np.array(product, dtype=np.int32),
+        np.array(day, dtype='datetime64[D]').astype(np.int32),
+        np.array(count, dtype=np.int32),
+    )
+
+
+class CountWindow:
+    """Daily counts of a date window as parallel arrays sorted by (product, date)"""
+
+    def __init__(self, product: np.ndarray, day: np.ndarray, count: np.ndarray):
+        self.product = product
+        self.day = day
+        self.count = count
+
+    def __len__(self):
+        return len(self.product)
+
+    def by_product(self) -> Iterator[Tuple[int, List[date], List[int]]]:
+        """Yield (product_id, dates, counts) for each product in the window"""
+        if not len(self.product):
+            return
+        bounds = np.flatnonzero(np.diff(self.product)) + 1
+        starts = np.concatenate(([0], bounds))
+        ends = np.concatenate((bounds, [len(self.product)]))
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            yield (
+                int(self.product[start]),
+                days_to_dates(self.day[start:end]),
+                self.count[start:end].tolist(),
+            )
+
+
+class DailyCountArchive:
+    """Service for archiving closed months and reading hot and cold counts together"""
+
+    def __init__(self, path: Optional[str] = None, batch_size: int = 10000):
+        self.path = str(path or getattr(
+            settings, 'COUNT_ARCHIVE_PATH', os.path.join(settings.BASE_DIR, 'archive', 'daily_counts')
+        ))
+        self.batch_size = batch_size
+        self._manifest = None
+        self._manifest_mtime = None
+
+    # Manifest
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.path, 'manifest.json')
+
+    def manifest(self) -> Dict:
+        """Load the manifest, re-reading it only when the file changes"""
+        try:
+            mtime = os.stat(self.manifest_path).st_mtime_ns
+        except FileNotFoundError:
+            return {'partitions': {}}
+        if mtime != self._manifest_mtime:
+            with open(self.manifest_path, encoding='utf-8') as f:
+                self._manifest = json.load(f)
+            self._manifest_mtime = mtime
+        return self._manifest
+
+    def _write_manifest(self, manifest: Dict):
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.manifest_path)
+
+    # Partitions
+
+    def _load_partition(self, key: str) -> Tuple[np.ndarray, ...]:
+        directory = os.path.join(self.path, key)
+        return tuple(np.load(os.path.join(directory, f'{c}.npy'), mmap_mode='r') for c in COLUMNS)
+
+    def _write_partition(self, key: str, product: np.ndarray, day: np.ndarray, count: np.ndarray):
+        """Write columns to a temp directory, then swap it in"""
+        final_dir = os.path.join(self.path, key)
+        tmp_dir = final_dir + '.tmp'
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        for name, column in zip(COLUMNS, (product, day, count)):
+            np.save(os.path.join(tmp_dir, f'{name}.npy'), np.ascontiguousarray(column, dtype=np.int32))
+        old_dir = final_dir + '.old'
+        if os.path.exists(final_dir):
+            os.replace(final_dir, old_dir)
+        os.replace(tmp_dir, final_dir)
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+    def archive_month(self, key: str) -> int:
+        """Move one month of DailyCount rows into its partition; returns rows moved"""
+        start, end = month_bounds(key)
+        with write_transaction():
+            rows = DailyCount.objects.filter(date__gte=start, date__lt=end)
+            product, day, count = rows_to_columns(list(
+                rows.order_by('product_id', 'date')
+                .values_list('product_id', 'date', 'count')
+                .iterator(chunk_size=self.batch_size)
+            ))
+            moved = len(product)
+            if not moved:
+                return 0
+
+            manifest = self.manifest()
+            if key in manifest['partitions']:
+                # Late rows for an archived month: merge, new values win
+                old = [np.array(c) for c in self._load_partition(key)]
+                product, day, count = self._dedupe(
+                    np.concatenate((product, old[0])),
+                    np.concatenate((day, old[1])),
+                    np.concatenate((count, old[2])),
+                )
+
+            os.makedirs(self.path, exist_ok=True)
+            self._write_partition(key, product, day, count)
+            manifest = dict(manifest, partitions=dict(manifest['partitions']))
+            manifest['partitions'][key] = {
+                'rows': int(len(product)),
+                'min_date': (EPOCH + timedelta(days=int(day.min()))).isoformat(),
+                'max_date': (EPOCH + timedelta(days=int(day.max()))).isoformat(),
+            }
+            self._write_manifest(manifest)
+            rows.delete()
+        return moved
+
+    def purge_product(self, product_id: int) -> int:
+        """
+        Drop a deleted product's rows from every partition; returns rows removed.
+
+        Call under the writer lock, like archive_month, so the two never
+        rewrite the same partition at once.
+        """
+        manifest = self.manifest()
+        partitions = dict(manifest['partitions'])
+        removed = 0
+        emptied = []
+        for key in sorted(partitions):
+            product, day, count = self._load_partition(key)
+            keep = product != product_id
+            if keep.all():
+                continue
+            removed += int(len(product) - keep.sum())
+            if keep.any():
+                day = day[keep]
+                self._write_partition(key, product[keep], day, count[keep])
+                partitions[key] = {
+                    'rows': int(keep.sum()),
+                    'min_date': (EPOCH + timedelta(days=int(day.min()))).isoformat(),
+                    'max_date': (EPOCH + timedelta(days=int(day.max()))).isoformat(),
+                }
+            else:
+                del partitions[key]
+                emptied.append(key)
+        if removed:
+            self._write_manifest(dict(manifest, partitions=partitions))
+        # Only once the manifest no longer lists them
+        for key in emptied:
+            shutil.rmtree(os.path.join(self.path, key), ignore_errors=True)
+        return removed
+
+    def closed_months(self, keep_months: int, today: Optional[date] = None) -> List[str]:
+        """Months with hot rows that are older than the newest keep_months months"""
+        today = today or date.today()
+        cutoff = today.replace(day=1)
+        for _ in range(keep_months - 1):
+            cutoff = (cutoff - timedelta(days=1)).replace(day=1)
+        first = DailyCount.objects.filter(date__lt=cutoff).order_by('date').values_list('date', flat=True).first()
+        keys = []
+        while first is not None and first < cutoff:
+            keys.append(month_key(first))
+            first = month_bounds(month_key(first))[1]
+        return keys
+
+    # Reading
+
+    def earliest_date(self) -> Optional[date]:
+        """First date held hot or archived, or None when there are no counts"""
+        candidates = [date.fromisoformat(p['min_date']) for p in self.manifest()['partitions'].values()]
+        first = DailyCount.objects.order_by('date').values_list('date', flat=True).first()
+        if first is not None:
+            candidates.append(first)
+        return min(candidates) if candidates else None
+
+    @staticmethod
+    def _dedupe(product: np.ndarray, day: np.ndarray, count: np.ndarray) -> Tuple[np.ndarray, ...]:
+        """Sort by (product, date) keeping the first occurrence of each key"""
+        key = (product.astype(np.int64) << 32) | (day.astype(np.int64) & 0xFFFFFFFF)
+        _, first = np.unique(key, return_index=True)
+        return product[first], day[first], count[first]
+
+    def read_cold(self, start: date, end: date, product_ids: Optional[Iterable[int]] = None) -> Tuple[np.ndarray, ...]:
+        """Archived rows with start <= date <= end"""
+        lo, hi = to_days(start), to_days(end)
+        wanted = np.array(sorted(product_ids), dtype=np.int32) if product_ids is not None else None
+        parts = []
+        for key in sorted(self.manifest()['partitions']):
+            month_start, month_end = month_bounds(key)
+            if month_end <= start or month_start > end:
+                continue
+            product, day, count = self._load_partition(key)
+            mask = (day >= lo) & (day <= hi)
+            if wanted is not None:
+                mask &= np.isin(product, wanted)
+            parts.append((product[mask], day[mask], count[mask]))
+        if not parts:
+            empty = np.empty(0, dtype=np.int32)
+            return empty, empty, empty
+        return tuple(np.concatenate(column) for column in zip(*parts))
+
+    def read_window(self, start: date, end: date, product_ids: Optional[Iterable[int]] = None) -> CountWindow:
+        """Union of hot and archived daily counts with start <= date <= end"""
+        if product_ids is not None:
+            product_ids = list(product_ids)
+        hot = DailyCount.objects.filter(date__gte=start, date__lte=end)
+        if product_ids is not None:
+            hot = hot.filter(product_id__in=product_ids)
+        hot_product, hot_day, hot_count = rows_to_columns(list(
+            hot.order_by('product_id', 'date').values_list('product_id', 'date', 'count')
+        ))
+
+        cold_product, cold_day, cold_count = self.read_cold(start, end, product_ids)
+        if not len(cold_product):
+            return CountWindow(hot_product, hot_day, hot_count)
+        # Hot rows come first so _dedupe keeps them over archived copies
+        return CountWindow(*self._dedupe(
+            np.concatenate((hot_product, cold_product)),
+            np.concatenate((hot_day, cold_day)),
+            np.concatenate((hot_count, cold_count)),
+        ))
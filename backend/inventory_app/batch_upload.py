@@ -0,0 +1,172 @@
+"""
+Batch upload of many shelf images, as separate files or one ZIP archive
+
+A clerk photographing an aisle sends all pictures in one request instead
+of one upload per picture. ZIP archives are read entry by entry from the
+uploaded file; nothing is extracted to disk. Images are analysed
+BATCH_UPLOAD_SIZE at a time (decoded from memory and run in parallel by
+InferenceService.run_inference_batch) and copied to storage, and
+the images and their counts are written in a single transaction at the
+end. Only one group of images is held in memory at a time.
+
+Entries that are not images, are too large or cannot be decoded do not
+fail the batch: they are reported in the per-image results.
+"""
+import os
+import time
+import zipfile
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from django.conf import settings
+from .ingest_service import IngestService
+from .metrics import span
+
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif')
+ARCHIVE_EXTENSIONS = ('.zip',)
+
+
+class BatchError(ValueError):
+    """Raised when a batch cannot be processed at all"""
+
+
+@dataclass
+class BatchEntry:
+    """One image of a batch; data is None when the entry was rejected with error"""
+    name: str
+    data: Optional[bytes] = None
+    error: Optional[str] = None
+
+
+def _is_archive(uploaded) -> bool:
+    return uploaded.name.lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+def _skipped(name: str) -> bool:
+    """Directories and the metadata macOS adds to archives"""
+    base = os.path.basename(name)
+    return name.endswith('/') or name.startswith('__MACOSX/') or base.startswith('.') or not base
+
+
+def iter_entries(files: Iterable, max_files: Optional[int] = None,
+                 max_file_size: Optional[int] = None) -> Iterator[BatchEntry]:
+    """
+    Yield the images of uploaded files, expanding ZIP archives.
+
+    Raises BatchError when there are more than max_files images or an
+    archive is not a valid ZIP file.
+    """
+    max_files = max_files or getattr(settings, 'BATCH_UPLOAD_MAX_FILES', 100)
+    max_file_size = max_file_size or getattr(settings, 'BATCH_UPLOAD_MAX_FILE_SIZE', 20 * 1024 * 1024)
+    seen = 0
+
+    def entry(name: str, size: int, read) -> BatchEntry:
+        nonlocal seen
+        seen += 1
+        if seen > max_files:
+            raise BatchError(f'A batch may hold at most {max_files} images')
+        if not name.lower().endswith(IMAGE_EXTENSIONS):
+            return BatchEntry(name, error='Not an image file (JPG, PNG, GIF)')
+        if size > max_file_size:
+            return BatchEntry(name, error=f'Image is larger than {max_file_size} bytes')
+        # Bound the read too: the size recorded in an archive can lie
+        data = read(max_file_size + 1)
+        if len(data) > max_file_size:
+            return BatchEntry(name, error=f'Image is larger than {max_file_size} bytes')
+        return BatchEntry(name, data)
+
+    for uploaded in files:
+        if not _is_archive(uploaded):
+            yield entry(uploaded.name, uploaded.size, uploaded.read)
+            continue
+        try:
+            archive = zipfile.ZipFile(uploaded)
+        except zipfile.BadZipFile:
+            raise BatchError(f'{uploaded.name} is not a valid ZIP archive')
+        with archive:
+            for info in archive.infolist():
+                if _skipped(info.filename):
+                    continue
+                try:
+                    with archive.open(info) as member:
+                        yield entry(info.filename, info.file_size, member.read)
+                except (zipfile.BadZipFile, NotImplementedError, RuntimeError) as e:
+                    # Corrupt, encrypted or unsupported compression
+                    yield BatchEntry(info.filename, error=f'Cannot read archive entry: {e}')
+
+
+class BatchUploadService:
+    """Inference, storage copy and one database transaction for a batch of images"""
+
+    def __init__(self, inference_service, storage_service, ingest_service: Optional[IngestService] = None,
+                 batch_size: Optional[int] = None):
+        self.inference_service = inference_service
+        self.storage_service = storage_service
+        self.ingest_service = ingest_service or IngestService()
+        self.batch_size = batch_size or getattr(settings, 'BATCH_UPLOAD_SIZE', 8)
+
+    def run(self, entries: Iterable[BatchEntry]) -> Dict:
+        """Analyse and store the entries; returns the batch API response body"""
+        start_time = time.time()
+        results: List[Dict] = []
+        analysed = []  # (index in results, storage path, detections)
+        group: List[Tuple[int, BatchEntry]] = []
+
+        def flush():
+            detections = self.inference_service.run_inference_batch([item.data for _, item in group])
+            for (index, item), found in zip(group, detections):
+                if found is None:
+                    results[index].update({'status': 'failed', 'error': 'Not a valid image'})
+                elif not found:
+                    results[index].update({'status': 'failed', 'error': 'No product detected in the image'})
+                else:
+                    with span('storage'):
+                        storage_path = self.storage_service.save_bytes(item.data, item.name)
+                    analysed.append((index, storage_path, found))
+                    results[index]['status'] = 'ok'
+            group.clear()
+
+        try:
+            for item in entries:
+                if item.data is None:
+                    results.append({'filename': item.name, 'status': 'failed', 'error': item.error})
+                    continue
+                group.append((len(results), item))
+                results.append({'filename': item.name})
+                if len(group) >= self.batch_size:
+                    flush()
+            if group:
+                flush()
+            processing_time = time.time() - start_time
+
+            recorded = []
+            if analysed:
+                with span('db'):
+                    recorded = self.ingest_service.record_images([(path, found) for _, path, found in analysed])
+        except BaseException:
+            # No row refers to the files stored so far; don't leave them for gc_storage
+            for _, storage_path, _ in analysed:
+                self.storage_service.delete(storage_path)
+            raise
+
+        products: Dict[str, int] = {}
+        for (index, _, _), (db_image, detection_results, total_products) in zip(analysed, recorded):
+            results[index].update({
+                'image_id': db_image.id,
+                'detections': detection_results,
+                'total_products': total_products,
+            })
+            for detection in detection_results:
+                products[detection['product_name']] = products.get(detection['product_name'], 0) + detection['count']
+
+        return {
+            'results': results,
+            'summary': {
+                'images': len(results),
+                'succeeded': len(recorded),
+                'failed': len(results) - len(recorded),
+                'total_products': sum(products.values()),
+                'products': products,
+                'processing_time': round(processing_time, 2),
+            },
+        }
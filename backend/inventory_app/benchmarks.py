@@ -0,0 +1,631 @@
+"""
+Micro-benchmarks for the inventory backend
+
+Each benchmark is a function registered under a name and run with
+`python manage.py benchmark <name>`. It receives the requested size and
+returns a dict of measurements, which the command prints.
+"""
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+from typing import Callable, Dict
+import numpy as np
+from django.db import transaction
+
+
+BENCHMARKS: Dict[str, Callable[[int], Dict]] = {}
+
+
+def register(name: str):
+    """Register a benchmark function under name"""
+    def decorator(func):
+        BENCHMARKS[name] = func
+        return func
+    return decorator
+
+
+def timed(func, repeat: int = 5) -> float:
+    """Best wall time of func over repeat runs, in seconds"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+class _Rollback(Exception):
+    pass
+
+
+@contextmanager
+def rolled_back():
+    """Run database writes in a transaction that is always rolled back"""
+    try:
+        with transaction.atomic():
+            yield
+            raise _Rollback
+    except _Rollback:
+        pass
+
+
+def seed_daily_counts(products: int, days: int, end: date = None):
+    """Create products with one DailyCount per day for the last days days"""
+    from .models import Product, DailyCount
+
+    end = end or date.today()
+    rng = np.random.default_rng(0)
+    Product.objects.bulk_create([
+        Product(name=f'bench-product-{i}', category=f'bench-category-{i % 10}') for i in range(products)
+    ])
+    ids = list(Product.objects.filter(name__startswith='bench-product-').values_list('id', flat=True))
+    counts = rng.integers(0, 100, (len(ids), days)).tolist()
+    DailyCount.objects.bulk_create(
+        (
+            DailyCount(product_id=product_id, date=end - timedelta(days=d), count=counts[i][d])
+            for i, product_id in enumerate(ids) for d in range(days)
+        ),
+        batch_size=5000,
+    )
+    return ids
+
+
+def _sqlite_bytes(schema: str, insert: str, rows) -> int:
+    """On-disk size of a fresh SQLite file holding rows, after VACUUM"""
+    fd, path = tempfile.mkstemp(suffix='.sqlite3')
+    os.close(fd)
+    try:
+        conn = sqlite3.connect(path)
+        conn.executescript(schema)
+        conn.executemany(insert, rows)
+        conn.commit()
+        conn.execute('VACUUM')
+        conn.close()
+        return os.path.getsize(path)
+    finally:
+        os.remove(path)
+
+
+@register('detections')
+def bench_detections(size: int) -> Dict:
+    """Storage and decode cost of packed detection blobs vs a table and JSON"""
+    from .detections import DETECTION_DTYPE, detections_to_dicts, unpack_detections
+
+    per_image = 40
+    images = max(size // per_image, 1)
+    rng = np.random.default_rng(0)
+    array = np.zeros(images * per_image, dtype=DETECTION_DTYPE)
+    array['product'] = rng.integers(1, 200, len(array))
+    for name in ('x1', 'y1', 'x2', 'y2'):
+        array[name] = rng.integers(0, 4000, len(array))
+    array['confidence'] = rng.random(len(array), dtype=np.float32)
+    blobs = [array[i * per_image:(i + 1) * per_image].tobytes() for i in range(images)]
+    total = len(array)
+
+    table_bytes = _sqlite_bytes(
+        'CREATE TABLE d (id INTEGER PRIMARY KEY, image_id INTEGER, product_id INTEGER,'
+        ' x1 INTEGER, y1 INTEGER, x2 INTEGER, y2 INTEGER, confidence REAL);'
+        'CREATE INDEX d_image ON d (image_id);',
+        'INSERT INTO d (image_id, product_id, x1, y1, x2, y2, confidence) VALUES (?, ?, ?, ?, ?, ?, ?)',
+        ((i // per_image, *row) for i, row in enumerate(array.tolist())),
+    )
+    blob_bytes = _sqlite_bytes(
+        'CREATE TABLE i (id INTEGER PRIMARY KEY, detections BLOB);',
+        'INSERT INTO i (detections) VALUES (?)',
+        ((blob,) for blob in blobs),
+    )
+    json_payloads = [json.dumps(detections_to_dicts(unpack_detections(b))) for b in blobs]
+
+    decode_blob = timed(lambda: [unpack_detections(b) for b in blobs])
+    decode_json = timed(lambda: [json.loads(p) for p in json_payloads], repeat=3)
+
+    return {
+        'detections': total,
+        'record_bytes': DETECTION_DTYPE.itemsize,
+        'sqlite_blob_bytes_per_detection': round(blob_bytes / total, 1),
+        'sqlite_table_bytes_per_detection': round(table_bytes / total, 1),
+        'json_bytes_per_detection': round(sum(len(p) for p in json_payloads) / total, 1),
+        'blob_decode_us_per_image': round(decode_blob / images * 1e6, 2),
+        'json_decode_us_per_image': round(decode_json / images * 1e6, 2),
+    }
+
+
+@register('archive')
+def bench_archive(size: int) -> Dict:
+    """365-day window read with everything hot vs with closed months archived"""
+    from .archive import DailyCountArchive
+
+    products = max(size // 365, 1)
+    archive_dir = tempfile.mkdtemp(prefix='count-archive-')
+    archive = DailyCountArchive(path=archive_dir)
+    end = date.today()
+    start = end - timedelta(days=364)
+    results = {'rows': products * 365}
+    try:
+        with rolled_back():
+            seed_daily_counts(products, 365, end)
+            results['hot_read_ms'] = round(timed(lambda: archive.read_window(start, end)) * 1000, 2)
+            for key in archive.closed_months(keep_months=3):
+                archive.archive_month(key)
+            results['archived_rows'] = sum(p['rows'] for p in archive.manifest()['partitions'].values())
+            results['mixed_read_ms'] = round(timed(lambda: archive.read_window(start, end)) * 1000, 2)
+            results['archive_bytes'] = sum(
+                os.path.getsize(os.path.join(root, name))
+                for root, _, names in os.walk(archive_dir) for name in names
+            )
+    finally:
+        shutil.rmtree(archive_dir, ignore_errors=True)
+    return results
+
+
+@register('rollups')
+def bench_rollups(size: int) -> Dict:
+    """12-week category totals: summing DailyCount rows in Python vs reading the rollup table"""
+    from collections import defaultdict
+    from .models import DailyCount
+    from .archive import DailyCountArchive
+    from .rollups import RollupService, week_start
+
+    products = max(size // 365, 1)
+    end = date.today()
+    start = end - timedelta(days=83)
+    archive_dir = tempfile.mkdtemp(prefix='count-archive-')
+    service = RollupService(archive=DailyCountArchive(path=archive_dir))
+    results = {'rows': products * 365}
+
+    def python_sum():
+        totals = defaultdict(int)
+        for category, day, count in DailyCount.objects.filter(
+            date__gte=start, date__lte=end
+        ).values_list('product__category', 'date', 'count'):
+            totals[(category, week_start(day))] += count
+        return totals
+
+    try:
+        with rolled_back():
+            seed_daily_counts(products, 365, end)
+            results['rebuild_ms'] = round(timed(service.rebuild, repeat=1) * 1000, 2)
+            results['python_sum_ms'] = round(timed(python_sum) * 1000, 2)
+            results['rollup_query_ms'] = round(timed(lambda: service.query('category-week', start, end)) * 1000, 2)
+            results['rollup_rows'] = len(service.query('category-week', start, end))
+    finally:
+        shutil.rmtree(archive_dir, ignore_errors=True)
+    return results
+
+
+@register('export')
+def bench_export(size: int) -> Dict:
+    """Rows per second and peak Python memory of streaming the counts export in each format"""
+    import tracemalloc
+    from .archive import DailyCountArchive
+    from .export import FORMATS, ExportService, pa
+
+    products = max(size // 365, 1)
+    archive_dir = tempfile.mkdtemp(prefix='count-archive-')
+    service = ExportService(archive=DailyCountArchive(path=archive_dir))
+    results = {'rows': products * 365}
+    try:
+        with rolled_back():
+            seed_daily_counts(products, 365)
+            for fmt in FORMATS:
+                if fmt == 'parquet' and pa is None:
+                    continue
+                drain = lambda: sum(len(chunk) for chunk in service.stream('counts', fmt))
+                elapsed = timed(drain, repeat=1)
+                # Second pass under tracemalloc, which slows allocation down
+                tracemalloc.start()
+                drain()
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                results[f'{fmt}_rows_per_s'] = round(results['rows'] / elapsed)
+                results[f'{fmt}_peak_kb'] = round(peak / 1024)
+    finally:
+        shutil.rmtree(archive_dir, ignore_errors=True)
+    return results
+
+
+@register('import')
+def bench_import(size: int) -> Dict:
+    """Bulk import of a generated CSV of size rows (1000 products, consecutive days)"""
+    from .archive import DailyCountArchive
+    from .bulk_import import CountImporter
+
+    products = min(size, 1000)
+    days = max(size // products, 1)
+    end = date.today()
+    archive_dir = tempfile.mkdtemp(prefix='count-archive-')
+    fd, path = tempfile.mkstemp(suffix='.csv')
+    rng = np.random.default_rng(0)
+    with os.fdopen(fd, 'w') as f:
+        f.write('product_name,date,count,category\n')
+        for d in range(days):
+            day = (end - timedelta(days=days - d)).isoformat()
+            counts = rng.integers(0, 100, products).tolist()
+            f.writelines(
+                f'bench-import-{p},{day},{counts[p]},bench-category-{p % 10}\n' for p in range(products)
+            )
+    results = {'rows': products * days}
+    try:
+        with rolled_back():
+            with open(path, encoding='utf-8', newline='') as stream:
+                report = CountImporter(archive=DailyCountArchive(path=archive_dir)).import_stream(stream, 'csv')
+            results['elapsed_s'] = round(report.elapsed, 2)
+            results['rows_per_s'] = round(report.rows_per_second)
+            results['products_created'] = report.products_created
+    finally:
+        os.remove(path)
+        shutil.rmtree(archive_dir, ignore_errors=True)
+    return results
+
+
+
+@register('serialization')
+def bench_serialization(size: int) -> Dict:
+    """Daily count listing: DRF serializers + stdlib JSON vs values() + orjson, and bytes on the wire"""
+    from rest_framework.renderers import JSONRenderer
+    from .compression import brotli, compress
+    from .models import Product, DailyCount
+    from .renderers import FastJSONRenderer, orjson
+    from .serializers import DailyCountSerializer
+
+    products = max(size // 30, 1)
+    results = {'rows': products * 30, 'orjson': orjson is not None}
+    with rolled_back():
+        ids = seed_daily_counts(products, 30)
+        # Persian names and categories, as in production
+        for product_id in ids:
+            Product.objects.filter(id=product_id).update(
+                name=f'شیر پرچرب پاستوریزه یک لیتری {product_id}', category='لبنیات'
+            )
+        hot = DailyCount.objects.filter(product_id__in=ids).order_by('product_id', 'date')
+
+        def serializer_stdlib():
+            return JSONRenderer().render(DailyCountSerializer(hot.select_related('product'), many=True).data)
+
+        def values_fast():
+            return FastJSONRenderer().render([
+                {
+                    'id': row_id, 'date': day, 'count': count,
+                    'product': {'id': product_id, 'name': name, 'category': category},
+                }
+                for row_id, day, count, product_id, name, category in hot.values_list(
+                    'id', 'date', 'count', 'product_id', 'product__name', 'product__category'
+                )
+            ])
+
+        results['serializer_stdlib_ms'] = round(timed(serializer_stdlib, repeat=3) * 1000, 2)
+        results['values_fast_ms'] = round(timed(values_fast, repeat=3) * 1000, 2)
+        body = values_fast()
+        results['json_bytes'] = len(body)
+        results['gzip_bytes'] = len(compress(body, 'gzip'))
+        results['gzip_ms'] = round(timed(lambda: compress(body, 'gzip')) * 1000, 2)
+        if brotli is not None:
+            results['br_bytes'] = len(compress(body, 'br'))
+            results['br_ms'] = round(timed(lambda: compress(body, 'br')) * 1000, 2)
+    return results
+
+
+@register('packing')
+def bench_packing(size: int) -> Dict:
+    """Size and decode time of a count listing as JSON, plain MessagePack and the packed format"""
+    import gzip
+    from .packing import msgpack, pack, unpack
+    from .renderers import FastJSONRenderer
+
+    if msgpack is None:
+        return {'error': 'msgpack is not installed'}
+    rng = np.random.default_rng(0)
+    end = date.today()
+    products = [
+        {'id': i + 1, 'name': f'شیر پرچرب پاستوریزه یک لیتری {i}', 'category': 'لبنیات'}
+        for i in range(max(size // 30, 1))
+    ]
+    payload = [
+        {'id': n + 1, 'product': products[n // 30], 'date': end - timedelta(days=n % 30),
+         'count': int(count)}
+        for n, count in enumerate(rng.integers(0, 100, len(products) * 30))
+    ]
+    bodies = {
+        'json': FastJSONRenderer().render(payload),
+        'msgpack': msgpack.packb(json.loads(FastJSONRenderer().render(payload)), use_bin_type=True),
+        'packed': pack(payload),
+    }
+    decoders = {'json': json.loads, 'msgpack': msgpack.unpackb, 'packed': unpack}
+    results = {'rows': len(payload)}
+    for name, body in bodies.items():
+        results[f'{name}_bytes'] = len(body)
+        results[f'{name}_gzip_bytes'] = len(gzip.compress(body))
+        results[f'{name}_decode_ms'] = round(timed(lambda: decoders[name](body)) * 1000, 2)
+    return results
+
+
+@register('uploads')
+def bench_uploads(size: int) -> Dict:
+    """Sustained uploads per second: synchronous upload vs async enqueue (202), and one worker's drain rate"""
+    import cv2
+    from django.core.files.uploadedfile import SimpleUploadedFile
+    from django.test import Client
+    from . import views
+    from .inference_service import StorageService
+    from .ingest_service import UploadPipeline
+    from .jobs import UploadQueue, UploadWorker
+
+    uploads = min(size, 200)
+    rng = np.random.default_rng(0)
+    _, encoded = cv2.imencode('.jpg', rng.integers(0, 256, (960, 1280, 3), dtype=np.uint8))
+    image = encoded.tobytes()
+    work_dir = tempfile.mkdtemp(prefix='upload-bench-')
+    storage = StorageService()
+    storage.local_storage_path = work_dir
+    pipeline = UploadPipeline(views.inference_service, storage, views.ingest_service)
+    queue = UploadQueue(path=os.path.join(work_dir, 'queue.sqlite3'), spool_path=os.path.join(work_dir, 'spool'))
+    saved = views.upload_pipeline, views.upload_queue
+    views.upload_pipeline, views.upload_queue = pipeline, queue
+    client = Client()
+    results = {'uploads': uploads, 'image_kb': round(len(image) / 1024)}
+
+    def post_all(url):
+        latencies = []
+        start = time.perf_counter()
+        for i in range(uploads):
+            sent = time.perf_counter()
+            response = client.post(url, {'file': SimpleUploadedFile(f'shelf-{i}.jpg', image, 'image/jpeg')})
+            latencies.append(time.perf_counter() - sent)
+            assert response.status_code in (200, 202), response.status_code
+        return time.perf_counter() - start, latencies
+
+    try:
+        with rolled_back():
+            for mode, url in (('sync', '/api/v1/images/upload'), ('async', '/api/v1/images/upload?async=1')):
+                elapsed, latencies = post_all(url)
+                results[f'{mode}_uploads_per_s'] = round(uploads / elapsed, 1)
+                results[f'{mode}_p50_ms'] = round(float(np.percentile(latencies, 50)) * 1000, 1)
+                results[f'{mode}_p99_ms'] = round(float(np.percentile(latencies, 99)) * 1000, 1)
+            # run_once rather than run(): run() recycles database connections,
+            # which would end the rolled back transaction
+            worker = UploadWorker(queue=queue, pipeline=pipeline)
+            start = time.perf_counter()
+            while worker.run_once():
+                pass
+            results['worker_jobs_per_s'] = round(uploads / (time.perf_counter() - start), 1)
+            results['jobs'] = queue.stats()
+    finally:
+        views.upload_pipeline, views.upload_queue = saved
+        queue.close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+
+@register('batch_uploads')
+def bench_batch_uploads(size: int) -> Dict:
+    """One aisle of photos: sequential single uploads vs one batch of files vs one ZIP archive"""
+    import io
+    import zipfile
+    import cv2
+    from django.core.files.uploadedfile import SimpleUploadedFile
+    from django.test import Client
+    from . import views
+    from .batch_upload import BatchUploadService
+    from .inference_service import StorageService
+    from .ingest_service import UploadPipeline
+
+    images = min(size, 100)
+    rng = np.random.default_rng(0)
+    _, encoded = cv2.imencode('.jpg', rng.integers(0, 256, (960, 1280, 3), dtype=np.uint8))
+    image = encoded.tobytes()
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, 'w', zipfile.ZIP_STORED) as zf:
+        for i in range(images):
+            zf.writestr(f'aisle/shelf-{i}.jpg', image)
+    work_dir = tempfile.mkdtemp(prefix='batch-bench-')
+    storage = StorageService()
+    storage.local_storage_path = work_dir
+    saved = views.upload_pipeline, views.batch_upload_service
+    views.upload_pipeline = UploadPipeline(views.inference_service, storage, views.ingest_service)
+    views.batch_upload_service = BatchUploadService(views.inference_service, storage, views.ingest_service)
+    client = Client()
+    results = {'images': images, 'image_kb': round(len(image) / 1024), 'cpus': os.cpu_count()}
+
+    def single():
+        for i in range(images):
+            response = client.post('/api/v1/images/upload', {'file': SimpleUploadedFile(f'shelf-{i}.jpg', image, 'image/jpeg')})
+            assert response.status_code == 200, response.status_code
+
+    def batch():
+        files = [SimpleUploadedFile(f'shelf-{i}.jpg', image, 'image/jpeg') for i in range(images)]
+        response = client.post('/api/v1/images/upload/batch', {'files': files})
+        assert response.status_code == 200 and response.json()['summary']['succeeded'] == images
+
+    def zipped():
+        upload = SimpleUploadedFile('aisle.zip', archive.getvalue(), 'application/zip')
+        response = client.post('/api/v1/images/upload/batch', {'file': upload})
+        assert response.status_code == 200 and response.json()['summary']['succeeded'] == images
+
+    try:
+        # Inference alone, to separate what batching saves around it
+        inference = timed(lambda: views.inference_service.run_inference_batch([image] * images), repeat=3)
+        results['inference_s'] = round(inference, 2)
+        for name, func in (('single', single), ('batch', batch), ('zip', zipped)):
+            with rolled_back():
+                elapsed = timed(func, repeat=3)
+            results[f'{name}_s'] = round(elapsed, 2)
+            results[f'{name}_images_per_s'] = round(images / elapsed, 1)
+            results[f'{name}_overhead_ms_per_image'] = round((elapsed - inference) / images * 1000, 1)
+        results['batch_speedup'] = round(results['single_s'] / results['batch_s'], 2)
+    finally:
+        views.upload_pipeline, views.batch_upload_service = saved
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+
+@register('bootstrap')
+def bench_bootstrap(size: int) -> Dict:
+    """Dashboard page load: the five separate requests vs one /dashboard/bootstrap"""
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+    from django.utils import timezone
+    from .models import Image
+
+    client = Client()
+    results = {'products': size, 'days': 30}
+
+    def separate():
+        cursor = None
+        while True:
+            url = '/api/v1/products?limit=500' + (f'&cursor={cursor}' if cursor else '')
+            response = client.get(url)
+            cursor = response.get('X-Next-Cursor')
+            if not cursor:
+                break
+        for url in ('/api/v1/analytics/daily', '/api/v1/analytics/weekly?days=7',
+                    '/api/v1/recommendations/weekly?days=7', '/api/v1/images?limit=50'):
+            assert client.get(url).status_code == 200, url
+
+    def bootstrap():
+        assert client.get('/api/v1/dashboard/bootstrap').status_code == 200
+
+    with rolled_back():
+        seed_daily_counts(size, 30)
+        Image.objects.bulk_create([
+            Image(date=timezone.now(), path=f'images/bench-{i}.jpg', confidence_summary='') for i in range(200)
+        ])
+        for name, func in (('separate', separate), ('bootstrap', bootstrap)):
+            with CaptureQueriesContext(connection) as queries:
+                func()
+            results[f'{name}_queries'] = len(queries)
+            results[f'{name}_ms'] = round(timed(func) * 1000, 1)
+        results['speedup'] = round(results['separate_ms'] / results['bootstrap_ms'], 1)
+    return results
+
+
+@register('profiler')
+def bench_profiler(size: int) -> Dict:
+    """Slowdown of CPU-bound work while the stack sampler runs, by sampling interval"""
+    import cv2
+    from .inference_service import InferenceService
+    from .packing import pack
+    from .profiling import StackSampler
+
+    inference = InferenceService()
+    image = cv2.imencode('.jpg', np.random.default_rng(0).integers(0, 255, (480, 640, 3), dtype=np.uint8))[1].tobytes()
+    rows = [{'product_id': i, 'product_name': f'product-{i % 50}', 'date': f'2025-01-{i % 28 + 1:02d}', 'count': i}
+            for i in range(size)]
+    workloads = {
+        # Mostly native code (cv2) that releases the GIL
+        'inference': lambda: inference.run_inference_batch([image]),
+        # Pure Python holding the GIL
+        'python': lambda: pack(rows),
+    }
+
+    results = {}
+    for name, work in workloads.items():
+        baseline = timed(work, repeat=20)
+        results[f'{name}_ms'] = round(baseline * 1000, 2)
+        for interval_ms in (1, 5, 10):
+            # The sampler thread samples this one, as it would a request thread
+            sampler = StackSampler(interval_ms / 1000)
+            sampler.start()
+            try:
+                elapsed = timed(work, repeat=20)
+            finally:
+                profile = sampler.stop()
+            results[f'{name}_slowdown_{interval_ms}ms'] = f'{(elapsed / baseline - 1) * 100:.1f}%'
+            results[f'{name}_sampling_{interval_ms}ms'] = f'{profile.overhead * 100:.1f}%'
+    return results
+
+
+def _mixed_load(path: str, pragmas: Dict, lock_factory, readers: int, writers: int, duration: float) -> Dict:
+    """Run reader and writer threads against an SQLite file and count outcomes"""
+    stats = {'reads': 0, 'writes': 0, 'locked_errors': 0}
+    stats_lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def connect():
+        conn = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+        for name, value in pragmas.items():
+            conn.execute(f'PRAGMA {name}={value}')
+        return conn
+
+    def bump(key):
+        with stats_lock:
+            stats[key] += 1
+
+    def reader():
+        conn = connect()
+        while time.perf_counter() < deadline:
+            try:
+                conn.execute('SELECT product, SUM(count) FROM c WHERE day >= ? GROUP BY product', (300,)).fetchall()
+                bump('reads')
+            except sqlite3.OperationalError:
+                bump('locked_errors')
+        conn.close()
+
+    def writer(n):
+        conn = connect()
+        rng = np.random.default_rng(n)
+        while time.perf_counter() < deadline:
+            product = int(rng.integers(0, 100))
+            try:
+                # Read-then-write, like get_or_create followed by update_or_create
+                with lock_factory():
+                    conn.execute('BEGIN')
+                    try:
+                        conn.execute('SELECT count FROM c WHERE product = ? AND day = 365', (product,)).fetchone()
+                        conn.execute('UPDATE c SET count = count + 1 WHERE product = ? AND day = 365', (product,))
+                        conn.execute('COMMIT')
+                    except Exception:
+                        conn.execute('ROLLBACK')
+                        raise
+                bump('writes')
+            except sqlite3.OperationalError:
+                bump('locked_errors')
+        conn.close()
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    threads += [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {key: round(value / duration) if key != 'locked_errors' else value for key, value in stats.items()}
+
+
+@register('sqlite_concurrency')
+def bench_sqlite_concurrency(size: int) -> Dict:
+    """Mixed readers and writers on SQLite: default settings vs the sqlite-production profile"""
+    from contextlib import nullcontext
+    from django.conf import settings
+    from .database import exclusive_lock
+
+    rows = min(size, 100 * 366)
+    results = {}
+    for profile in ('default', 'sqlite-production'):
+        directory = tempfile.mkdtemp(prefix='sqlite-bench-')
+        path = os.path.join(directory, 'bench.sqlite3')
+        try:
+            conn = sqlite3.connect(path)
+            conn.execute('CREATE TABLE c (product INTEGER, day INTEGER, count INTEGER, PRIMARY KEY (product, day))')
+            conn.executemany('INSERT INTO c VALUES (?, ?, 0)', ((i % 100, i // 100) for i in range(rows)))
+            conn.executemany('INSERT OR IGNORE INTO c VALUES (?, 365, 0)', ((p,) for p in range(100)))
+            conn.commit()
+            conn.close()
+
+            if profile == 'default':
+                pragmas, lock_factory = {}, nullcontext
+            else:
+                pragmas = settings.SQLITE_PRODUCTION_PRAGMAS
+                lock_factory = lambda: exclusive_lock(path + '.writer.lock')
+            stats = _mixed_load(path, pragmas, lock_factory, readers=4, writers=4, duration=3.0)
+            for key, value in stats.items():
+                results[f'{profile}_{key}' + ('_per_s' if key != 'locked_errors' else '')] = value
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+    return results
+
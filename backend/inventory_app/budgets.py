@@ -0,0 +1,130 @@
+"""
+Query-count and latency budgets for the read endpoints
+
+The budgets are enforced by inventory_app/tests/test_budgets.py:
+
+    python manage.py test inventory_app.tests.test_budgets
+
+For each scale in SCALES the tests seed the test database with synthetic
+data (products with DAYS days of counts each plus one archived month
+before them, a few analysed images and their rollups), request every endpoint in ENDPOINTS through the test
+client and assert with assertNumQueries that it runs exactly the number
+of queries recorded in the baseline file for that endpoint and scale.
+Endpoints whose query count must not depend on the data must have the
+same count at every scale, so an N+1 loop fails even after a careless
+baseline update.
+
+Latency is only checked with PERF_LATENCY=1, and only when the baseline
+was recorded on the same kind of machine (Python version, CPU count,
+database vendor): a request may then take at most baseline *
+(1 + LATENCY_TOLERANCE) + LATENCY_SLACK_MS.
+
+The baseline (PERF_BASELINE_PATH, perf_baseline.json next to manage.py)
+is committed, so a change that makes an endpoint run more queries shows
+up in review as a baseline diff. After an intended change, rewrite it
+with PERF_BASELINE_UPDATE=1, which records instead of asserting.
+
+Only the Django app is covered; the FastAPI app in app/ is not.
+"""
+import json
+import os
+import platform
+from datetime import date, timedelta
+from typing import Dict, Optional, Sequence, Tuple
+from django.conf import settings
+from django.db import connection
+from django.test import Client
+from .benchmarks import seed_daily_counts
+
+
+SCALES = (10, 100, 1000)
+DAYS = 30
+IMAGES = 5
+LATENCY_TOLERANCE = 0.5
+LATENCY_SLACK_MS = 2.0
+
+# (name, path, query count independent of the data); {product_id},
+# {image_id} and {archived_start} are filled in from the seeded data
+ENDPOINTS: Sequence[Tuple[str, str, bool]] = (
+    ('products', '/api/v1/products?limit=100', True),
+    ('product_counts', '/api/v1/products/{product_id}/counts?limit=100', True),
+    ('product_series', '/api/v1/products/{product_id}/series', True),
+    # Daily points read from the hot table and the archived month together
+    ('product_series_archived', '/api/v1/products/{product_id}/series?start={archived_start}', True),
+    ('images', '/api/v1/images?limit=50', True),
+    ('image_detections', '/api/v1/images/{image_id}/detections', True),
+    ('daily_summary', '/api/v1/analytics/daily', True),
+    ('weekly_analytics', '/api/v1/analytics/weekly?days=7', True),
+    ('weekly_recommendations', '/api/v1/recommendations/weekly?days=7', True),
+    ('rollups', '/api/v1/analytics/rollups/category-week', True),
+    ('sync', '/api/v1/sync', True),
+    ('dashboard_bootstrap', '/api/v1/dashboard/bootstrap', True),
+    # Streams the whole table in fixed-size batches
+    ('export_counts', '/api/v1/export/counts?format=csv', False),
+)
+
+
+def baseline_path() -> str:
+    return getattr(settings, 'PERF_BASELINE_PATH', os.path.join(settings.BASE_DIR, 'perf_baseline.json'))
+
+
+def load_baseline(path: Optional[str] = None) -> Dict:
+    """{'environment': {...}, 'endpoints': {name: {scale: {'queries', 'latency_ms'}}}}"""
+    try:
+        with open(path or baseline_path(), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'environment': None, 'endpoints': {}}
+
+
+def save_baseline(baseline: Dict, path: Optional[str] = None):
+    with open(path or baseline_path(), 'w', encoding='utf-8') as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def environment() -> Dict:
+    """What latencies depend on besides the code"""
+    return {
+        'python': platform.python_version(),
+        'cpus': os.cpu_count(),
+        'database': connection.vendor,
+    }
+
+
+def seed(products: int, archive) -> Dict[str, object]:
+    """Seed the database for one scale; returns the values the ENDPOINTS paths need"""
+    from .archive import month_bounds, month_key
+    from .inference_service import InferenceService
+    from .ingest_service import IngestService
+    from .models import DailyCount
+    from .rollups import RollupService
+
+    ids = seed_daily_counts(products, DAYS)
+    # A whole month before the hot days, moved to archive
+    key = month_key(date.today() - timedelta(days=DAYS + 31))
+    month_start, month_end = month_bounds(key)
+    DailyCount.objects.bulk_create(
+        (
+            DailyCount(product_id=product_id, date=month_start + timedelta(days=d), count=d)
+            for product_id in ids for d in range((month_end - month_start).days)
+        ),
+        batch_size=5000,
+    )
+    archive.archive_month(key)
+    inference = InferenceService()
+    ingest = IngestService()
+    image = None
+    for i in range(IMAGES):
+        detections = inference._analyze_sauces() if i % 2 else inference._analyze_chips()
+        image, _, _ = ingest.record_image(f'images/budget-{i}.jpg', detections)
+    RollupService(archive=archive).rebuild()
+    return {'product_id': ids[0], 'image_id': image.id, 'archived_start': f'{month_start.isoformat()}T00:00:00'}
+
+
+def fetch(client: Client, path: str) -> int:
+    """GET path, reading streamed bodies to the end; returns the status code"""
+    response = client.get(path)
+    if response.streaming:
+        b''.join(response.streaming_content)
+    return response.status_code
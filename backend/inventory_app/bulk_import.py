@@ -0,0 +1,212 @@
+"""
+Bulk import of historical daily counts from CSV or NDJSON
+
+Each record names a product, a date and a count, and optionally a
+category for products that do not exist yet:
+
+    product_name,date,count,category
+    Milk 1L,2024-03-01,42,dairy
+
+    {"product_name": "Milk 1L", "date": "2024-03-01", "count": 42}
+
+The input is parsed as a stream and imported in chunks. For each chunk,
+product names are resolved with one query (missing products are created
+with one bulk insert) and DailyCount is upserted with a single
+INSERT ... ON CONFLICT DO UPDATE (database.upsert_rows) in its own write
+transaction, along with the matching rollup changes. A failed import can
+therefore simply be run again. Invalid records are skipped and reported
+with their line number.
+"""
+import csv
+import io
+import json
+import time
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Dict, IO, Iterable, Iterator, List, Optional, Tuple
+from django.db import transaction
+from django.utils import timezone
+from .models import Product, DailyCount
+from .archive import EPOCH, DailyCountArchive
+from .rollups import RollupService
+from .changes import next_change_seqs
+from .database import upsert_rows, write_transaction
+
+
+FORMATS = ('csv', 'ndjson')
+MAX_REPORTED_ERRORS = 1000
+
+
+@dataclass
+class ImportReport:
+    """Outcome of a bulk import"""
+    rows_read: int = 0
+    rows_imported: int = 0
+    products_created: int = 0
+    invalid_rows: int = 0
+    errors: List[Dict] = field(default_factory=list)  # first MAX_REPORTED_ERRORS invalid rows
+    elapsed: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows_read / self.elapsed if self.elapsed > 0 else 0.0
+
+    def as_dict(self) -> Dict:
+        return {
+            'rows_read': self.rows_read,
+            'rows_imported': self.rows_imported,
+            'products_created': self.products_created,
+            'invalid_rows': self.invalid_rows,
+            'errors': self.errors,
+            'elapsed': round(self.elapsed, 3),
+            'rows_per_second': round(self.rows_per_second),
+        }
+
+
+def detect_format(filename: str) -> Optional[str]:
+    name = filename.lower()
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    return None
+
+
+def _csv_records(stream: IO[str]) -> Iterator[Tuple[int, object]]:
+    reader = csv.DictReader(stream)
+    if reader.fieldnames:
+        reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
+    for record in reader:
+        yield reader.line_num, record
+
+
+def _ndjson_records(stream: IO[str]) -> Iterator[Tuple[int, object]]:
+    for line_no, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield line_no, json.loads(line)
+        except json.JSONDecodeError as e:
+            yield line_no, ValueError(f'invalid JSON: {e.msg}')
+
+
+def _parse(record) -> Tuple[str, date, int, Optional[str]]:
+    """Validate one record; raises ValueError with a short reason"""
+    if isinstance(record, Exception):
+        raise record
+    if not isinstance(record, dict):
+        raise ValueError('record is not an object')
+    name = str(record.get('product_name') or record.get('product') or '').strip()
+    if not name:
+        raise ValueError('missing product_name')
+    if len(name) > 255:
+        raise ValueError('product_name longer than 255 characters')
+    try:
+        day = date.fromisoformat(str(record.get('date', '')).strip())
+    except ValueError:
+        raise ValueError('date must be YYYY-MM-DD')
+    try:
+        count = int(str(record.get('count', '')).strip())
+    except ValueError:
+        raise ValueError('count must be an integer')
+    if count < 0:
+        raise ValueError('count must not be negative')
+    category = str(record.get('category') or '').strip() or None
+    return name, day, count, category
+
+
+class CountImporter:
+    """Service for streaming CSV or NDJSON count records into DailyCount"""
+
+    def __init__(self, chunk_size: int = 10000, archive: Optional[DailyCountArchive] = None):
+        self.chunk_size = chunk_size
+        self.archive = archive or DailyCountArchive()
+        self.rollup_service = RollupService(archive=self.archive)
+        self._product_ids: Dict[str, int] = {}
+
+    def records(self, stream: IO[str], fmt: str) -> Iterator[Tuple[int, object]]:
+        """(line number, record) pairs of a text stream"""
+        return _csv_records(stream) if fmt == 'csv' else _ndjson_records(stream)
+
+    def import_stream(self, stream: IO[str], fmt: str) -> ImportReport:
+        """Import a text stream in chunks"""
+        report = ImportReport()
+        started = time.time()
+        chunk = []
+        for line_no, record in self.records(stream, fmt):
+            report.rows_read += 1
+            try:
+                chunk.append(_parse(record))
+            except ValueError as e:
+                report.invalid_rows += 1
+                if len(report.errors) < MAX_REPORTED_ERRORS:
+                    report.errors.append({
+                        'line': line_no,
+                        'error': str(e),
+                        'record': record if isinstance(record, dict) else None,
+                    })
+                continue
+            if len(chunk) >= self.chunk_size:
+                self._import_chunk(chunk, report)
+                chunk = []
+        if chunk:
+            self._import_chunk(chunk, report)
+        report.elapsed = time.time() - started
+        return report
+
+    def import_file(self, file: IO[bytes], fmt: str) -> ImportReport:
+        """Import a binary file object such as an uploaded file"""
+        stream = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+        try:
+            return self.import_stream(stream, fmt)
+        finally:
+            stream.detach()
+
+    def _resolve_products(self, chunk: Iterable[Tuple[str, date, int, Optional[str]]],
+                          report: ImportReport) -> Dict[str, int]:
+        """Ids of the chunk's products missing from the name -> id cache, creating missing products"""
+        categories = {name: category for name, _, _, category in chunk if name not in self._product_ids}
+        if not categories:
+            return {}
+        resolved = dict(Product.objects.filter(name__in=list(categories)).values_list('name', 'id'))
+        missing = [name for name in categories if name not in resolved]
+        if missing:
+            seqs = next_change_seqs(len(missing))
+            Product.objects.bulk_create(
+                [Product(name=name, category=categories[name], change_seq=seq) for name, seq in zip(missing, seqs)],
+                batch_size=self.chunk_size
+            )
+            resolved.update(Product.objects.filter(name__in=missing).values_list('name', 'id'))
+            report.products_created += len(missing)
+        return resolved
+
+    def _import_chunk(self, chunk: List[Tuple[str, date, int, Optional[str]]], report: ImportReport):
+        with write_transaction():
+            resolved = self._resolve_products(chunk, report)
+            # Products created by a chunk that rolls back must not stay cached
+            transaction.on_commit(lambda: self._product_ids.update(resolved))
+            product_ids = {**self._product_ids, **resolved}
+            # Later records for the same product and day win
+            latest = {(product_ids[name], day): count for name, day, count, _ in chunk}
+            days = [day for _, day in latest]
+            window = self.archive.read_window(min(days), max(days), {product_id for product_id, _ in latest})
+            previous = {
+                (product_id, EPOCH + timedelta(days=day)): count
+                for product_id, day, count in zip(window.product.tolist(), window.day.tolist(), window.count.tolist())
+            }
+            now = timezone.now()
+            upsert_rows(
+                DailyCount,
+                ('product_id', 'date', 'count', 'change_seq', 'created_at', 'updated_at'),
+                (
+                    (product_id, day, count, seq, now, now)
+                    for ((product_id, day), count), seq in zip(latest.items(), next_change_seqs(len(latest)))
+                ),
+                unique_fields=('product_id', 'date'),
+                update_fields=('count', 'change_seq', 'updated_at'),
+            )
+            self.rollup_service.apply(
+                (product_id, day, previous.get((product_id, day)), count)
+                for (product_id, day), count in latest.items()
+            )
+        report.rows_imported += len(chunk)
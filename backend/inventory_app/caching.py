@@ -0,0 +1,73 @@
+"""
+HTTP conditional caching for read endpoints
+
+Every write bumps the change sequence counter (see changes.py), so the
+counter value is a version of all synced data that costs one primary-key
+lookup to read. @conditional derives the ETag of a GET from that version,
+the view, its arguments, the query string, the Accept header and today's
+date (windows like "the last 7 days" move at midnight), and uses the
+counter's updated_at as Last-Modified. A request whose If-None-Match or
+If-Modified-Since still matches gets a 304 before the view runs.
+
+Inside @replica_reads the version is read from the same database as the
+body, so a replica never pairs an old body with a new ETag.
+"""
+import hashlib
+from datetime import date, datetime
+from functools import wraps
+from typing import Optional, Tuple
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from .models import ChangeSequence
+
+
+def data_version() -> Tuple[int, Optional[datetime]]:
+    """(change sequence value, time of the last change)"""
+    row = ChangeSequence.objects.filter(id=1).values_list('value', 'updated_at').first()
+    return row or (0, None)
+
+
+def conditional(max_age: int = 0):
+    """
+    Add ETag, Last-Modified and Cache-Control to a read view and answer
+    matching conditional requests with 304.
+
+    With max_age 0 shared caches may store the response but must revalidate
+    it on every use. A positive max_age lets them serve it for that many
+    seconds; the response then varies on Cookie, so a client holding a
+    read-your-writes cookie (see database.py) is not served from a copy
+    made before its write.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+
+            version, modified = data_version()
+            key = '|'.join((
+                view.__name__, str(version), date.today().isoformat(), repr(args), repr(sorted(kwargs.items())),
+                request.META.get('QUERY_STRING', ''), request.META.get('HTTP_ACCEPT', ''),
+            ))
+            etag = quote_etag(hashlib.sha1(key.encode('utf-8')).hexdigest()[:20])
+            last_modified = int(modified.timestamp()) if modified else None
+
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = view(request, *args, **kwargs)
+            if response.status_code not in (200, 304):
+                return response
+
+            response.headers.setdefault('ETag', etag)
+            # Heavy listings are also rendered as MessagePack on request
+            patch_vary_headers(response, ['Accept'])
+            if last_modified and not response.has_header('Last-Modified'):
+                response.headers['Last-Modified'] = http_date(last_modified)
+            if max_age:
+                patch_cache_control(response, public=True, max_age=max_age)
+                patch_vary_headers(response, ['Cookie'])
+            else:
+                patch_cache_control(response, public=True, no_cache=True)
+            return response
+        return wrapped
+    return decorator
@@ -0,0 +1,112 @@
+"""
+Change feed for incremental client sync
+
+Products, daily counts and images carry a change_seq column. Every write
+stamps the row with the next number from a single-row counter
+(ChangeSequence), taken inside the write's transaction: the counter row
+stays locked until commit, so numbers become visible in increasing order
+and a client that has seen N can never later miss a change numbered
+below N. Deleting a product or an image leaves a ChangeTombstone with its
+own number. Daily counts are only removed with their product (archiving
+moves them out of the table but does not delete them for clients).
+
+ChangeFeed.changes(since) returns every row whose change_seq is above
+since, plus tombstones, in sequence order, as compact column lists.
+"""
+from typing import Dict, List, Optional, Tuple
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import Product, DailyCount, Image, ChangeSequence, ChangeTombstone
+from .pagination import InvalidCursor, decode_cursor, encode_cursor
+
+
+DEFAULT_SYNC_LIMIT = 1000
+MAX_SYNC_LIMIT = 5000
+
+# Synced tables: model and the fields sent to clients
+SYNC_TABLES = {
+    'products': (Product, ('id', 'name', 'category')),
+    'daily_counts': (DailyCount, ('id', 'product_id', 'date', 'count')),
+    'images': (Image, ('id', 'date', 'path')),
+}
+_TABLE_NAMES = {model: table for table, (model, _) in SYNC_TABLES.items()}
+
+
+def next_change_seqs(count: int, using: str = 'default') -> range:
+    """Reserve count consecutive change sequence numbers"""
+    with transaction.atomic(using=using):
+        now = timezone.now()
+        updated = ChangeSequence.objects.using(using).filter(id=1).update(value=F('value') + count, updated_at=now)
+        if not updated:
+            ChangeSequence.objects.using(using).create(id=1, value=count, updated_at=now)
+        last = ChangeSequence.objects.using(using).values_list('value', flat=True).get(id=1)
+    return range(last - count + 1, last + 1)
+
+
+def record_deletion(sender, instance, using, **kwargs):
+    """post_delete receiver leaving a tombstone for a deleted product or image"""
+    ChangeTombstone.objects.using(using).create(
+        seq=next_change_seqs(1, using=using)[0],
+        table=_TABLE_NAMES[sender],
+        row_id=instance.pk,
+    )
+
+
+class ChangeFeed:
+    """Service for reading the change feed one page at a time"""
+
+    def changes(self, since: int = 0, limit: int = DEFAULT_SYNC_LIMIT) -> Tuple[Dict, int, bool]:
+        """
+        Return (payload, last seq, has_more) for changes numbered above since.
+
+        The payload holds, per table with changes, its field names and one
+        row per changed record, and the ids deleted per table.
+        """
+        events: List[Tuple[int, str, tuple]] = []
+        for table, (model, fields) in SYNC_TABLES.items():
+            rows = (
+                model.objects.filter(change_seq__gt=since)
+                .order_by('change_seq')
+                .values_list('change_seq', *fields)[:limit + 1]
+            )
+            events.extend((row[0], table, row[1:]) for row in rows)
+        tombstones = (
+            ChangeTombstone.objects.filter(seq__gt=since)
+            .order_by('seq')
+            .values_list('seq', 'table', 'row_id')[:limit + 1]
+        )
+        events.extend((seq, 'deleted', (table, row_id)) for seq, table, row_id in tombstones)
+
+        # Each source returned at most limit + 1 rows, so if the merged
+        # list is no longer than limit every source is exhausted
+        events.sort(key=lambda event: event[0])
+        has_more = len(events) > limit
+        events = events[:limit]
+
+        payload: Dict = {}
+        deleted: Dict[str, List[int]] = {}
+        for _, table, row in events:
+            if table == 'deleted':
+                deleted.setdefault(row[0], []).append(row[1])
+                continue
+            if table not in payload:
+                payload[table] = {'fields': list(SYNC_TABLES[table][1]), 'rows': []}
+            payload[table]['rows'].append(list(row))
+        if deleted:
+            payload['deleted'] = deleted
+        return payload, events[-1][0] if events else since, has_more
+
+
+def decode_since(cursor: Optional[str]) -> int:
+    """Sequence number carried by a sync cursor; no cursor means from the start"""
+    if not cursor:
+        return 0
+    since = decode_cursor(cursor, 1)[0]
+    if not isinstance(since, int) or since < 0:
+        raise InvalidCursor('Invalid cursor')
+    return since
+
+
+def encode_since(seq: int) -> str:
+    return encode_cursor([seq])
@@ -0,0 +1,133 @@
+"""
+Response compression negotiated from Accept-Encoding
+
+CompressionMiddleware compresses JSON, NDJSON, MessagePack, CSV and other
+text responses with brotli (when the brotli package is installed) or gzip,
+whichever the client accepts with the higher q-value, brotli winning
+ties. Bodies below COMPRESSION_MIN_SIZE bytes are sent as they are: the
+framing overhead outweighs the saving and small responses fit in one
+packet anyway. Streaming responses (exports) are compressed chunk by
+chunk and flushed after each chunk, so they still stream.
+
+Already compressed payloads (images, Parquet) are never touched.
+"""
+import gzip
+import zlib
+from typing import Iterable, Iterator, Optional
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+
+COMPRESSIBLE_TYPES = (
+    'application/json', 'application/x-ndjson', 'application/msgpack', 'application/javascript', 'application/xml',
+    'text/',
+)
+# Server-Sent Events: a compressor per open stream would cost memory for every idle subscriber
+UNCOMPRESSED_TYPES = ('text/event-stream',)
+
+
+def _accepted_encodings(header: str) -> dict:
+    """Parse Accept-Encoding into {coding: q}"""
+    accepted = {}
+    for part in header.split(','):
+        coding, _, params = part.partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+def negotiate_encoding(header: str) -> Optional[str]:
+    """'br', 'gzip' or None for an Accept-Encoding header"""
+    accepted = _accepted_encodings(header)
+    best, best_q = None, 0.0
+    for coding in (('br', 'gzip') if brotli is not None else ('gzip',)):
+        q = accepted.get(coding, accepted.get('*', 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def compress(content: bytes, coding: str, level: Optional[int] = None) -> bytes:
+    if coding == 'br':
+        return brotli.compress(content, quality=level if level is not None else 5)
+    return gzip.compress(content, compresslevel=level if level is not None else 6, mtime=0)
+
+
+def compress_stream(chunks: Iterable[bytes], coding: str, level: Optional[int] = None) -> Iterator[bytes]:
+    """Compress an iterable of chunks, flushing after each chunk"""
+    if coding == 'br':
+        compressor = brotli.Compressor(quality=level if level is not None else 5)
+        for chunk in chunks:
+            data = compressor.process(chunk) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+        return
+    compressor = zlib.compressobj(level if level is not None else 6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+class CompressionMiddleware:
+    """Compress text responses with brotli or gzip as negotiated by the client"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.min_size = getattr(settings, 'COMPRESSION_MIN_SIZE', 1024)
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+        if (
+            response.status_code in (204, 304)
+            or response.has_header('Content-Encoding')
+            or not content_type.startswith(COMPRESSIBLE_TYPES)
+            or content_type in UNCOMPRESSED_TYPES
+        ):
+            return response
+
+        # The body depends on Accept-Encoding from here on, even when small
+        patch_vary_headers(response, ('Accept-Encoding',))
+        coding = negotiate_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if coding is None:
+            return response
+
+        if response.streaming:
+            if getattr(response, 'is_async', False):
+                return response
+            response.streaming_content = compress_stream(response.streaming_content, coding)
+            response.headers.pop('Content-Length', None)
+        else:
+            if len(response.content) < self.min_size:
+                return response
+            compressed = compress(response.content, coding)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+
+        # A strong ETag names one exact byte sequence; the compressed body is
+        # a different one, but still matches conditional requests weakly
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = coding
+        return response
@@ -0,0 +1,138 @@
+"""
+Everything the dashboard shows on load, computed in one pass
+
+The dashboard used to load products, today's summary, weekly analytics,
+weekly recommendations and recent images with five requests, three of
+which read the same window of daily counts and looked up the same
+product names. DashboardService.bootstrap reads the count window once,
+the product catalogue once and the recent images once, and derives every
+section from those: today's summary is a slice of the window, analytics
+are computed once per product and reused by the recommendations.
+
+Each section carries an ETag of its own content. A client that sends
+the ETags it holds (?known=analytics:"abc",images:"def") gets only the
+sections that changed; the others come back as {"not_modified": true}.
+"""
+import hashlib
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+from django.utils.http import quote_etag
+from .models import Product, Image
+from .archive import DailyCountArchive, to_days
+from .services import AnalyticsService, RecommendationService
+from .renderers import FastJSONRenderer
+
+
+SECTIONS = ('products', 'daily', 'analytics', 'recommendations', 'images')
+_renderer = FastJSONRenderer()
+
+
+def section_etag(data) -> str:
+    """ETag of a section, from its rendered JSON"""
+    return quote_etag(hashlib.sha1(_renderer.render(data)).hexdigest()[:20])
+
+
+def parse_known(value: str) -> Dict[str, str]:
+    """?known=name:etag,name:etag -> {name: etag}"""
+    known = {}
+    for item in (value or '').split(','):
+        name, _, etag = item.strip().partition(':')
+        if name and etag:
+            known[name] = etag
+    return known
+
+
+class DashboardService:
+    """Builds the sections of the dashboard bootstrap payload"""
+
+    def __init__(self, archive: Optional[DailyCountArchive] = None,
+                 analytics_service: Optional[AnalyticsService] = None,
+                 recommendation_service: Optional[RecommendationService] = None):
+        self.archive = archive or DailyCountArchive()
+        self.recommendation_service = recommendation_service or RecommendationService()
+        self.analytics_service = analytics_service or self.recommendation_service.analytics_service
+
+    def bootstrap(self, days: int = 7, images: int = 50) -> Dict[str, object]:
+        """
+        Sections of the dashboard, each shaped like the response of the
+        endpoint it replaces (products, analytics/daily, analytics/weekly,
+        recommendations/weekly without generated_at, images).
+        """
+        end_date = date.today()
+        start_date = end_date - timedelta(days=days - 1)
+
+        catalogue = list(Product.objects.order_by('-id').values('id', 'name', 'category'))
+        by_id = {product['id']: product for product in catalogue}
+        window = self.archive.read_window(start_date, end_date)
+
+        # Today's summary is the last day of the window
+        today = window.day == to_days(end_date)
+        daily_ids = window.product[today].tolist()
+        daily_counts = window.count[today].tolist()
+        daily = sorted(
+            (
+                {'product_id': product_id, 'product_name': by_id[product_id]['name'] if product_id in by_id else None,
+                 'count': count}
+                for product_id, count in zip(daily_ids, daily_counts)
+            ),
+            key=lambda row: row['product_name'] or ''
+        )
+
+        # Analytics once per product; recommendations reuse them
+        summaries: List[Dict] = []
+        product_data: List[Dict] = []
+        series = sorted(
+            (
+                (by_id[product_id], dates_list, count_values)
+                for product_id, dates_list, count_values in window.by_product() if product_id in by_id
+            ),
+            key=lambda item: item[0]['name']
+        )
+        for product, dates_list, count_values in series:
+            if len(count_values) < 2:
+                continue
+            summary = self.analytics_service.calculate_product_analytics(
+                product_id=product['id'],
+                product_name=product['name'],
+                counts=count_values,
+                dates=dates_list
+            )
+            summaries.append(summary)
+            if len(count_values) >= 3:
+                product_data.append({
+                    'product': Product(id=product['id'], name=product['name'], category=product['category']),
+                    'counts': count_values,
+                    'dates': dates_list,
+                    'analytics': summary,
+                })
+        recommendations = self.recommendation_service.generate_recommendations(
+            product_data=product_data,
+            start_date=start_date,
+            end_date=end_date
+        )
+
+        recent_images = list(
+            Image.objects.order_by('-date', '-id')
+            .values('id', 'date', 'path', 'confidence_summary', 'uploaded_at')[:images]
+        )
+
+        return {
+            'products': catalogue,
+            'daily': {
+                'date': end_date,
+                'total_products': len(daily_counts),
+                'total_items': sum(daily_counts),
+                'products': daily,
+            },
+            'analytics': {
+                'start_date': start_date,
+                'end_date': end_date,
+                'products': summaries,
+            },
+            'recommendations': {
+                'week_start': start_date,
+                'week_end': end_date,
+                'recommendations': recommendations,
+            },
+            'images': recent_images,
+        }
@@ -0,0 +1,322 @@
+"""
+Database connection tuning and write serialization
+
+With DB_PROFILE=sqlite-production (see settings.py) every new SQLite
+connection is switched to WAL journaling, so readers never block the
+writer or each other, and given a busy timeout and larger page and mmap
+caches. WAL still allows only one writer, and a deferred transaction that
+upgrades from read to write fails at once with "database is locked" when
+another writer is active, whatever the busy timeout. write_transaction()
+therefore takes a writer lock, shared by threads and by processes through
+a lock file, before it opens the transaction.
+
+When DATABASES has a 'replica' entry, PrimaryReplicaRouter sends reads of
+views decorated with @replica_reads to it, as long as the replica is
+within the view's lag tolerance and, for read-your-writes views, has
+caught up with the client's last write (tracked by ReadYourWritesMiddleware
+in a cookie). All other reads and every write go to 'default'. For local
+testing a SQLite replica is kept in sync by `manage.py replicate_db`,
+which snapshots the primary with the SQLite backup API and records the
+snapshot time next to the replica file. Other replicas are measured with
+a heartbeat row stamped on the primary by `manage.py replica_heartbeat`;
+while no heartbeat has reached the replica, every read goes to 'default'.
+"""
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Optional, Tuple
+from django.conf import settings
+from django.db import DatabaseError, connections, transaction
+
+try:
+    import fcntl
+except ImportError:  # Windows: only threads of one process are serialized
+    fcntl = None
+
+
+_thread_lock = threading.Lock()
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    """connection_created handler applying DATABASES[...]['PRAGMAS'] to SQLite connections"""
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = connection.settings_dict.get('PRAGMAS')
+    if not pragmas:
+        return
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+
+
+def _lock_path(using: str) -> str:
+    return f"{settings.DATABASES[using]['NAME']}.writer.lock"
+
+
+@contextmanager
+def exclusive_lock(path: str):
+    """Lock shared by the threads of this process and, through path, by other processes"""
+    with _thread_lock:
+        if fcntl is None:
+            yield
+            return
+        with open(path, 'a') as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+@contextmanager
+def writer_lock(using: str = 'default'):
+    """Hold the database-wide writer lock when DB_WRITER_LOCK is enabled"""
+    if not getattr(settings, 'DB_WRITER_LOCK', False):
+        yield
+        return
+    with exclusive_lock(_lock_path(using)):
+        yield
+
+
+@contextmanager
+def write_transaction(using: str = 'default'):
+    """transaction.atomic() that first waits for the writer lock"""
+    if transaction.get_connection(using).in_atomic_block:
+        # The outer transaction may already hold SQLite locks; waiting for the
+        # writer lock here could deadlock against the process that holds it
+        with transaction.atomic(using=using):
+            yield
+        return
+    with writer_lock(using):
+        with transaction.atomic(using=using):
+            yield
+
+
+def _memoized(func):
+    cache = {}
+
+    def wrapper(value):
+        try:
+            return cache[value]
+        except KeyError:
+            result = cache[value] = func(value)
+            return result
+    return wrapper
+
+
+def upsert_rows(model, fields, rows, unique_fields, update_fields, using: str = 'default'):
+    """
+    Insert value tuples into model's table, updating update_fields on conflict.
+
+    Same statement as bulk_create(update_conflicts=True), but issued with a
+    single executemany: Django compiles bulk_create SQL value by value,
+    which dominates large imports. fields are attnames (product_id, not
+    product) and rows must hold every non-null column without a default.
+    Backends without INSERT ... ON CONFLICT (MySQL) go through bulk_create.
+    """
+    rows = list(rows)
+    if not rows:
+        return
+    connection = connections[using]
+    meta = model._meta
+    columns = [meta.get_field(name) for name in fields]
+    if connection.vendor not in ('sqlite', 'postgresql'):
+        model.objects.using(using).bulk_create(
+            [model(**dict(zip(fields, row))) for row in rows],
+            update_conflicts=True,
+            unique_fields=[meta.get_field(name).name for name in unique_fields],
+            update_fields=[meta.get_field(name).name for name in update_fields],
+        )
+        return
+
+    adapters = {
+        'DateTimeField': connection.ops.adapt_datetimefield_value,
+        'DateField': connection.ops.adapt_datefield_value,
+    }
+    adapt = [adapters.get(column.get_internal_type()) for column in columns]
+    # Imports repeat the same few dates and timestamps; adapt each value once
+    adapt = [_memoized(adapter) if adapter else None for adapter in adapt]
+    quote = connection.ops.quote_name
+    sql = 'INSERT INTO {} ({}) VALUES ({}) ON CONFLICT ({}) DO UPDATE SET {}'.format(
+        quote(meta.db_table),
+        ', '.join(quote(column.column) for column in columns),
+        ', '.join(['%s'] * len(columns)),
+        ', '.join(quote(meta.get_field(name).column) for name in unique_fields),
+        ', '.join(
+            f'{quote(meta.get_field(name).column)} = EXCLUDED.{quote(meta.get_field(name).column)}'
+            for name in update_fields
+        ),
+    )
+    if any(adapt):
+        rows = [tuple(a(v) if a else v for a, v in zip(adapt, row)) for row in rows]
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, rows)
+
+
+# Read routing
+
+REPLICA = 'replica'
+LAST_WRITE_COOKIE = 'last_write'
+
+# (max_lag seconds, client's last write timestamp or 0) for the current view
+_read_policy: ContextVar[Optional[Tuple[float, float]]] = ContextVar('read_policy', default=None)
+_wrote: ContextVar[bool] = ContextVar('wrote', default=False)
+
+
+def _synced_path() -> str:
+    return f"{settings.DATABASES[REPLICA]['NAME']}.synced"
+
+
+# How long a heartbeat read from the replica is reused, in seconds
+HEARTBEAT_CACHE_SECONDS = 1.0
+_heartbeat_cache: Tuple[float, Optional[float]] = (0.0, None)  # (read at, beat_at)
+_heartbeat_lock = threading.Lock()
+
+
+def write_heartbeat(now: Optional[float] = None):
+    """Stamp the heartbeat row on the primary"""
+    from .models import ReplicaHeartbeat
+
+    with write_transaction():
+        ReplicaHeartbeat.objects.using('default').update_or_create(
+            id=1, defaults={'beat_at': time.time() if now is None else now}
+        )
+
+
+def _replica_heartbeat() -> Optional[float]:
+    """The heartbeat as the replica sees it, re-read at most every HEARTBEAT_CACHE_SECONDS"""
+    global _heartbeat_cache
+    from .models import ReplicaHeartbeat
+
+    with _heartbeat_lock:
+        read_at, beat_at = _heartbeat_cache
+        if time.monotonic() - read_at < HEARTBEAT_CACHE_SECONDS:
+            return beat_at
+        try:
+            beat_at = ReplicaHeartbeat.objects.using(REPLICA).filter(id=1).values_list('beat_at', flat=True).first()
+        except DatabaseError:
+            beat_at = None
+        _heartbeat_cache = (time.monotonic(), beat_at)
+        return beat_at
+
+
+def replica_synced_at() -> Optional[float]:
+    """
+    Time of the primary snapshot the replica holds, or None if unknown.
+
+    The SQLite stand-in records its snapshot time next to the replica
+    file. Any other replica is measured by the heartbeat row that
+    `manage.py replica_heartbeat` stamps on the primary: the value the
+    replica has replayed is the time the primary was at. This reads as up
+    to one heartbeat interval older than the true position, and assumes
+    the clocks of the heartbeat writer and this server agree. Without
+    heartbeats the lag is unknown and reads stay on the primary.
+    """
+    if REPLICA not in settings.DATABASES:
+        return None
+    if settings.DATABASES[REPLICA]['ENGINE'] != 'django.db.backends.sqlite3':
+        return _replica_heartbeat()
+    try:
+        with open(_synced_path(), encoding='ascii') as f:
+            return float(f.read().strip())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def replica_reads(max_lag: float = 60.0, read_your_writes: bool = True):
+    """
+    Allow the ORM reads of a view to be served by the replica.
+
+    max_lag is the staleness, in seconds, the view tolerates. With
+    read_your_writes, a client whose last write is newer than the
+    replica's snapshot is served from the primary.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            last_write = 0.0
+            if read_your_writes:
+                try:
+                    last_write = float(request.COOKIES.get(LAST_WRITE_COOKIE, 0))
+                except ValueError:
+                    pass
+            token = _read_policy.set((max_lag, last_write))
+            try:
+                return view(request, *args, **kwargs)
+            finally:
+                _read_policy.reset(token)
+        return wrapped
+    return decorator
+
+
+class PrimaryReplicaRouter:
+    """Database router sending tolerant reads to the replica and everything else to default"""
+
+    def db_for_read(self, model, **hints):
+        policy = _read_policy.get()
+        if policy is None:
+            return 'default'
+        synced_at = replica_synced_at()
+        if synced_at is None:
+            return 'default'
+        max_lag, last_write = policy
+        if time.time() - synced_at > max_lag or synced_at < last_write:
+            return 'default'
+        return REPLICA
+
+    def db_for_write(self, model, **hints):
+        _wrote.set(True)
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica is a copy of default and gets its schema from it
+        return db != REPLICA
+
+
+class ReadYourWritesMiddleware:
+    """Stamp responses of requests that wrote to the database with the write time"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _wrote.set(False)
+        try:
+            response = self.get_response(request)
+            if _wrote.get():
+                response.set_cookie(LAST_WRITE_COOKIE, f'{time.time():.3f}', max_age=3600, samesite='Lax')
+            return response
+        finally:
+            _wrote.reset(token)
+
+
+class ReplicationStandIn:
+    """Keeps a SQLite replica file in sync with the primary for local testing"""
+
+    def __init__(self, primary: Optional[str] = None, replica: Optional[str] = None):
+        self.primary = str(primary or settings.DATABASES['default']['NAME'])
+        self.replica = str(replica or settings.DATABASES[REPLICA]['NAME'])
+
+    def sync(self) -> float:
+        """Copy the primary into the replica; returns the snapshot time"""
+        snapshot_at = time.time()
+        source = sqlite3.connect(self.primary)
+        target = sqlite3.connect(self.replica, timeout=30)
+        try:
+            source.backup(target, pages=0)
+        finally:
+            target.close()
+            source.close()
+        tmp_path = f'{self.replica}.synced.tmp'
+        with open(tmp_path, 'w', encoding='ascii') as f:
+            f.write(f'{snapshot_at:.3f}')
+        os.replace(tmp_path, f'{self.replica}.synced')
+        return snapshot_at
+
@@ -0,0 +1,202 @@
+"""
+In-process publish/subscribe of live events, served as Server-Sent Events
+
+Uploads publish a 'detection' event (the image's detection summary) and
+a 'counts' event (the product counts it updated) once their transaction
+commits; GET /events streams them to every subscribed dashboard, so
+nothing has to poll the REST endpoints.
+
+Every subscriber has its own bounded queue (SSE_QUEUE_SIZE events). A
+subscriber whose queue is full is too slow to keep up: it is dropped
+rather than making publishers wait or buffer without limit, and its
+stream ends with a 'reset' event. Browsers reconnect on their own
+sending Last-Event-ID, and the last SSE_HISTORY events are replayed to
+them; a client that missed more than that gets 'reset' and reloads from
+the REST API.
+
+Under ASGI a subscriber is an idle coroutine and a small queue, so one
+process holds thousands of them; under WSGI each one occupies a worker
+thread. Events only reach clients connected to the process that
+published them: with several server processes (or the async upload
+workers, which run in their own processes) run the event stream on a
+single ASGI process behind a shared database, or clients will miss
+events from the others. Streams end after SSE_MAX_AGE seconds and the
+browser reconnects: Django 4.2 does not notice a client that went away
+from an ASGI stream, so this bounds how long a dead one is kept.
+"""
+import asyncio
+import json
+import queue
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Iterator, List, Optional, Set, Tuple
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+
+_DROPPED = object()
+
+
+def format_event(event_id: Optional[int], event: str, data) -> bytes:
+    """One SSE message"""
+    payload = json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False, separators=(',', ':'))
+    head = f'id: {event_id}\n' if event_id is not None else ''
+    return f'{head}event: {event}\ndata: {payload}\n\n'.encode('utf-8')
+
+
+class Subscriber:
+    """Bounded queue of messages for one client; async when created with an event loop"""
+
+    def __init__(self, maxsize: int, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize) if loop else queue.Queue(maxsize)
+        self.dropped = False
+
+    def put(self, message) -> bool:
+        """
+        Queue message, or drop the subscriber when its queue is full.
+
+        Async subscribers must be fed from their own loop's thread.
+        """
+        if self.dropped:
+            return False
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except (queue.Full, asyncio.QueueFull):
+            pass
+        self.dropped = True
+        # Make room for the marker that ends the stream
+        while True:
+            try:
+                self.queue.get_nowait()
+            except (queue.Empty, asyncio.QueueEmpty):
+                break
+        self.queue.put_nowait(_DROPPED)
+        return False
+
+
+class EventBroker:
+    """Fans published events out to subscribers and keeps the last few for reconnecting clients"""
+
+    def __init__(self, queue_size: Optional[int] = None, history: Optional[int] = None,
+                 max_subscribers: Optional[int] = None):
+        self.queue_size = queue_size or getattr(settings, 'SSE_QUEUE_SIZE', 100)
+        self.max_subscribers = max_subscribers or getattr(settings, 'SSE_MAX_SUBSCRIBERS', 10000)
+        self._history: Deque[Tuple[int, bytes]] = deque(maxlen=history or getattr(settings, 'SSE_HISTORY', 256))
+        self._subscribers: Set[Subscriber] = set()
+        self._last_id = 0
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def publish(self, event: str, data) -> int:
+        """Send an event to every subscriber, from any thread; returns its id"""
+        by_loop: Dict[asyncio.AbstractEventLoop, List[Subscriber]] = {}
+        with self._lock:
+            self._last_id += 1
+            event_id = self._last_id
+            message = format_event(event_id, event, data)
+            self._history.append((event_id, message))
+            for subscriber in list(self._subscribers):
+                if subscriber.loop is not None:
+                    by_loop.setdefault(subscriber.loop, []).append(subscriber)
+                elif not subscriber.put(message):
+                    self._subscribers.discard(subscriber)
+                    self.dropped += 1
+        # One wakeup per event loop rather than one per subscriber
+        for loop, subscribers in by_loop.items():
+            try:
+                loop.call_soon_threadsafe(self._deliver, subscribers, message)
+            except RuntimeError:  # the loop was closed
+                for subscriber in subscribers:
+                    self.unsubscribe(subscriber)
+        return event_id
+
+    def _deliver(self, subscribers: List[Subscriber], message: bytes):
+        slow = [subscriber for subscriber in subscribers if not subscriber.put(message)]
+        if slow:
+            with self._lock:
+                for subscriber in slow:
+                    if subscriber in self._subscribers:
+                        self._subscribers.discard(subscriber)
+                        self.dropped += 1
+
+    def subscribe(self, last_event_id: Optional[int] = None,
+                  loop: Optional[asyncio.AbstractEventLoop] = None) -> Optional[Subscriber]:
+        """
+        Register a subscriber, queueing the events after last_event_id.
+
+        Returns None when the broker is full.
+        """
+        subscriber = Subscriber(self.queue_size, loop)
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                return None
+            if last_event_id is not None:
+                missed = [message for event_id, message in self._history if event_id > last_event_id]
+                oldest = self._history[0][0] if self._history else self._last_id + 1
+                if not oldest - 1 <= last_event_id <= self._last_id or len(missed) > self.queue_size:
+                    # Too far behind to replay (or ids from before a restart); the client reloads instead
+                    subscriber.queue.put_nowait(format_event(None, 'reset', {'reason': 'missed events'}))
+                else:
+                    for message in missed:
+                        subscriber.queue.put_nowait(message)
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'subscribers': len(self._subscribers), 'dropped': self.dropped}
+
+
+broker = EventBroker()
+
+
+# Reconnect delay for EventSource, and a comment so proxies see bytes at once
+_PREAMBLE = b'retry: 3000\n: connected\n\n'
+_RESET = format_event(None, 'reset', {'reason': 'too slow'})
+
+
+def stream(subscriber: Subscriber, event_broker: EventBroker = broker) -> Iterator[bytes]:
+    """Messages for a WSGI response, with keepalive comments while idle"""
+    heartbeat = getattr(settings, 'SSE_HEARTBEAT', 15)
+    ends = time.monotonic() + getattr(settings, 'SSE_MAX_AGE', 600)
+    try:
+        yield _PREAMBLE
+        while time.monotonic() < ends:
+            try:
+                message = subscriber.queue.get(timeout=heartbeat)
+            except queue.Empty:
+                yield b': keepalive\n\n'
+                continue
+            if message is _DROPPED:
+                yield _RESET
+                return
+            yield message
+    finally:
+        event_broker.unsubscribe(subscriber)
+
+
+async def astream(subscriber: Subscriber, event_broker: EventBroker = broker):
+    """Messages for an ASGI response, with keepalive comments while idle"""
+    heartbeat = getattr(settings, 'SSE_HEARTBEAT', 15)
+    ends = time.monotonic() + getattr(settings, 'SSE_MAX_AGE', 600)
+    try:
+        yield _PREAMBLE
+        while time.monotonic() < ends:
+            try:
+                message = await asyncio.wait_for(subscriber.queue.get(), heartbeat)
+            except asyncio.TimeoutError:
+                yield b': keepalive\n\n'
+                continue
+            if message is _DROPPED:
+                yield _RESET
+                return
+            yield message
+    finally:
+        event_broker.unsubscribe(subscriber)
@@ -0,0 +1,256 @@
+"""
+Streaming bulk export of counts, detections and rollups
+
+Datasets:
+
+    counts        one row per DailyCount, hot and archived
+    detections    one row per detection unpacked from Image.detections
+    analytics     the rollup table of a grain (see rollups.py)
+
+Rows are read in chunks (QuerySet.iterator(), a server-side cursor where
+the backend supports one, and one archived month at a time) and encoded
+to CSV, NDJSON or Parquet one chunk at a time, so memory stays bounded
+by the chunk size whatever the size of the export. Parquet output needs
+pyarrow; each chunk becomes one row group.
+"""
+import csv
+import io
+from datetime import date, datetime, time, timedelta
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+from .models import Product, DailyCount, Image, CategoryDailyRollup, CategoryWeeklyRollup, ProductMonthlyRollup
+from .archive import EPOCH, DailyCountArchive, month_bounds
+from .detections import NO_BOX, unpack_detections
+from .rollups import GRAINS
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet export is unavailable without pyarrow
+    pa = None
+    pq = None
+
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+# Column names and their Parquet types, per dataset
+COLUMNS = {
+    'counts': [('product_id', 'int32'), ('product_name', 'string'), ('date', 'date32'), ('count', 'int32')],
+    'detections': [
+        ('image_id', 'int64'), ('image_date', 'timestamp'), ('product_id', 'int32'),
+        ('x1', 'int32'), ('y1', 'int32'), ('x2', 'int32'), ('y2', 'int32'), ('confidence', 'float32'),
+    ],
+    'category-day': [('category', 'string'), ('day', 'date32'), ('total', 'int64'), ('samples', 'int32')],
+    'category-week': [('category', 'string'), ('week', 'date32'), ('total', 'int64'), ('samples', 'int32')],
+    'product-month': [('product_id', 'int32'), ('month', 'date32'), ('total', 'int64'), ('samples', 'int32')],
+}
+
+DATASETS = ('counts', 'detections', 'analytics')
+
+_ROLLUP_MODELS = {
+    'category-day': (CategoryDailyRollup, 'category', 'day'),
+    'category-week': (CategoryWeeklyRollup, 'category', 'week'),
+    'product-month': (ProductMonthlyRollup, 'product_id', 'month'),
+}
+
+
+class ExportError(ValueError):
+    """Raised for an unknown dataset, format or grain"""
+
+
+class _ChunkSink:
+    """Write-only file object that collects what ParquetWriter writes until drained"""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _csv_value(value):
+    return value.isoformat() if isinstance(value, (date, datetime)) else value
+
+
+class ExportService:
+    """Service for streaming datasets as encoded byte chunks"""
+
+    def __init__(self, archive: Optional[DailyCountArchive] = None, chunk_size: int = 2000):
+        self.archive = archive or DailyCountArchive()
+        self.chunk_size = chunk_size
+
+    def columns(self, dataset: str, grain: str = 'category-day') -> List[str]:
+        return [name for name, _ in COLUMNS[grain if dataset == 'analytics' else dataset]]
+
+    def validate(self, dataset: str, fmt: str, grain: str = 'category-day'):
+        if dataset not in DATASETS:
+            raise ExportError(f'Unknown dataset {dataset!r}, expected one of {", ".join(DATASETS)}')
+        if fmt not in FORMATS:
+            raise ExportError(f'Unknown format {fmt!r}, expected one of {", ".join(FORMATS)}')
+        if fmt == 'parquet' and pa is None:
+            raise ExportError('Parquet export requires pyarrow')
+        if dataset == 'analytics' and grain not in GRAINS:
+            raise ExportError(f'Unknown grain {grain!r}, expected one of {", ".join(GRAINS)}')
+
+    # Row sources
+
+    def rows(self, dataset: str, start: Optional[date] = None, end: Optional[date] = None,
+             product_ids: Optional[Sequence[int]] = None, grain: str = 'category-day') -> Iterator[Tuple]:
+        """Yield the rows of dataset with start <= date <= end, in COLUMNS order"""
+        end = end or date.today()
+        if dataset == 'counts':
+            return self._count_rows(start, end, product_ids)
+        if dataset == 'detections':
+            return self._detection_rows(start, end, product_ids)
+        return self._rollup_rows(grain, start, end, product_ids)
+
+    def _count_rows(self, start: Optional[date], end: date,
+                    product_ids: Optional[Sequence[int]]) -> Iterator[Tuple]:
+        start = start or self.archive.earliest_date()
+        if start is None:
+            return
+        archived = sorted(
+            key for key in self.archive.manifest()['partitions']
+            if month_bounds(key)[1] > start and month_bounds(key)[0] <= end
+        )
+        # Runs of months without a partition are one query each; archived
+        # months are read one at a time, hot and archived rows together
+        cursor = start
+        for key in archived:
+            month_start, next_month = month_bounds(key)
+            if cursor < month_start:
+                yield from self._hot_count_rows(cursor, month_start - timedelta(days=1), product_ids)
+            window = self.archive.read_window(max(start, month_start), min(end, next_month - timedelta(days=1)),
+                                              product_ids)
+            names = dict(Product.objects.filter(id__in=set(window.product.tolist())).values_list('id', 'name'))
+            for product_id, day, count in zip(window.product.tolist(), window.day.tolist(), window.count.tolist()):
+                yield product_id, names.get(product_id), EPOCH + timedelta(days=day), count
+            cursor = next_month
+        if cursor <= end:
+            yield from self._hot_count_rows(cursor, end, product_ids)
+
+    def _hot_count_rows(self, start: date, end: date, product_ids: Optional[Sequence[int]]) -> Iterator[Tuple]:
+        """DailyCount rows in one query, in the same month, product, date order as archived months"""
+        hot = DailyCount.objects.filter(date__gte=start, date__lte=end)
+        if product_ids is not None:
+            hot = hot.filter(product_id__in=product_ids)
+        return (
+            hot.order_by(TruncMonth('date'), 'product_id', 'date')
+            .values_list('product_id', 'product__name', 'date', 'count')
+            .iterator(chunk_size=self.chunk_size)
+        )
+
+    def _detection_rows(self, start: Optional[date], end: date,
+                        product_ids: Optional[Sequence[int]]) -> Iterator[Tuple]:
+        images = Image.objects.filter(date__lt=timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min)))
+        if start is not None:
+            images = images.filter(date__gte=timezone.make_aware(datetime.combine(start, time.min)))
+        wanted = set(product_ids) if product_ids is not None else None
+        for image_id, image_date, blob in (
+            images.order_by('date', 'id').values_list('id', 'date', 'detections').iterator(chunk_size=self.chunk_size)
+        ):
+            for product, x1, y1, x2, y2, confidence in unpack_detections(blob).tolist():
+                if wanted is not None and product not in wanted:
+                    continue
+                if x1 == NO_BOX:
+                    x1 = y1 = x2 = y2 = None
+                yield image_id, image_date, product, x1, y1, x2, y2, round(confidence, 4)
+
+    def _rollup_rows(self, grain: str, start: Optional[date], end: date,
+                     product_ids: Optional[Sequence[int]]) -> Iterator[Tuple]:
+        model, group, period = _ROLLUP_MODELS[grain]
+        rows = model.objects.filter(**{f'{period}__lte': end})
+        if start is not None:
+            rows = rows.filter(**{f'{period}__gte': start})
+        if product_ids is not None and grain == 'product-month':
+            rows = rows.filter(product_id__in=product_ids)
+        return rows.order_by(period, group).values_list(group, period, 'total', 'samples').iterator(
+            chunk_size=self.chunk_size
+        )
+
+    # Encoding
+
+    def _batches(self, rows: Iterable[Tuple]) -> Iterator[List[Tuple]]:
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.chunk_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _csv(self, columns: List[str], rows: Iterable[Tuple]) -> Iterator[bytes]:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        for batch in self._batches(rows):
+            writer.writerows([_csv_value(v) for v in row] for row in batch)
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode('utf-8')
+
+    def _ndjson(self, columns: List[str], rows: Iterable[Tuple]) -> Iterator[bytes]:
+        encoder = DjangoJSONEncoder(ensure_ascii=False)
+        for batch in self._batches(rows):
+            yield ''.join(encoder.encode(dict(zip(columns, row))) + '\n' for row in batch).encode('utf-8')
+
+    def _parquet(self, spec: List[Tuple[str, str]], rows: Iterable[Tuple]) -> Iterator[bytes]:
+        types = {
+            'int32': pa.int32(), 'int64': pa.int64(), 'float32': pa.float32(), 'string': pa.string(),
+            'date32': pa.date32(), 'timestamp': pa.timestamp('us', tz='UTC'),
+        }
+        schema = pa.schema([(name, types[kind]) for name, kind in spec])
+        sink = _ChunkSink()
+        writer = pq.ParquetWriter(sink, schema, compression='zstd')
+        try:
+            for batch in self._batches(rows):
+                columns = list(zip(*batch))
+                writer.write_table(pa.Table.from_arrays(
+                    [pa.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema
+                ))
+                yield sink.drain()
+        finally:
+            writer.close()
+        yield sink.drain()
+
+    def stream(self, dataset: str, fmt: str, start: Optional[date] = None, end: Optional[date] = None,
+               product_ids: Optional[Sequence[int]] = None, grain: str = 'category-day') -> Iterator[bytes]:
+        """Encoded chunks of an export; call validate() first"""
+        rows = self.rows(dataset, start, end, product_ids, grain)
+        if fmt == 'parquet':
+            return self._parquet(COLUMNS[grain if dataset == 'analytics' else dataset], rows)
+        if fmt == 'ndjson':
+            return self._ndjson(self.columns(dataset, grain), rows)
+        return self._csv(self.columns(dataset, grain), rows)
+
+    def filename(self, dataset: str, fmt: str, start: Optional[date], end: Optional[date],
+                 grain: str = 'category-day') -> str:
+        name = grain if dataset == 'analytics' else dataset
+        return f"{name}_{start or 'all'}_{end or date.today()}.{fmt}"
@@ -0,0 +1,182 @@
+"""
+Idempotency-Key support for retried requests
+
+A client that may retry a request (a phone losing its connection mid
+upload) sends the same Idempotency-Key header with every attempt. The
+first attempt claims the key by inserting an IdempotencyKey row and runs
+the view; its response (status, JSON body, a few headers) is stored
+zlib-compressed on the row and replayed to every later attempt without
+running the view again, until the row expires (IDEMPOTENCY_TTL seconds).
+
+An attempt arriving while the first one is still running waits for it
+(polling the row, so this works across processes) instead of running in
+parallel; if it is still running after IDEMPOTENCY_WAIT seconds the
+attempt gets 409 with Retry-After. A claim whose holder died is taken
+over once its lock (IDEMPOTENCY_LOCK seconds) runs out. Server errors
+(5xx) are not stored: the key is released so a retry runs again. Reusing
+a key for a different request body is rejected with 422.
+"""
+import hashlib
+import json
+import time
+import uuid
+import zlib
+from datetime import timedelta
+from functools import wraps
+from typing import Dict, Optional
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from .models import IdempotencyKey
+from .database import write_transaction
+
+
+HEADER = 'HTTP_IDEMPOTENCY_KEY'
+MAX_KEY_LENGTH = 255
+REPLAYED_HEADERS = ('Location', 'Retry-After')
+PURGE_BATCH = 100
+
+
+def request_fingerprint(request) -> str:
+    """sha256 of what makes two requests the same: path, query, form fields and uploaded files"""
+    digest = hashlib.sha256()
+    digest.update(f'{request.method} {request.path}?{request.META.get("QUERY_STRING", "")}'.encode('utf-8'))
+    for name in sorted(request.POST):
+        digest.update(f'\0{name}={request.POST.getlist(name)}'.encode('utf-8'))
+    for name in sorted(request.FILES):
+        for uploaded in request.FILES.getlist(name):
+            digest.update(f'\0{name}:{uploaded.name}:{uploaded.size}\0'.encode('utf-8'))
+            for chunk in uploaded.chunks():
+                digest.update(chunk)
+            uploaded.seek(0)
+    return digest.hexdigest()
+
+
+def _encode(response) -> bytes:
+    payload = {
+        'body': response.data,
+        'headers': {name: response[name] for name in REPLAYED_HEADERS if response.has_header(name)},
+    }
+    return zlib.compress(json.dumps(payload, cls=DjangoJSONEncoder, ensure_ascii=False).encode('utf-8'))
+
+
+def _replay(row: IdempotencyKey) -> Response:
+    payload = json.loads(zlib.decompress(bytes(row.response)))
+    response = Response(payload['body'], status=row.status_code, headers=payload['headers'])
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _error(message: str, status_code: int, headers: Optional[Dict] = None) -> Response:
+    return Response({'error': 'کلید تکرار نامعتبر است', 'message': message}, status=status_code, headers=headers)
+
+
+class IdempotencyStore:
+    """Claims, completes and replays idempotency keys"""
+
+    def __init__(self, ttl: Optional[float] = None, lock: Optional[float] = None, wait: Optional[float] = None):
+        self.ttl = ttl or getattr(settings, 'IDEMPOTENCY_TTL', 86400)
+        self.lock = lock or getattr(settings, 'IDEMPOTENCY_LOCK', 120)
+        self.wait = wait if wait is not None else getattr(settings, 'IDEMPOTENCY_WAIT', 30)
+
+    def _insert(self, scope: str, key: str, fingerprint: str) -> Optional[str]:
+        """Claim a new key; None if it already exists"""
+        now = timezone.now()
+        token = uuid.uuid4().hex
+        try:
+            with write_transaction():
+                IdempotencyKey.objects.create(
+                    scope=scope, key=key, fingerprint=fingerprint, token=token,
+                    locked_until=now + timedelta(seconds=self.lock),
+                    expires_at=now + timedelta(seconds=self.ttl),
+                )
+                # Evict a batch of expired keys along the way
+                expired = list(
+                    IdempotencyKey.objects.filter(expires_at__lt=now).values_list('id', flat=True)[:PURGE_BATCH]
+                )
+                if expired:
+                    IdempotencyKey.objects.filter(id__in=expired).delete()
+        except IntegrityError:
+            return None
+        return token
+
+    def acquire(self, scope: str, key: str, fingerprint: str):
+        """
+        Return ('run', token) when the caller should run the request, or
+        ('respond', response) with a replayed or error response.
+        """
+        give_up = time.monotonic() + self.wait
+        delay = 0.05
+        while True:
+            token = self._insert(scope, key, fingerprint)
+            if token:
+                return 'run', token
+
+            now = timezone.now()
+            row = IdempotencyKey.objects.filter(scope=scope, key=key).first()
+            if row is None:
+                continue
+            if row.expires_at <= now:
+                IdempotencyKey.objects.filter(id=row.id, token=row.token).delete()
+                continue
+            if row.fingerprint != fingerprint:
+                return 'respond', _error(
+                    'This Idempotency-Key was already used for a different request',
+                    status.HTTP_422_UNPROCESSABLE_ENTITY
+                )
+            if row.status_code is not None:
+                return 'respond', _replay(row)
+            if row.locked_until <= now:
+                # The request holding the key never finished; take over
+                token = uuid.uuid4().hex
+                with write_transaction():
+                    taken = IdempotencyKey.objects.filter(id=row.id, token=row.token, status_code=None).update(
+                        token=token, locked_until=now + timedelta(seconds=self.lock)
+                    )
+                if taken:
+                    return 'run', token
+                continue
+            if time.monotonic() >= give_up:
+                return 'respond', _error(
+                    'A request with this Idempotency-Key is still in progress',
+                    status.HTTP_409_CONFLICT, {'Retry-After': '1'}
+                )
+            time.sleep(delay)
+            delay = min(delay * 2, 1.0)
+
+    def complete(self, scope: str, key: str, token: str, response):
+        """Store the response of the request holding the key, or release the key after a server error"""
+        with write_transaction():
+            rows = IdempotencyKey.objects.filter(scope=scope, key=key, token=token)
+            if response is None or response.status_code >= 500 or not hasattr(response, 'data'):
+                rows.delete()
+            else:
+                rows.update(status_code=response.status_code, response=_encode(response), locked_until=timezone.now())
+
+
+def idempotent(scope: str, store: Optional[IdempotencyStore] = None):
+    """Make a POST view honour the Idempotency-Key header (place below @api_view)"""
+    def decorator(view):
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            key = request.META.get(HEADER, '').strip()
+            if not key:
+                return view(request, *args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                return _error(f'Idempotency-Key is longer than {MAX_KEY_LENGTH} characters', status.HTTP_400_BAD_REQUEST)
+
+            keys = store or IdempotencyStore()
+            action, value = keys.acquire(scope, key, request_fingerprint(request))
+            if action == 'respond':
+                return value
+            response = None
+            try:
+                response = view(request, *args, **kwargs)
+                return response
+            finally:
+                keys.complete(scope, key, value, response)
+        return wrapped
+    return decorator
@@ -3,9 +3,12 @@ Image analysis service for shelf detection
 """
 import os
 import numpy as np
-from typing import List, Dict
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from typing import List, Dict, Optional
 import cv2
 from django.conf import settings
+from .metrics import span
 
 
 class InferenceService:
@@ -21,10 +24,20 @@ class InferenceService:
         Returns: 'sauces' or 'chips'
         """
         try:
-            img = cv2.imread(image_path)
+            with span('decode'):
+                img = cv2.imread(image_path)
             if img is None:
                 return 'sauces'  # Default
-            
+            with span('infer'):
+                return self._classify(img)
+        except Exception as e:
+            print(f"Error detecting image type: {e}")
+            # Default to sauces
+            return 'sauces'
+    
+    def _classify(self, img: np.ndarray) -> str:
+        """Classify a decoded BGR image as 'sauces' or 'chips'"""
+        try:
             # Convert to grayscale
             gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
             
@@ -69,10 +82,39 @@ class InferenceService:
         """
         image_type = self._detect_image_type(image_path)
         
-        if image_type == 'sauces':
-            return self._analyze_sauces()
-        else:  # chips
-            return self._analyze_chips()
+        with span('postprocess'):
+            if image_type == 'sauces':
+                return self._analyze_sauces()
+            else:  # chips
+                return self._analyze_chips()
+    
+    def run_inference_batch(self, images: List[bytes]) -> List[Optional[List[Dict]]]:
+        """
+        Analyze a batch of encoded images held in memory.
+        
+        Images are decoded and analysed in parallel threads (OpenCV releases
+        the GIL), without writing them to disk. Returns one detection list
+        per image, or None for data that is not a decodable image.
+        """
+        def analyze(data: bytes) -> Optional[List[Dict]]:
+            with span('decode'):
+                img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if img is None:
+                return None
+            with span('infer'):
+                image_type = self._classify(img)
+            with span('postprocess'):
+                if image_type == 'sauces':
+                    return self._analyze_sauces()
+                return self._analyze_chips()
+        
+        if len(images) <= 1:
+            return [analyze(data) for data in images]
+        workers = min(len(images), getattr(settings, 'INFERENCE_THREADS', None) or os.cpu_count() or 1)
+        # Each task runs in a copy of this thread's context, so its stages count towards the request
+        contexts = [copy_context() for _ in images]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(lambda context, data: context.run(analyze, data), contexts, images))
     
     def _analyze_sauces(self) -> List[Dict]:
         """
@@ -169,6 +211,42 @@ class StorageService:
         shutil.copy2(local_path, storage_path)
         # Return path relative to MEDIA_ROOT for serving
         return os.path.join('images', filename).replace('\\', '/')
+    
+    def create_file(self, original_filename: str) -> str:
+        """Create an empty file under a new name that never overwrites an existing file"""
+        from datetime import datetime
+        
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        stem, ext = os.path.splitext(os.path.basename(original_filename))
+        filename = f"{timestamp}_{stem}{ext}"
+        suffix = 1
+        while True:
+            try:
+                with open(os.path.join(self.local_storage_path, filename), 'xb'):
+                    pass
+                break
+            except FileExistsError:
+                suffix += 1
+                filename = f"{timestamp}_{stem}_{suffix}{ext}"
+        return os.path.join('images', filename).replace('\\', '/')
+    
+    def local_path(self, storage_path: str) -> str:
+        """Absolute path of a storage path returned by the methods above"""
+        return os.path.join(self.local_storage_path, os.path.relpath(storage_path, 'images'))
+    
+    def save_bytes(self, data: bytes, original_filename: str) -> str:
+        """Store image data held in memory"""
+        storage_path = self.create_file(original_filename)
+        with open(self.local_path(storage_path), 'wb') as f:
+            f.write(data)
+        return storage_path
+    
+    def delete(self, storage_path: str):
+        """Remove a stored file that no database row refers to"""
+        try:
+            os.remove(self.local_path(storage_path))
+        except FileNotFoundError:
+            pass
 
 
 
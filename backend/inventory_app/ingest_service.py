@@ -0,0 +1,177 @@
+"""
+Persistence of inference results for an uploaded image
+"""
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+from django.db import transaction
+from django.utils import timezone
+from .models import Product, DailyCount, Image
+from .detections import pack_detections
+from .timeseries import CountSeriesService
+from .rollups import RollupService
+from .database import write_transaction
+from .events import broker
+from .metrics import span
+
+
+class IngestService:
+    """Service for writing an analysed image and its counts to the database"""
+
+    def __init__(self):
+        self.series_service = CountSeriesService()
+        self.rollup_service = RollupService()
+
+    def record_image(self, storage_path: str, detections: List[Dict],
+                     job_id: Optional[str] = None) -> Tuple[Image, List[Dict], int]:
+        """
+        Store the image row, its packed detections and today's product counts.
+
+        Returns the Image, the per-product detection results for the API
+        response and the total number of products detected. With job_id,
+        an image the same upload job already recorded is returned instead
+        and nothing is written.
+        """
+        # Same day boundary as CountSeriesService.rollup_daily
+        now = timezone.now()
+        today = timezone.localdate(now)
+        detection_results = []
+        total_products = 0
+        product_ids = {}
+        product_counts = {}
+        changes = []
+
+        with write_transaction():
+            existing = Image.objects.filter(job_id=job_id).first() if job_id is not None else None
+            if existing is not None:
+                # An earlier attempt of the job committed, then lost its lease
+                return existing, [
+                    {'product_name': d['product_name'], 'count': d['count'], 'confidence': d['confidence']}
+                    for d in detections
+                ], sum(d['count'] for d in detections)
+
+            for detection in detections:
+                product_name = detection["product_name"]
+                count = detection["count"]
+                confidence = detection["confidence"]
+
+                # Get or create product
+                product, _ = Product.objects.get_or_create(
+                    name=product_name,
+                    defaults={'category': None}
+                )
+                product_ids[product_name] = product.id
+                product_counts[product.id] = count
+
+                # Update or create daily count
+                previous = DailyCount.objects.filter(
+                    product=product, date=today
+                ).values_list('count', flat=True).first()
+                changes.append((product.id, today, previous, count))
+                DailyCount.objects.update_or_create(
+                    product=product,
+                    date=today,
+                    defaults={'count': count}
+                )
+
+                detection_results.append({
+                    'product_name': product_name,
+                    'count': count,
+                    'confidence': confidence
+                })
+                total_products += count
+
+            # Save image metadata
+            confidence_summary = str({d["product_name"]: d["confidence"] for d in detections}) if detections else ""
+            db_image = Image.objects.create(
+                date=now,
+                path=storage_path,
+                confidence_summary=confidence_summary,
+                detections=pack_detections(detections, product_ids),
+                job_id=job_id
+            )
+
+            # Keep every observation; DailyCount above only holds the latest
+            self.series_service.record(db_image, product_counts, db_image.date)
+            self.rollup_service.apply(changes)
+
+            # Push to live dashboards (events.py) only once the rows are visible
+            detection_event = {
+                'image_id': db_image.id,
+                'date': db_image.date,
+                'path': storage_path,
+                'detections': detection_results,
+                'total_products': total_products,
+            }
+            counts_event = {
+                'date': today,
+                'counts': [
+                    {'product_id': product_ids[name], 'product_name': name, 'count': product_counts[product_ids[name]]}
+                    for name in product_ids
+                ],
+            }
+
+            def publish():
+                broker.publish('detection', detection_event)
+                broker.publish('counts', counts_event)
+            transaction.on_commit(publish)
+
+        return db_image, detection_results, total_products
+
+    def record_images(self, images: List[Tuple[str, List[Dict]]]) -> List[Tuple[Image, List[Dict], int]]:
+        """record_image for each (storage_path, detections) pair, all in one transaction"""
+        with write_transaction():
+            return [self.record_image(storage_path, detections) for storage_path, detections in images]
+
+
+class NoDetectionsError(ValueError):
+    """Raised when inference finds no product in an image"""
+
+
+class UploadPipeline:
+    """Inference, storage copy and database writes for one uploaded image"""
+
+    def __init__(self, inference_service, storage_service, ingest_service: Optional[IngestService] = None):
+        self.inference_service = inference_service
+        self.storage_service = storage_service
+        self.ingest_service = ingest_service or IngestService()
+
+    def run(self, path: str, filename: str, progress: Optional[Callable[[str], None]] = None,
+            storage_path: Optional[str] = None, job_id: Optional[str] = None) -> Dict:
+        """
+        Analyse the image file at path and store it under filename.
+
+        progress, when given, is called with the name of each stage
+        ('inference', 'storing', 'saving') before it starts. storage_path
+        is given when the file at path is already in storage (resumable
+        uploads), which skips the copy. job_id makes the run idempotent
+        for a queued upload job (IngestService.record_image). Returns the
+        upload API response body.
+        """
+        progress = progress or (lambda stage: None)
+
+        progress('inference')
+        start_time = time.time()
+        detections = self.inference_service.run_inference(path)
+        processing_time = time.time() - start_time
+        if not detections:
+            raise NoDetectionsError('No product detected in the image')
+
+        if storage_path is None and job_id is not None:
+            # Reuse the copy of an earlier attempt that already recorded the image
+            storage_path = Image.objects.filter(job_id=job_id).values_list('path', flat=True).first()
+        if storage_path is None:
+            progress('storing')
+            with span('storage'):
+                storage_path = self.storage_service.upload_file(path, filename)
+
+        progress('saving')
+        with span('db'):
+            db_image, detection_results, total_products = self.ingest_service.record_image(
+                storage_path, detections, job_id=job_id
+            )
+        return {
+            'image_id': db_image.id,
+            'detections': detection_results,
+            'total_products': total_products,
+            'processing_time': round(processing_time, 2)
+        }
@@ -0,0 +1,320 @@
+"""
+Durable queue of uploaded images waiting for analysis
+
+In async mode upload_image only writes the uploaded bytes to the spool
+directory, enqueues a job and answers 202 with the job id; worker
+processes (`manage.py run_upload_workers`) run inference, the storage
+copy and the database writes, and GET /jobs/<id> reports progress.
+
+The queue is a SQLite file of its own (UPLOAD_QUEUE_PATH, WAL mode), so
+enqueueing and claiming never wait for the application database's
+writer. A worker claims the oldest available job in a BEGIN IMMEDIATE
+transaction and leases it for UPLOAD_VISIBILITY_TIMEOUT seconds,
+renewing the lease at every stage. If the worker dies the lease runs
+out and another worker picks the job up. A failed attempt is retried
+with exponential backoff up to UPLOAD_MAX_ATTEMPTS attempts; failures
+that cannot succeed on retry (no product detected) end the job at once.
+
+Delivery is at least once: a lease can run out after the database writes
+committed but before the job is marked done, and the job then runs
+again. The image row records the job id (unique), so a repeated run
+reuses the stored file and returns the recorded image instead of adding
+a second one and applying its counts twice.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timezone as dt_timezone
+from typing import Dict, Iterable, Optional
+from django.conf import settings
+
+
+STATUSES = ('queued', 'running', 'done', 'failed')
+RETRY_BASE_DELAY = 2.0
+RETRY_MAX_DELAY = 300.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS upload_jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    stage TEXT,
+    path TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    available_at REAL NOT NULL,
+    lease_token TEXT,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+-- Queued jobs and running jobs whose lease may run out, by due time
+CREATE INDEX IF NOT EXISTS upload_jobs_due ON upload_jobs (available_at)
+    WHERE status IN ('queued', 'running');
+CREATE INDEX IF NOT EXISTS upload_jobs_finished ON upload_jobs (updated_at)
+    WHERE status IN ('done', 'failed');
+"""
+
+
+class LeaseLost(Exception):
+    """Raised when a worker's lease on a job ran out and another worker may own it"""
+
+
+@dataclass
+class Job:
+    """A job claimed by a worker"""
+    id: str
+    path: str
+    filename: str
+    attempts: int
+    lease_token: str
+
+
+def _timestamp(value: Optional[float]) -> Optional[str]:
+    if value is None:
+        return None
+    return datetime.fromtimestamp(value, dt_timezone.utc).isoformat().replace('+00:00', 'Z')
+
+
+class UploadQueue:
+    """SQLite-backed job queue with leases and retries"""
+
+    def __init__(self, path: Optional[str] = None, spool_path: Optional[str] = None,
+                 visibility_timeout: Optional[float] = None, max_attempts: Optional[int] = None):
+        self.path = str(path or settings.UPLOAD_QUEUE_PATH)
+        self.spool_path = str(spool_path or settings.UPLOAD_SPOOL_PATH)
+        self.visibility_timeout = visibility_timeout or getattr(settings, 'UPLOAD_VISIBILITY_TIMEOUT', 300)
+        self.max_attempts = max_attempts or getattr(settings, 'UPLOAD_MAX_ATTEMPTS', 3)
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        """One connection per thread, created with the schema on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # Producer side
+
+    def enqueue(self, chunks: Iterable[bytes], filename: str) -> str:
+        """Write the upload to the spool directory and enqueue a job for it; returns the job id"""
+        job_id = uuid.uuid4().hex
+        os.makedirs(self.spool_path, exist_ok=True)
+        path = os.path.join(self.spool_path, job_id + os.path.splitext(filename)[1].lower())
+        with open(path, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+        now = time.time()
+        self._connection().execute(
+            'INSERT INTO upload_jobs (id, status, path, filename, available_at, created_at, updated_at)'
+            " VALUES (?, 'queued', ?, ?, ?, ?, ?)",
+            (job_id, path, filename, now, now, now)
+        )
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Status of a job as returned by the status endpoint"""
+        row = self._connection().execute('SELECT * FROM upload_jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None:
+            return None
+        return {
+            'job_id': row['id'],
+            'status': row['status'],
+            'stage': row['stage'],
+            'attempts': row['attempts'],
+            'filename': row['filename'],
+            'result': json.loads(row['result']) if row['result'] else None,
+            'error': row['error'],
+            'created_at': _timestamp(row['created_at']),
+            'updated_at': _timestamp(row['updated_at']),
+        }
+
+    def stats(self) -> Dict[str, int]:
+        counts = dict(self._connection().execute('SELECT status, COUNT(*) FROM upload_jobs GROUP BY status'))
+        return {status: counts.get(status, 0) for status in STATUSES}
+
+    # Worker side
+
+    def claim(self) -> Optional[Job]:
+        """Lease the oldest due job, or return None when nothing is due"""
+        conn = self._connection()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            while True:
+                row = conn.execute(
+                    "SELECT id, status, path, filename, attempts FROM upload_jobs"
+                    " WHERE status IN ('queued', 'running') AND available_at <= ?"
+                    ' ORDER BY available_at LIMIT 1',
+                    (now,)
+                ).fetchone()
+                if row is None:
+                    conn.execute('COMMIT')
+                    return None
+                if row['status'] == 'running' and row['attempts'] >= self.max_attempts:
+                    # The last attempt's worker never reported back
+                    conn.execute(
+                        "UPDATE upload_jobs SET status = 'failed', lease_token = NULL, updated_at = ?,"
+                        ' error = ? WHERE id = ?',
+                        (now, f"visibility timeout expired after {row['attempts']} attempts", row['id'])
+                    )
+                    self._remove_spooled(row['path'])
+                    continue
+                token = uuid.uuid4().hex
+                conn.execute(
+                    "UPDATE upload_jobs SET status = 'running', stage = NULL, attempts = attempts + 1,"
+                    ' lease_token = ?, available_at = ?, updated_at = ? WHERE id = ?',
+                    (token, now + self.visibility_timeout, now, row['id'])
+                )
+                conn.execute('COMMIT')
+                return Job(row['id'], row['path'], row['filename'], row['attempts'] + 1, token)
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    def touch(self, job: Job, stage: Optional[str] = None):
+        """Record progress and renew the lease; raises LeaseLost if it already ran out"""
+        now = time.time()
+        updated = self._connection().execute(
+            'UPDATE upload_jobs SET stage = COALESCE(?, stage), available_at = ?, updated_at = ?'
+            " WHERE id = ? AND lease_token = ? AND status = 'running'",
+            (stage, now + self.visibility_timeout, now, job.id, job.lease_token)
+        ).rowcount
+        if not updated:
+            raise LeaseLost(job.id)
+
+    def complete(self, job: Job, result: Dict) -> bool:
+        """Mark a job done; False if the lease was lost meanwhile"""
+        updated = self._connection().execute(
+            "UPDATE upload_jobs SET status = 'done', stage = NULL, lease_token = NULL, result = ?, error = NULL,"
+            " updated_at = ? WHERE id = ? AND lease_token = ? AND status = 'running'",
+            (json.dumps(result, ensure_ascii=False), time.time(), job.id, job.lease_token)
+        ).rowcount
+        if updated:
+            self._remove_spooled(job.path)
+        return bool(updated)
+
+    def fail(self, job: Job, error: str, retry: bool = True) -> Optional[str]:
+        """
+        Record a failed attempt: the job is queued again after a backoff
+        delay, or failed for good when retry is False or it has no attempts
+        left. Returns the new status, or None if the lease was lost.
+        """
+        now = time.time()
+        if retry and job.attempts < self.max_attempts:
+            status = 'queued'
+            available_at = now + min(RETRY_BASE_DELAY * 2 ** (job.attempts - 1), RETRY_MAX_DELAY)
+        else:
+            status, available_at = 'failed', now
+        updated = self._connection().execute(
+            'UPDATE upload_jobs SET status = ?, stage = NULL, lease_token = NULL, error = ?, available_at = ?,'
+            " updated_at = ? WHERE id = ? AND lease_token = ? AND status = 'running'",
+            (status, error, available_at, now, job.id, job.lease_token)
+        ).rowcount
+        if not updated:
+            return None
+        if status == 'failed':
+            self._remove_spooled(job.path)
+        return status
+
+    def purge(self, older_than: float) -> int:
+        """Delete finished jobs last updated more than older_than seconds ago"""
+        return self._connection().execute(
+            "DELETE FROM upload_jobs WHERE status IN ('done', 'failed') AND updated_at < ?",
+            (time.time() - older_than,)
+        ).rowcount
+
+    def _remove_spooled(self, path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+class UploadWorker:
+    """Claims upload jobs and runs them through the upload pipeline"""
+
+    def __init__(self, queue: Optional[UploadQueue] = None, pipeline=None, poll_interval: float = 1.0):
+        if pipeline is None:
+            from .inference_service import InferenceService, StorageService
+            from .ingest_service import UploadPipeline
+            pipeline = UploadPipeline(InferenceService(), StorageService())
+        self.queue = queue or UploadQueue()
+        self.pipeline = pipeline
+        self.poll_interval = poll_interval
+
+    def process(self, job: Job) -> Optional[str]:
+        """Run one claimed job; returns its new status"""
+        from .ingest_service import NoDetectionsError
+
+        def progress(stage):
+            self.queue.touch(job, stage)
+
+        try:
+            result = self.pipeline.run(job.path, job.filename, progress=progress, job_id=job.id)
+        except LeaseLost:
+            return None
+        except NoDetectionsError as e:
+            return self.queue.fail(job, str(e), retry=False)
+        except Exception as e:
+            print(f"=== UPLOAD JOB ERROR ({job.id}, attempt {job.attempts}) ===")
+            print(traceback.format_exc())
+            return self.queue.fail(job, str(e))
+        return 'done' if self.queue.complete(job, result) else None
+
+    def run_once(self) -> bool:
+        """Process one due job; False when there was none"""
+        job = self.queue.claim()
+        if job is None:
+            return False
+        self.process(job)
+        return True
+
+    def run(self, burst: bool = False):
+        """Process jobs until interrupted, or with burst until no job is queued or running"""
+        from django.db import close_old_connections
+
+        while True:
+            close_old_connections()
+            if self.run_once():
+                continue
+            if burst:
+                stats = self.queue.stats()
+                if not stats['queued'] and not stats['running']:
+                    return
+            time.sleep(self.poll_interval)
+
+
+def run_worker(poll_interval: float = 1.0, burst: bool = False):
+    """Entry point of a worker process"""
+    import django
+    from django.apps import apps
+    if not apps.ready:  # processes started with spawn begin without Django
+        django.setup()
+    from .profiling import install_signal_trigger, remove_signal_trigger
+    install_signal_trigger()  # manage.py profile_worker --pid
+    try:
+        UploadWorker(poll_interval=poll_interval).run(burst=burst)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        remove_signal_trigger()
@@ -0,0 +1,40 @@
+"""
+Move closed months of daily counts from the database to the column archive
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from inventory_app.archive import DailyCountArchive
+
+
+class Command(BaseCommand):
+    help = 'Archive DailyCount rows of closed months to memory-mapped partitions (run monthly from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--keep-months', type=int, default=getattr(settings, 'COUNT_ARCHIVE_HOT_MONTHS', 3),
+            help='Number of most recent months, including the current one, kept in the database'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='List the months that would be archived without moving anything'
+        )
+
+    def handle(self, *args, **options):
+        archive = DailyCountArchive()
+        months = archive.closed_months(max(options['keep_months'], 1))
+        if not months:
+            self.stdout.write('nothing to archive')
+            return
+
+        total = 0
+        for key in months:
+            if options['dry_run']:
+                self.stdout.write(f'would archive {key}')
+                continue
+            moved = archive.archive_month(key)
+            total += moved
+            if moved:
+                self.stdout.write(f'archived {key}: {moved} rows')
+
+        if not options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'archived {total} rows to {archive.path}'))
@@ -0,0 +1,26 @@
+"""
+Run a registered micro-benchmark and print its measurements
+"""
+from django.core.management.base import BaseCommand, CommandError
+from inventory_app.benchmarks import BENCHMARKS
+
+
+class Command(BaseCommand):
+    help = 'Run a named benchmark from inventory_app.benchmarks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', nargs='?', help='Benchmark to run (omit to list them)')
+        parser.add_argument('--size', type=int, default=100000, help='Problem size')
+
+    def handle(self, *args, **options):
+        name = options['name']
+        if not name:
+            for key, func in sorted(BENCHMARKS.items()):
+                self.stdout.write(f'{key:20} {(func.__doc__ or "").strip()}')
+            return
+        if name not in BENCHMARKS:
+            raise CommandError(f'Unknown benchmark "{name}". Choices: {", ".join(sorted(BENCHMARKS))}')
+
+        results = BENCHMARKS[name](options['size'])
+        for key, value in results.items():
+            self.stdout.write(f'{key:40} {value}')
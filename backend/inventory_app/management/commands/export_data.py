@@ -0,0 +1,59 @@
+"""
+Stream counts, detections or rollups to a CSV, NDJSON or Parquet file
+"""
+import sys
+import time
+from datetime import datetime
+from django.core.management.base import BaseCommand, CommandError
+from inventory_app.export import DATASETS, FORMATS, ExportError, ExportService
+from inventory_app.rollups import GRAINS
+
+
+def _parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise CommandError(f'Invalid date {value!r}, use YYYY-MM-DD')
+
+
+class Command(BaseCommand):
+    help = 'Export a dataset in chunks without loading it into memory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=DATASETS)
+        parser.add_argument('--format', choices=list(FORMATS), default='csv')
+        parser.add_argument('--grain', choices=GRAINS, default='category-day', help='Rollup table for analytics')
+        parser.add_argument('--start', type=_parse_date, help='First date (YYYY-MM-DD)')
+        parser.add_argument('--end', type=_parse_date, help='Last date (YYYY-MM-DD); defaults to today')
+        parser.add_argument('--product', type=int, action='append', help='Only this product id (repeatable)')
+        parser.add_argument('--output', '-o', help='Output file; defaults to stdout')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        service = ExportService(chunk_size=max(options['chunk_size'], 1))
+        try:
+            service.validate(options['dataset'], options['format'], options['grain'])
+        except ExportError as e:
+            raise CommandError(str(e))
+
+        chunks = service.stream(
+            options['dataset'], options['format'], options['start'], options['end'],
+            options['product'], options['grain']
+        )
+        started = time.time()
+        written = 0
+        output = open(options['output'], 'wb') if options['output'] else sys.stdout.buffer
+        try:
+            for chunk in chunks:
+                output.write(chunk)
+                written += len(chunk)
+        finally:
+            if options['output']:
+                output.close()
+            else:
+                output.flush()
+
+        if options['output']:
+            self.stdout.write(self.style.SUCCESS(
+                f'wrote {written} bytes to {options["output"]} in {time.time() - started:.2f}s'
+            ))
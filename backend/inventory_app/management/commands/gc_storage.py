@@ -0,0 +1,55 @@
+"""
+Remove orphan image files and stale Image rows
+"""
+from django.core.management.base import BaseCommand
+from inventory_app.storage_gc import StorageGarbageCollector
+
+
+class Command(BaseCommand):
+    help = 'Find (and optionally delete) image files with no Image row and Image rows with no file'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--delete', action='store_true',
+            help='Delete orphan files and stale rows (default is a dry run)'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Rows read and deleted per database round trip'
+        )
+        parser.add_argument(
+            '--min-age', type=int, default=3600,
+            help='Ignore files modified within this many seconds (in-flight uploads)'
+        )
+        parser.add_argument(
+            '--show', type=int, default=20,
+            help='Number of orphan files and stale rows to list'
+        )
+
+    def handle(self, *args, **options):
+        collector = StorageGarbageCollector(
+            batch_size=options['batch_size'],
+            min_age_seconds=options['min_age'],
+        )
+        report = collector.collect(delete=options['delete'])
+
+        show = options['show']
+        for path in report.orphan_files[:show]:
+            self.stdout.write(f'orphan file: {path}')
+        for image_id in report.stale_rows[:show]:
+            self.stdout.write(f'stale row: images.id={image_id}')
+
+        self.stdout.write(
+            f'scanned {report.files_scanned} files and {report.rows_scanned} rows '
+            f'in {report.elapsed:.2f}s ({report.files_per_second:.0f} files/s), '
+            f'{report.skipped_recent} recent files skipped'
+        )
+        self.stdout.write(
+            f'{len(report.orphan_files)} orphan files, {len(report.stale_rows)} stale rows'
+        )
+        if options['delete']:
+            self.stdout.write(self.style.SUCCESS(
+                f'deleted {report.files_deleted} files and {report.rows_deleted} rows'
+            ))
+        else:
+            self.stdout.write('dry run - pass --delete to remove them')
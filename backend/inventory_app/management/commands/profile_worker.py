@@ -0,0 +1,114 @@
+"""
+Profile a running server or upload worker process with the stack sampler
+"""
+import base64
+import getpass
+import json
+import os
+import shutil
+import signal
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from django.core.management.base import BaseCommand, CommandError
+from inventory_app.profiling import FORMATS, output_path, profiler_dir, request_path, trigger_path
+
+
+class Command(BaseCommand):
+    help = 'Sample a running process for a few seconds and save a collapsed-stack or speedscope profile'
+
+    def add_arguments(self, parser):
+        target = parser.add_mutually_exclusive_group(required=True)
+        target.add_argument(
+            '--pid', type=int,
+            help='Upload worker process on this machine (run_upload_workers), triggered with SIGUSR2'
+        )
+        target.add_argument(
+            '--url',
+            help='Server base URL (http://localhost:8000); profiles whichever process serves the request'
+        )
+        parser.add_argument('--seconds', type=float, default=10, help='Sampling duration')
+        parser.add_argument('--interval', type=float, default=5, help='Milliseconds between samples')
+        parser.add_argument('--format', choices=FORMATS, default='collapsed')
+        parser.add_argument('--idle', action='store_true', help='Keep samples of waiting threads')
+        parser.add_argument(
+            '--user',
+            help='Staff user for --url (password from PROFILER_PASSWORD or prompted)'
+        )
+        parser.add_argument('-o', '--output', help='Output file (default: profile-<pid>.<collapsed|json>)')
+
+    def handle(self, *args, **options):
+        extension = 'json' if options['format'] == 'speedscope' else 'collapsed'
+        if options['pid']:
+            source = self._from_worker(options)
+            output = options['output'] or f"profile-{options['pid']}.{extension}"
+            shutil.move(source, output)
+        else:
+            pid, body = self._from_server(options)
+            output = options['output'] or f'profile-{pid}.{extension}'
+            with open(output, 'wb') as f:
+                f.write(body)
+        self.stdout.write(self.style.SUCCESS(f'profile written to {output}'))
+
+    def _from_worker(self, options) -> str:
+        pid = options['pid']
+        if not os.path.exists(trigger_path(pid)):
+            # SIGUSR2 would terminate a process that does not handle it
+            running = sorted(name[:-4] for name in os.listdir(profiler_dir()) if name.endswith('.pid')) \
+                if os.path.isdir(profiler_dir()) else []
+            raise CommandError(
+                f"Process {pid} is not an upload worker with a profiler trigger "
+                f"(workers: {', '.join(running) or 'none'})"
+            )
+        output = output_path(pid, options['format'])
+        if os.path.exists(output):
+            os.remove(output)
+        with open(request_path(pid), 'w', encoding='utf-8') as f:
+            json.dump({
+                'seconds': options['seconds'],
+                'interval': options['interval'] / 1000,
+                'format': options['format'],
+                'include_idle': options['idle'],
+            }, f)
+        try:
+            os.kill(pid, signal.SIGUSR2)
+        except ProcessLookupError:
+            os.remove(trigger_path(pid))
+            raise CommandError(f'No process {pid}')
+
+        self.stdout.write(f"sampling process {pid} for {options['seconds']}s")
+        deadline = time.time() + options['seconds'] + 30
+        while not os.path.exists(output):
+            if time.time() > deadline:
+                raise CommandError(f'No profile from process {pid}: is it already being profiled?')
+            time.sleep(0.2)
+        return output
+
+    def _from_server(self, options):
+        query = urllib.parse.urlencode({
+            'seconds': options['seconds'],
+            'interval': options['interval'],
+            'output': options['format'],
+            'idle': '1' if options['idle'] else '0',
+        })
+        request = urllib.request.Request(
+            f"{options['url'].rstrip('/')}/api/v1/admin/profile?{query}", method='POST'
+        )
+        if options['user']:
+            password = os.getenv('PROFILER_PASSWORD') or getpass.getpass(f"password for {options['user']}: ")
+            credentials = base64.b64encode(f"{options['user']}:{password}".encode('utf-8')).decode('ascii')
+            request.add_header('Authorization', f'Basic {credentials}')
+
+        self.stdout.write(f"sampling {options['url']} for {options['seconds']}s")
+        try:
+            with urllib.request.urlopen(request, timeout=options['seconds'] + 60) as response:
+                self.stdout.write(
+                    f"{response.headers.get('X-Profile-Samples')} samples, "
+                    f"sampler overhead {float(response.headers.get('X-Profile-Overhead', 0)):.2%}"
+                )
+                return response.headers.get('X-Profile-Pid', 'server'), response.read()
+        except urllib.error.HTTPError as e:
+            raise CommandError(f'{e.code}: {e.read().decode("utf-8", "replace")}')
+        except urllib.error.URLError as e:
+            raise CommandError(f'Could not reach {options["url"]}: {e.reason}')
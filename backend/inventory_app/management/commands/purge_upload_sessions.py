@@ -0,0 +1,15 @@
+"""
+Delete abandoned resumable upload sessions
+"""
+from django.core.management.base import BaseCommand
+from inventory_app.inference_service import StorageService
+from inventory_app.resumable import ResumableUploadService
+
+
+class Command(BaseCommand):
+    help = 'Delete expired resumable upload sessions and the partial files of unfinished ones'
+
+    def handle(self, *args, **options):
+        service = ResumableUploadService(StorageService(), pipeline=None)
+        purged = service.purge_expired()
+        self.stdout.write(self.style.SUCCESS(f'purged {purged} expired upload sessions'))
@@ -0,0 +1,29 @@
+"""
+Stamp the heartbeat row on the primary so replica lag can be measured
+"""
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from inventory_app.database import REPLICA, write_heartbeat
+
+
+class Command(BaseCommand):
+    help = 'Write the current time to the primary every --interval seconds; replica reads compare against it'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float, default=1.0,
+            help='Seconds between heartbeats; the measured lag can be this much too high'
+        )
+        parser.add_argument('--once', action='store_true', help='Write a single heartbeat and exit')
+
+    def handle(self, *args, **options):
+        if REPLICA not in settings.DATABASES:
+            raise CommandError('No replica configured; set DB_REPLICA_NAME')
+
+        while True:
+            started = time.time()
+            write_heartbeat(started)
+            if options['once']:
+                return
+            time.sleep(max(options['interval'] - (time.time() - started), 0))
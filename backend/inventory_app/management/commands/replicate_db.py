@@ -0,0 +1,30 @@
+"""
+Replication stand-in: keep the SQLite replica in sync with the primary
+"""
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from inventory_app.database import REPLICA, ReplicationStandIn
+
+
+class Command(BaseCommand):
+    help = 'Copy the primary SQLite database to the replica (DB_REPLICA_NAME) periodically'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds between snapshots')
+        parser.add_argument('--once', action='store_true', help='Take a single snapshot and exit')
+
+    def handle(self, *args, **options):
+        if REPLICA not in settings.DATABASES:
+            raise CommandError('No replica configured; set DB_REPLICA_NAME')
+        if settings.DATABASES[REPLICA]['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError('The replication stand-in only supports SQLite')
+
+        stand_in = ReplicationStandIn()
+        while True:
+            started = time.time()
+            stand_in.sync()
+            self.stdout.write(f'replica synced in {time.time() - started:.3f}s')
+            if options['once']:
+                return
+            time.sleep(max(options['interval'] - (time.time() - started), 0))
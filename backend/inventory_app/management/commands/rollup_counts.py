@@ -0,0 +1,37 @@
+"""
+Downsample raw count observations to hourly and daily rollups
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+from inventory_app.timeseries import CountSeriesService
+
+
+class Command(BaseCommand):
+    help = 'Roll raw observations up to hourly and daily counts, then apply retention (run from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--since',
+            help='Re-roll from this ISO datetime instead of the last rolled hour (backfills)'
+        )
+        parser.add_argument(
+            '--skip-retention', action='store_true',
+            help='Do not delete raw and hourly rows past their retention'
+        )
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            since = parse_datetime(options['since'])
+            if since is None:
+                raise CommandError('--since must be an ISO datetime, e.g. 2026-01-01T00:00:00+00:00')
+
+        service = CountSeriesService()
+        hours = service.rollup_hourly(since=since)
+        self.stdout.write(f'rolled up {hours} product-hours')
+
+        if not options['skip_retention']:
+            deleted = service.apply_retention()
+            self.stdout.write(
+                f"deleted {deleted['raw']} raw observations and {deleted['hourly']} hourly rows past retention"
+            )
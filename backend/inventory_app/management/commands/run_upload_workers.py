@@ -0,0 +1,90 @@
+"""
+Run worker processes draining the async upload queue
+"""
+import multiprocessing
+import os
+import time
+from multiprocessing.connection import wait
+from django.core.management.base import BaseCommand
+from django.db import connections
+from inventory_app.jobs import UploadQueue, run_worker
+from inventory_app.profiling import remove_signal_trigger
+
+PURGE_INTERVAL = 3600
+
+
+class Command(BaseCommand):
+    help = 'Process queued async uploads with a pool of worker processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Number of worker processes (default: one per CPU)'
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=1.0,
+            help='Seconds an idle worker waits before looking for new jobs'
+        )
+        parser.add_argument(
+            '--burst', action='store_true',
+            help='Exit once the queue is empty instead of waiting for new jobs'
+        )
+        parser.add_argument(
+            '--keep-days', type=float, default=7,
+            help='Finished jobs older than this are deleted, checked every hour'
+        )
+
+    def handle(self, *args, **options):
+        queue = UploadQueue()
+        purged = queue.purge(options['keep_days'] * 86400)
+        self.stdout.write(f"queue {queue.path}: {queue.stats()}, purged {purged} finished jobs")
+
+        workers = [self._start_worker(queue, options) for _ in range(max(options['workers'], 1))]
+        self.stdout.write(f'started {len(workers)} upload workers')
+
+        try:
+            if options['burst']:
+                for worker in workers:
+                    worker.join()
+            else:
+                self._supervise(queue, workers, options)
+        except KeyboardInterrupt:
+            for worker in workers:
+                worker.terminate()
+            for worker in workers:
+                worker.join()
+        # Terminated workers leave their profiler trigger behind
+        for worker in workers:
+            remove_signal_trigger(worker.pid)
+        self.stdout.write(self.style.SUCCESS(f'workers stopped, queue: {queue.stats()}'))
+
+    def _start_worker(self, queue: UploadQueue, options) -> multiprocessing.Process:
+        # Children must not share the parent's database connections
+        connections.close_all()
+        queue.close()
+        worker = multiprocessing.Process(
+            target=run_worker, args=(options['poll_interval'], options['burst']), daemon=True
+        )
+        worker.start()
+        return worker
+
+    def _supervise(self, queue: UploadQueue, workers, options):
+        """Replace workers that die and purge finished jobs every hour, until interrupted"""
+        purge_at = time.monotonic() + PURGE_INTERVAL
+        while True:
+            wait([worker.sentinel for worker in workers], timeout=max(purge_at - time.monotonic(), 0))
+            dead = [i for i, worker in enumerate(workers) if not worker.is_alive()]
+            if dead:
+                # Their leased jobs are picked up again once the lease expires
+                time.sleep(options['poll_interval'])  # don't spin on a worker that dies at start
+            for i in dead:
+                worker = workers[i]
+                remove_signal_trigger(worker.pid)
+                workers[i] = self._start_worker(queue, options)
+                self.stderr.write(
+                    f'upload worker {worker.pid} exited with code {worker.exitcode}, '
+                    f'replaced by {workers[i].pid}'
+                )
+            if time.monotonic() >= purge_at:
+                queue.purge(options['keep_days'] * 86400)
+                purge_at = time.monotonic() + PURGE_INTERVAL
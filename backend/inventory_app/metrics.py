@@ -0,0 +1,199 @@
+"""
+Per-request performance metrics in the Prometheus text format
+
+MetricsMiddleware times every request and counts the SQL queries it ran
+(through a database execute wrapper, on every configured connection),
+and code inside a request marks named stages with span(): the upload
+path records 'decode', 'infer', 'postprocess', 'storage' and 'db'. Both
+feed histograms served by GET /metrics:
+
+    http_request_duration_seconds{method, route, status}
+    http_request_db_queries{method, route}
+    http_request_db_seconds{method, route}
+    stage_duration_seconds{stage}
+
+route is the URL pattern (api/v1/products/<int:product_id>/counts), not
+the path, so the number of series stays bounded. With SERVER_TIMING the
+same figures for the current request are sent in a Server-Timing header
+(total, sql and each stage), which browser dev tools display per request.
+
+Streaming responses are timed up to their headers. Metrics are kept per
+process: scrape each server process, and note that uploads handled by
+the queue workers (run_upload_workers) record their stages in the worker
+process, which serves no /metrics.
+"""
+import bisect
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Sequence, Tuple
+from django.conf import settings
+from django.db import connections
+
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+METHODS = ('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS')
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Prometheus histogram with one series per combination of label values"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str], buckets: Sequence[float]):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [count per bucket..., count above the last bucket, sum]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            snapshot = sorted((labels, list(series)) for labels, series in self._series.items())
+        for labels, series in snapshot:
+            label_text = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, labels))
+            prefix = label_text + ',' if label_text else ''
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{_format_number(bound)}"}} {cumulative}')
+            cumulative += series[len(self.buckets)]
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {cumulative}')
+            braces = f'{{{label_text}}}' if label_text else ''
+            lines.append(f'{self.name}_sum{braces} {series[-1]!r}')
+            lines.append(f'{self.name}_count{braces} {cumulative}')
+        return lines
+
+
+REQUEST_SECONDS = Histogram(
+    'http_request_duration_seconds', 'Time to produce the response, in seconds.',
+    ('method', 'route', 'status'), DURATION_BUCKETS
+)
+REQUEST_QUERIES = Histogram(
+    'http_request_db_queries', 'SQL queries run by the request.',
+    ('method', 'route'), QUERY_BUCKETS
+)
+REQUEST_QUERY_SECONDS = Histogram(
+    'http_request_db_seconds', 'Time spent in SQL queries by the request, in seconds.',
+    ('method', 'route'), DURATION_BUCKETS
+)
+STAGE_SECONDS = Histogram(
+    'stage_duration_seconds', 'Time spent in a named processing stage, in seconds.',
+    ('stage',), DURATION_BUCKETS
+)
+REGISTRY = (REQUEST_SECONDS, REQUEST_QUERIES, REQUEST_QUERY_SECONDS, STAGE_SECONDS)
+
+
+def render_metrics() -> bytes:
+    """Every metric in the Prometheus text exposition format"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+class RequestTimings:
+    """Stage and SQL times of one request"""
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self.queries = 0
+        self.query_time = 0.0
+        # Stages may run on worker threads (batch inference)
+        self._lock = threading.Lock()
+
+    def add_stage(self, name: str, seconds: float):
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.queries += 1
+                self.query_time += elapsed
+
+    def server_timing(self, total: float) -> str:
+        """Server-Timing header value; durations in milliseconds"""
+        entries = [f'total;dur={total * 1000:.1f}', f'sql;dur={self.query_time * 1000:.1f};desc="{self.queries} queries"']
+        with self._lock:
+            entries.extend(f'{name};dur={seconds * 1000:.1f}' for name, seconds in self.stages.items())
+        return ', '.join(entries)
+
+
+_current: ContextVar[Optional[RequestTimings]] = ContextVar('request_timings', default=None)
+
+
+@contextmanager
+def record_queries(timings: RequestTimings):
+    """Count and time the SQL queries of this thread, on every database connection, into timings"""
+    with ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(timings.execute_wrapper))
+        yield timings
+
+
+@contextmanager
+def span(name: str):
+    """Time a processing stage, for stage_duration_seconds and the current request's Server-Timing"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, name)
+        timings = _current.get()
+        if timings is not None:
+            timings.add_stage(name, elapsed)
+
+
+class MetricsMiddleware:
+    """Record duration, SQL queries and stages of every request"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.server_timing = getattr(settings, 'SERVER_TIMING', False)
+
+    def __call__(self, request):
+        timings = RequestTimings()
+        token = _current.set(timings)
+        started = time.perf_counter()
+        try:
+            with record_queries(timings):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        elapsed = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        route = match.route if match is not None else 'unmatched'
+        method = request.method if request.method in METHODS else 'other'
+        REQUEST_SECONDS.observe(elapsed, method, route, str(response.status_code))
+        REQUEST_QUERIES.observe(timings.queries, method, route)
+        REQUEST_QUERY_SECONDS.observe(timings.query_time, method, route)
+        if self.server_timing:
+            response.headers['Server-Timing'] = timings.server_timing(elapsed)
+        return response
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-19 13:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='image',
+            index=models.Index(fields=['date', 'id'], name='images_date_id_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 13:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory_app', '0002_image_date_id_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='image',
+            name='detections',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.7 on 2026-10-19 13:59
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory_app', '0003_image_detections'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HourlyCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(db_index=True)),
+                ('count', models.IntegerField()),
+                ('min_count', models.IntegerField()),
+                ('max_count', models.IntegerField()),
+                ('observations', models.IntegerField()),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hourly_counts', to='inventory_app.product')),
+            ],
+            options={
+                'db_table': 'hourly_counts',
+                'ordering': ['-hour', 'product'],
+                'unique_together': {('product', 'hour')},
+            },
+        ),
+        migrations.CreateModel(
+            name='CountObservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('observed_at', models.DateTimeField()),
+                ('count', models.IntegerField()),
+                ('image', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='observations', to='inventory_app.image')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='observations', to='inventory_app.product')),
+            ],
+            options={
+                'db_table': 'count_observations',
+                'ordering': ['-observed_at'],
+                'indexes': [models.Index(fields=['product', 'observed_at'], name='observations_product_at_idx'), models.Index(fields=['observed_at'], name='observations_at_idx')],
+            },
+        ),
+    ]
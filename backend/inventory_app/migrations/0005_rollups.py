@@ -0,0 +1,62 @@
+# Generated by Django 4.2.7 on 2026-10-19 14:08
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory_app', '0004_count_series'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryWeeklyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(blank=True, max_length=255)),
+                ('week', models.DateField()),
+                ('total', models.BigIntegerField(default=0)),
+                ('samples', models.IntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'category_weekly_rollups',
+                'ordering': ['-week', 'category'],
+                'indexes': [models.Index(fields=['week'], name='category_weekly_week_idx')],
+                'unique_together': {('category', 'week')},
+            },
+        ),
+        migrations.CreateModel(
+            name='CategoryDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(blank=True, max_length=255)),
+                ('day', models.DateField()),
+                ('total', models.BigIntegerField(default=0)),
+                ('samples', models.IntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'category_daily_rollups',
+                'ordering': ['-day', 'category'],
+                'indexes': [models.Index(fields=['day'], name='category_daily_day_idx')],
+                'unique_together': {('category', 'day')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductMonthlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('total', models.BigIntegerField(default=0)),
+                ('samples', models.IntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_rollups', to='inventory_app.product')),
+            ],
+            options={
+                'db_table': 'product_monthly_rollups',
+                'ordering': ['-month', 'product'],
+                'indexes': [models.Index(fields=['month'], name='product_monthly_month_idx')],
+                'unique_together': {('product', 'month')},
+            },
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 4.2.7 on 2026-10-19 14:18
+
+from django.db import migrations, models
+
+
+def number_existing_rows(apps, schema_editor):
+    """Give rows written before the change feed existed their own sequence numbers"""
+    ChangeSequence = apps.get_model('inventory_app', 'ChangeSequence')
+    seq = 0
+    for name in ('Product', 'DailyCount', 'Image'):
+        model = apps.get_model('inventory_app', name)
+        batch = []
+        for row in model.objects.order_by('id').only('id').iterator(chunk_size=5000):
+            seq += 1
+            row.change_seq = seq
+            batch.append(row)
+            if len(batch) >= 5000:
+                model.objects.bulk_update(batch, ['change_seq'])
+                batch = []
+        if batch:
+            model.objects.bulk_update(batch, ['change_seq'])
+    ChangeSequence.objects.create(id=1, value=seq)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory_app', '0005_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'change_sequence',
+            },
+        ),
+        migrations.CreateModel(
+            name='ChangeTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seq', models.BigIntegerField(unique=True)),
+                ('table', models.CharField(max_length=32)),
+                ('row_id', models.BigIntegerField()),
+                ('deleted_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'change_tombstones',
+                'ordering': ['seq'],
+            },
+        ),
+        migrations.AddField(
+            model_name='dailycount',
+            name='change_seq',
+            field=models.BigIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='image',
+            name='change_seq',
+            field=models.BigIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='change_seq',
+            field=models.BigIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.RunPython(number_existing_rows, migrations.RunPython.noop),
+    ]
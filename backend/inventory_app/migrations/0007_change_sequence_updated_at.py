@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 14:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory_app', '0006_change_feed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='changesequence',
+            name='updated_at',
+            field=models.DateTimeField(null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 15:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory_app', '0010_replica_heartbeat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='image',
+            name='job_id',
+            field=models.CharField(blank=True, editable=False, max_length=32, null=True, unique=True),
+        ),
+    ]
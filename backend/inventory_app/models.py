@@ -1,11 +1,30 @@
 """
 Django models for inventory management
 """
-from django.db import models
+from django.db import models, router, transaction
 from django.utils import timezone
 
 
-class Product(models.Model):
+class ChangeTracked(models.Model):
+    """Rows stamped with a global change sequence number on every save, see changes.py"""
+    change_seq = models.BigIntegerField(default=0, db_index=True, editable=False)
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        from .changes import next_change_seqs
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'change_seq'}
+        # Take the number in the same transaction as the write so sequence
+        # order matches commit order
+        with transaction.atomic(using=using):
+            self.change_seq = next_change_seqs(1, using=using)[0]
+            super().save(*args, **kwargs)
+
+
+class Product(ChangeTracked):
     """Product catalog"""
     name = models.CharField(max_length=255, db_index=True)
     category = models.CharField(max_length=255, null=True, blank=True)
@@ -20,7 +39,7 @@ class Product(models.Model):
         return self.name
 
 
-class DailyCount(models.Model):
+class DailyCount(ChangeTracked):
     """Daily product count records"""
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='daily_counts')
     date = models.DateField(db_index=True)
@@ -37,19 +56,203 @@ class DailyCount(models.Model):
         return f"{self.product.name} - {self.date}: {self.count}"
 
 
-class Image(models.Model):
+class Image(ChangeTracked):
     """Stored image metadata"""
     date = models.DateTimeField(default=timezone.now, db_index=True)
     path = models.CharField(max_length=500)
     confidence_summary = models.TextField(null=True, blank=True)
+    # Packed per-detection records, see detections.py for the layout
+    detections = models.BinaryField(null=True, blank=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    # Upload job (jobs.py) that recorded the image; a job retried after losing its lease finds it here
+    job_id = models.CharField(max_length=32, null=True, blank=True, unique=True, editable=False)
 
     class Meta:
         db_table = 'images'
         ordering = ['-date']
+        indexes = [
+            # Backs keyset pagination over (date, id)
+            models.Index(fields=['date', 'id'], name='images_date_id_idx'),
+        ]
 
     def __str__(self):
         return f"Image {self.id} - {self.date}"
 
+    @property
+    def detection_array(self):
+        """Zero-copy structured NumPy view over the packed detections"""
+        from .detections import unpack_detections
+        return unpack_detections(self.detections)
+
+
+class CountObservation(models.Model):
+    """Raw shelf count of one product from one uploaded image"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='observations')
+    image = models.ForeignKey(Image, on_delete=models.SET_NULL, null=True, blank=True, related_name='observations')
+    observed_at = models.DateTimeField()
+    count = models.IntegerField()
+
+    class Meta:
+        db_table = 'count_observations'
+        ordering = ['-observed_at']
+        indexes = [
+            models.Index(fields=['product', 'observed_at'], name='observations_product_at_idx'),
+            models.Index(fields=['observed_at'], name='observations_at_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} @ {self.observed_at}: {self.count}"
+
+
+class HourlyCount(models.Model):
+    """Hourly rollup of CountObservation rows"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='hourly_counts')
+    hour = models.DateTimeField(db_index=True)
+    count = models.IntegerField()  # last observation in the hour
+    min_count = models.IntegerField()
+    max_count = models.IntegerField()
+    observations = models.IntegerField()
+
+    class Meta:
+        db_table = 'hourly_counts'
+        unique_together = ['product', 'hour']
+        ordering = ['-hour', 'product']
+
+    def __str__(self):
+        return f"{self.product_id} @ {self.hour}: {self.count}"
+
+
+
+class CategoryDailyRollup(models.Model):
+    """Sum of DailyCount per product category and day, see rollups.py"""
+    category = models.CharField(max_length=255, blank=True)  # '' for uncategorized products
+    day = models.DateField()
+    total = models.BigIntegerField(default=0)
+    samples = models.IntegerField(default=0)  # DailyCount rows in the sum
+
+    class Meta:
+        db_table = 'category_daily_rollups'
+        unique_together = ['category', 'day']
+        ordering = ['-day', 'category']
+        indexes = [
+            models.Index(fields=['day'], name='category_daily_day_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.category or '-'} @ {self.day}: {self.total}"
+
+
+class CategoryWeeklyRollup(models.Model):
+    """Sum of DailyCount per product category and ISO week (starting Monday)"""
+    category = models.CharField(max_length=255, blank=True)
+    week = models.DateField()  # Monday of the week
+    total = models.BigIntegerField(default=0)
+    samples = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'category_weekly_rollups'
+        unique_together = ['category', 'week']
+        ordering = ['-week', 'category']
+        indexes = [
+            models.Index(fields=['week'], name='category_weekly_week_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.category or '-'} @ {self.week}: {self.total}"
+
+
+class ProductMonthlyRollup(models.Model):
+    """Sum of DailyCount per product and calendar month"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='monthly_rollups')
+    month = models.DateField()  # first day of the month
+    total = models.BigIntegerField(default=0)
+    samples = models.IntegerField(default=0)
 
+    class Meta:
+        db_table = 'product_monthly_rollups'
+        unique_together = ['product', 'month']
+        ordering = ['-month', 'product']
+        indexes = [
+            models.Index(fields=['month'], name='product_monthly_month_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} @ {self.month}: {self.total}"
+
+
+class ChangeSequence(models.Model):
+    """Single-row counter handing out change sequence numbers"""
+    value = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(null=True)  # time of the last change, for Last-Modified
+
+    class Meta:
+        db_table = 'change_sequence'
+
+
+class ChangeTombstone(models.Model):
+    """Deletion of a synced row, kept so clients can drop it"""
+    seq = models.BigIntegerField(unique=True)
+    table = models.CharField(max_length=32)
+    row_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        db_table = 'change_tombstones'
+        ordering = ['seq']
+
+    def __str__(self):
+        return f"{self.table} {self.row_id} deleted @ {self.seq}"
+
+
+class IdempotencyKey(models.Model):
+    """Outcome of a request sent with an Idempotency-Key header, replayed until expires_at"""
+    scope = models.CharField(max_length=64)
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)  # sha256 of the request body
+    token = models.CharField(max_length=32)  # request currently holding the key
+    locked_until = models.DateTimeField()
+    status_code = models.PositiveSmallIntegerField(null=True)  # null while in progress
+    response = models.BinaryField(null=True)  # zlib-compressed JSON body and headers
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        db_table = 'idempotency_keys'
+        unique_together = ['scope', 'key']
+
+    def __str__(self):
+        return f"{self.scope} {self.key} ({self.status_code or 'in progress'})"
+
+
+class UploadSession(models.Model):
+    """A resumable upload in progress; chunks are appended to the file at path"""
+    STATUS_CHOICES = [('open', 'Open'), ('done', 'Done')]
+
+    id = models.CharField(max_length=32, primary_key=True)
+    filename = models.CharField(max_length=255)
+    path = models.CharField(max_length=500)  # storage path relative to MEDIA_ROOT
+    length = models.BigIntegerField()
+    offset = models.BigIntegerField(default=0)
+    sha256 = models.CharField(max_length=64, blank=True)  # expected digest, checked on finalize
+    status = models.CharField(max_length=8, choices=STATUS_CHOICES, default='open')
+    result = models.TextField(null=True, blank=True)  # JSON upload response once finalized
+    locked_until = models.DateTimeField(null=True)  # a chunk or finalize request is running
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        db_table = 'upload_sessions'
+
+    def __str__(self):
+        return f"{self.filename} {self.offset}/{self.length} ({self.status})"
+
+
+class ReplicaHeartbeat(models.Model):
+    """Single row stamped on the primary by `manage.py replica_heartbeat`; its replicated value measures replica lag"""
+    beat_at = models.FloatField()  # Unix time of the primary's last stamp
+
+    class Meta:
+        db_table = 'replica_heartbeat'
+
+    def __str__(self):
+        return f"heartbeat {self.beat_at}"
@@ -0,0 +1,155 @@
+"""
+Compact binary (MessagePack) encoding of API payloads for mobile clients
+
+A payload is sent as the MessagePack map {"strings": [...], "data": value},
+where value mirrors the JSON payload except that every non-empty list of
+objects sharing the same keys becomes a column table:
+
+    {"$table": row count, "fields": [...], "columns": [...]}
+
+Each column is one of
+
+    ["int", dtype, bytes]    integers, delta-encoded: value i is the sum of
+                             entries 0..i, so ids and dates in order pack
+                             into one byte each
+    ["float", bytes]         float64
+    ["str", dtype, bytes]    indices into strings, -1 for null; a product
+                             name or date repeated across rows is sent once
+    ["table", table]         objects with the same keys, as a nested table
+    ["any", [...]]           anything else, value by value
+
+dtype is the smallest of '<i1', '<i2', '<i4', '<i8' (little-endian) that
+holds every entry. Dates and datetimes are sent as their JSON strings.
+The same format is produced by the FastAPI app (app/packing.py); unpack()
+is the reference decoder.
+"""
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, List
+import numpy as np
+
+try:
+    import msgpack
+except ImportError:  # binary responses are unavailable without msgpack
+    msgpack = None
+
+
+MEDIA_TYPE = 'application/msgpack'
+
+_INT_DTYPES = ('<i1', '<i2', '<i4', '<i8')
+
+
+def _int_dtype(low: int, high: int) -> str:
+    for dtype in _INT_DTYPES:
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return dtype
+    return '<i8'
+
+
+def _json_scalar(value):
+    """The value the JSON renderer would send, for types JSON lacks"""
+    if isinstance(value, datetime):
+        text = value.isoformat()
+        return text[:-6] + 'Z' if text.endswith('+00:00') else text
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+class _Packer:
+    def __init__(self):
+        self.strings: List[str] = []
+        self._index: Dict[str, int] = {}
+
+    def intern(self, text: str) -> int:
+        index = self._index.get(text)
+        if index is None:
+            index = self._index[text] = len(self.strings)
+            self.strings.append(text)
+        return index
+
+    def value(self, value):
+        if isinstance(value, dict):
+            return {key: self.value(item) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            if value and all(isinstance(item, dict) for item in value):
+                keys = value[0].keys()
+                if all(item.keys() == keys for item in value):
+                    return self.table(value, list(keys))
+            return [self.value(item) for item in value]
+        return _json_scalar(value)
+
+    def table(self, rows: List[dict], fields: List[str]) -> Dict:
+        return {
+            '$table': len(rows),
+            'fields': fields,
+            'columns': [self.column([row[field] for row in rows]) for field in fields],
+        }
+
+    def column(self, values: List[Any]) -> List:
+        values = [_json_scalar(value) for value in values]
+        types = {type(value) for value in values}
+        if types == {int}:
+            deltas = np.diff(np.array(values, dtype=np.int64), prepend=0)
+            dtype = _int_dtype(int(deltas.min()), int(deltas.max()))
+            return ['int', dtype, deltas.astype(dtype).tobytes()]
+        if float in types and types <= {int, float}:
+            return ['float', np.array(values, dtype='<f8').tobytes()]
+        if str in types and types <= {str, type(None)}:
+            indices = [self.intern(value) if value is not None else -1 for value in values]
+            dtype = _int_dtype(-1, max(indices))
+            return ['str', dtype, np.array(indices, dtype=dtype).tobytes()]
+        if types == {dict}:
+            packed = self.value(values)
+            if isinstance(packed, dict):
+                return ['table', packed]
+        return ['any', [self.value(value) for value in values]]
+
+
+class _Unpacker:
+    def __init__(self, strings: List[str]):
+        self.strings = strings
+
+    def value(self, value):
+        if isinstance(value, dict):
+            if '$table' in value:
+                return self.table(value)
+            return {key: self.value(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self.value(item) for item in value]
+        return value
+
+    def table(self, table: Dict) -> List[dict]:
+        columns = [self.column(column) for column in table['columns']]
+        return [dict(zip(table['fields'], row)) for row in zip(*columns)]
+
+    def column(self, column: List) -> List:
+        kind = column[0]
+        if kind == 'int':
+            return np.cumsum(np.frombuffer(column[2], dtype=column[1]), dtype=np.int64).tolist()
+        if kind == 'float':
+            return np.frombuffer(column[1], dtype='<f8').tolist()
+        if kind == 'str':
+            strings = self.strings
+            return [strings[i] if i >= 0 else None for i in np.frombuffer(column[2], dtype=column[1]).tolist()]
+        if kind == 'table':
+            return self.table(column[1])
+        return [self.value(value) for value in column[1]]
+
+
+def pack(data) -> bytes:
+    """Encode a JSON-like payload; requires msgpack"""
+    packer = _Packer()
+    packed = packer.value(data)
+    return msgpack.packb({'strings': packer.strings, 'data': packed}, use_bin_type=True)
+
+
+def unpack(blob: bytes):
+    """Decode bytes produced by pack() back into the JSON payload"""
+    payload = msgpack.unpackb(blob, raw=False)
+    return _Unpacker(payload['strings']).value(payload['data'])
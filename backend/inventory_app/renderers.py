@@ -0,0 +1,58 @@
+"""
+JSON renderer for the DRF API
+
+FastJSONRenderer encodes with orjson when it is installed, which is several
+times faster than the stdlib json module on large lists of dicts, and
+falls back to DRF's stock JSONRenderer otherwise (and for ?indent= /
+Accept indent requests, which orjson only supports at two spaces). The
+output matches the stock renderer: compact, UTF-8 without \\u escapes,
+datetimes in ISO 8601 with "Z" for UTC.
+
+PackedRenderer offers the compact MessagePack format of packing.py to
+clients that send Accept: application/msgpack.
+"""
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from .packing import MEDIA_TYPE, msgpack, pack
+
+try:
+    import orjson
+except ImportError:  # fall back to the stdlib encoder
+    orjson = None
+
+
+_encode_fallback = JSONEncoder().default
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer backed by orjson when available"""
+
+    options = (orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY) if orjson else 0
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or self.get_indent(accepted_media_type or '', renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+        # Types orjson does not know (Decimal, lazy strings, numpy scalars...)
+        # go through DRF's encoder, as with the stock renderer
+        return orjson.dumps(data, default=_encode_fallback, option=self.options)
+
+
+class PackedRenderer(BaseRenderer):
+    """Compact MessagePack encoding for mobile clients (see packing.py)"""
+
+    media_type = MEDIA_TYPE
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return pack(data)
+
+
+# Renderers of the heavy list endpoints: JSON by default, MessagePack when
+# the client asks for it with Accept: application/msgpack
+PACKED_RENDERERS = [FastJSONRenderer] + ([PackedRenderer] if msgpack is not None else [])
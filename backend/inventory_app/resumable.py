@@ -0,0 +1,284 @@
+"""
+Resumable uploads of large shelf images
+
+A client on an unreliable connection uploads an image in chunks:
+
+    POST   /uploads                  {"filename", "length", "sha256"?} -> 201, upload id
+    PATCH  /uploads/<id>             Upload-Offset: n, body = bytes n..  -> new offset
+    HEAD   /uploads/<id>             Upload-Offset of the bytes received so far
+    POST   /uploads/<id>/finalize    runs inference -> upload response
+
+Chunks are appended straight to the file in image storage that will hold
+the finished image, and hashed as they are written, so finalizing neither
+copies nor re-reads the file (a process that never saw the earlier
+chunks, e.g. after a restart, hashes the received prefix once). Bytes
+that arrive before a connection drops are kept, so the client resumes
+from the offset HEAD reports instead of starting over.
+
+A session untouched for RESUMABLE_UPLOAD_EXPIRY seconds is abandoned:
+purge_expired() (run on every new session and by
+`manage.py purge_upload_sessions`) deletes it and its partial file.
+"""
+import hashlib
+import json
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Dict, Optional, Tuple
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from .models import UploadSession
+from .ingest_service import NoDetectionsError
+from .database import write_transaction
+
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif')
+READ_SIZE = 64 * 1024
+PURGE_BATCH = 100
+MAX_CACHED_HASHERS = 256
+
+
+class ResumableUploadError(Exception):
+    """Base class of errors returned by the resumable upload endpoints"""
+    status_code = 400
+
+
+class SessionNotFound(ResumableUploadError):
+    status_code = 404
+
+
+class OffsetConflict(ResumableUploadError):
+    """The request does not continue at the session's offset; offset is where it should"""
+    status_code = 409
+
+    def __init__(self, message: str, offset: int):
+        super().__init__(message)
+        self.offset = offset
+
+
+class SessionBusy(ResumableUploadError):
+    """Another request is writing to or finalizing the session"""
+    status_code = 423
+
+
+class ChunkTooLarge(ResumableUploadError):
+    status_code = 413
+
+
+class ChecksumMismatch(ResumableUploadError):
+    """The received file does not match the sha256 given when the session was created"""
+    status_code = 422
+
+
+class _Hashers:
+    """sha256 objects of sessions being written, by session id, with the offset they cover"""
+
+    def __init__(self, capacity: int = MAX_CACHED_HASHERS):
+        self.capacity = capacity
+        self._items: 'OrderedDict[str, Tuple[int, object]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, session_id: str, offset: int, path: str):
+        """The hasher covering the first offset bytes of path, rebuilt from the file if not cached"""
+        with self._lock:
+            cached = self._items.pop(session_id, None)
+        if cached and cached[0] == offset:
+            return cached[1]
+        hasher = hashlib.sha256()
+        with open(path, 'rb') as f:
+            remaining = offset
+            while remaining > 0:
+                chunk = f.read(min(READ_SIZE, remaining))
+                if not chunk:
+                    break
+                hasher.update(chunk)
+                remaining -= len(chunk)
+        return hasher
+
+    def put(self, session_id: str, offset: int, hasher):
+        with self._lock:
+            self._items[session_id] = (offset, hasher)
+            while len(self._items) > self.capacity:
+                self._items.popitem(last=False)
+
+    def drop(self, session_id: str):
+        with self._lock:
+            self._items.pop(session_id, None)
+
+
+class ResumableUploadService:
+    """Upload sessions: create, append chunks, finalize into the upload pipeline"""
+
+    def __init__(self, storage_service, pipeline, expiry: Optional[float] = None,
+                 max_length: Optional[int] = None, lock: Optional[float] = None):
+        self.storage_service = storage_service
+        self.pipeline = pipeline
+        self.expiry = expiry or getattr(settings, 'RESUMABLE_UPLOAD_EXPIRY', 24 * 3600)
+        self.max_length = max_length or getattr(settings, 'RESUMABLE_UPLOAD_MAX_LENGTH', 200 * 1024 * 1024)
+        # How long a chunk request may hold the session before another may take it over
+        self.lock = lock or getattr(settings, 'RESUMABLE_UPLOAD_LOCK', 600)
+        self.hashers = _Hashers()
+
+    def _expires(self):
+        return timezone.now() + timedelta(seconds=self.expiry)
+
+    def create(self, filename: str, length: int, sha256: str = '') -> UploadSession:
+        filename = os.path.basename(filename or '')
+        if not filename.lower().endswith(IMAGE_EXTENSIONS):
+            raise ResumableUploadError('filename must be a JPG, PNG or GIF image')
+        if length <= 0 or length > self.max_length:
+            raise ResumableUploadError(f'length must be between 1 and {self.max_length} bytes')
+        sha256 = (sha256 or '').lower()
+        if sha256 and (len(sha256) != 64 or any(c not in '0123456789abcdef' for c in sha256)):
+            raise ResumableUploadError('sha256 must be 64 hexadecimal characters')
+
+        self.purge_expired(limit=PURGE_BATCH)
+        storage_path = self.storage_service.create_file(filename)
+        with write_transaction():
+            return UploadSession.objects.create(
+                id=uuid.uuid4().hex, filename=filename, path=storage_path, length=length,
+                sha256=sha256, expires_at=self._expires()
+            )
+
+    def get(self, upload_id: str) -> UploadSession:
+        session = UploadSession.objects.filter(id=upload_id).first()
+        if session is None:
+            raise SessionNotFound('Upload session not found or expired')
+        return session
+
+    def _claim(self, session: UploadSession):
+        """
+        Lock the session at its current offset, or raise why it cannot be.
+
+        Returns the lock's expiry, which identifies the lock holder.
+        """
+        now = timezone.now()
+        until = now + timedelta(seconds=self.lock)
+        with write_transaction():
+            claimed = UploadSession.objects.filter(
+                Q(locked_until__isnull=True) | Q(locked_until__lt=now),
+                id=session.id, status='open', offset=session.offset,
+            ).update(locked_until=until)
+        if not claimed:
+            current = self.get(session.id)
+            if current.status != 'open':
+                raise OffsetConflict('Upload already finalized', current.offset)
+            if current.offset != session.offset:
+                raise OffsetConflict('Upload-Offset does not match the upload', current.offset)
+            raise SessionBusy('Another request is writing to this upload')
+        return until
+
+    def append(self, upload_id: str, offset: int, stream, content_length: int) -> UploadSession:
+        """
+        Write content_length bytes read from stream at offset.
+
+        Whatever was received is kept when the stream ends early or fails;
+        the new offset is saved either way.
+        """
+        session = self.get(upload_id)
+        if session.status != 'open':
+            raise OffsetConflict('Upload already finalized', session.offset)
+        if offset != session.offset:
+            raise OffsetConflict('Upload-Offset does not match the upload', session.offset)
+        if offset + content_length > session.length:
+            raise ChunkTooLarge(f'Chunk ends past the upload length of {session.length} bytes')
+        until = self._claim(session)
+
+        path = self.storage_service.local_path(session.path)
+        written = 0
+        hasher = None
+        try:
+            hasher = self.hashers.take(session.id, offset, path)
+            with open(path, 'r+b') as f:
+                # Drop bytes past the offset left by a write that was never recorded
+                f.seek(offset)
+                f.truncate()
+                while written < content_length:
+                    chunk = stream.read(min(READ_SIZE, content_length - written))
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    hasher.update(chunk)
+                    written += len(chunk)
+                f.flush()
+                os.fsync(f.fileno())
+        finally:
+            session.offset = offset + written
+            with write_transaction():
+                # Not updated when the lock ran out and another request took the session over
+                kept = UploadSession.objects.filter(id=session.id, locked_until=until).update(
+                    offset=session.offset, locked_until=None, expires_at=self._expires()
+                )
+            if hasher is not None and kept:
+                self.hashers.put(session.id, session.offset, hasher)
+        return session
+
+    def finalize(self, upload_id: str) -> Dict:
+        """Run the finished upload through the pipeline; replays the result when already finalized"""
+        session = self.get(upload_id)
+        if session.status == 'done':
+            return json.loads(session.result)
+        if session.offset < session.length:
+            raise OffsetConflict(f'Upload incomplete: {session.offset} of {session.length} bytes received',
+                                 session.offset)
+        self._claim(session)
+
+        path = self.storage_service.local_path(session.path)
+        try:
+            digest = self.hashers.take(session.id, session.offset, path).hexdigest()
+            if session.sha256 and digest != session.sha256:
+                self._remove(session)
+                raise ChecksumMismatch('sha256 of the received file does not match; upload it again')
+            result = self.pipeline.run(path, session.filename, storage_path=session.path)
+        except NoDetectionsError:
+            self._remove(session)
+            raise
+        except BaseException:
+            UploadSession.objects.filter(id=session.id, status='open').update(locked_until=None)
+            raise
+        result['sha256'] = digest
+        with write_transaction():
+            UploadSession.objects.filter(id=session.id).update(
+                status='done', result=json.dumps(result, ensure_ascii=False), locked_until=None,
+                expires_at=self._expires()
+            )
+        return result
+
+    def cancel(self, upload_id: str):
+        session = self.get(upload_id)
+        if session.status != 'open':
+            raise OffsetConflict('Upload already finalized', session.offset)
+        self._claim(session)
+        self._remove(session)
+
+    def _remove(self, session: UploadSession):
+        """Delete an open session and its partial file"""
+        self.hashers.drop(session.id)
+        with write_transaction():
+            UploadSession.objects.filter(id=session.id).delete()
+        try:
+            os.remove(self.storage_service.local_path(session.path))
+        except FileNotFoundError:
+            pass
+
+    def purge_expired(self, limit: Optional[int] = None) -> int:
+        """Delete expired sessions (and the partial files of unfinished ones); returns how many"""
+        now = timezone.now()
+        with write_transaction():
+            expired = UploadSession.objects.filter(
+                Q(locked_until__isnull=True) | Q(locked_until__lt=now), expires_at__lt=now
+            ).values_list('id', 'path', 'status')
+            expired = list(expired[:limit] if limit else expired)
+            if expired:
+                UploadSession.objects.filter(id__in=[session_id for session_id, _, _ in expired]).delete()
+        for session_id, path, session_status in expired:
+            self.hashers.drop(session_id)
+            if session_status == 'open':
+                try:
+                    os.remove(self.storage_service.local_path(path))
+                except FileNotFoundError:
+                    pass
+        return len(expired)
@@ -0,0 +1,242 @@
+"""
+Pre-aggregated rollups of DailyCount
+
+Three tables hold sums of daily counts so dashboards never scan raw rows:
+
+    category_daily_rollups    (category, day)
+    category_weekly_rollups   (category, week)     week = its Monday
+    product_monthly_rollups   (product, month)     month = its first day
+
+Each row keeps the total and the number of DailyCount rows in it, so
+averages can be derived. The write paths that change DailyCount
+(IngestService, CountSeriesService.rollup_daily and product deletion)
+report each change as (product_id, day, old_count, new_count) to
+RollupService.apply(), which adds the difference to the affected rows in
+the same transaction. Archiving does not change the rollups.
+
+Changes made elsewhere (the admin, raw SQL, moving a product to another
+category) are not tracked; `python manage.py rebuild_rollups` recomputes
+the tables from the hot and archived counts.
+"""
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from .models import Product, CategoryDailyRollup, CategoryWeeklyRollup, ProductMonthlyRollup
+from .archive import EPOCH, DailyCountArchive, month_bounds, month_key, days_to_dates
+from .database import upsert_rows, write_transaction
+from .changes import next_change_seqs
+
+
+# (product_id, day, count before or None, count after or None)
+CountChange = Tuple[int, date, Optional[int], Optional[int]]
+
+GRAINS = ('category-day', 'category-week', 'product-month')
+
+
+def week_start(day: date) -> date:
+    return day - timedelta(days=day.weekday())
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def _group_sum(first: np.ndarray, second: np.ndarray, count: np.ndarray) -> List[Tuple[int, int, int, int]]:
+    """(first, second, sum of count, rows) for each distinct (first, second) pair"""
+    if not len(count):
+        return []
+    key = (first.astype(np.int64) << 32) | (second.astype(np.int64) & 0xFFFFFFFF)
+    keys, inverse = np.unique(key, return_inverse=True)
+    totals = np.bincount(inverse, weights=count.astype(np.float64)).astype(np.int64)
+    samples = np.bincount(inverse)
+    return list(zip(
+        (keys >> 32).tolist(),
+        (keys & 0xFFFFFFFF).astype(np.int32).tolist(),
+        totals.tolist(),
+        samples.tolist(),
+    ))
+
+
+class RollupService:
+    """Service for maintaining and querying the count rollup tables"""
+
+    def __init__(self, archive: Optional[DailyCountArchive] = None, batch_size: int = 5000):
+        self.archive = archive or DailyCountArchive()
+        self.batch_size = batch_size
+
+    # Incremental maintenance
+
+    def apply(self, changes: Iterable[CountChange]):
+        """Add the difference of each DailyCount change to its rollup rows"""
+        changes = [c for c in changes if c[2] != c[3]]
+        if not changes:
+            return
+        categories = dict(
+            Product.objects.filter(id__in={c[0] for c in changes}).values_list('id', 'category')
+        )
+        daily = defaultdict(lambda: [0, 0])
+        weekly = defaultdict(lambda: [0, 0])
+        monthly = defaultdict(lambda: [0, 0])
+        for product_id, day, old, new in changes:
+            delta = (new or 0) - (old or 0)
+            samples = (new is not None) - (old is not None)
+            category = categories.get(product_id) or ''
+            for bucket, key in (
+                (daily, (category, day)),
+                (weekly, (category, week_start(day))),
+                (monthly, (product_id, month_start(day))),
+            ):
+                bucket[key][0] += delta
+                bucket[key][1] += samples
+
+        with write_transaction():
+            self._increment(CategoryDailyRollup, ('category', 'day'), daily)
+            self._increment(CategoryWeeklyRollup, ('category', 'week'), weekly)
+            self._increment(ProductMonthlyRollup, ('product_id', 'month'), monthly)
+
+    def _increment(self, model, key_fields: Tuple[str, str], deltas: Dict[Tuple, List[int]]):
+        """Add deltas to their rows with one locking read and one upsert, however many keys"""
+        deltas = {key: value for key, value in deltas.items() if value[0] or value[1]}
+        if not deltas:
+            return
+        group, period = key_fields
+        periods = [key[1] for key in deltas]
+        existing = {
+            (key, when): (total, samples)
+            for key, when, total, samples in model.objects.select_for_update().filter(**{
+                f'{group}__in': {key[0] for key in deltas},
+                f'{period}__gte': min(periods),
+                f'{period}__lte': max(periods),
+            }).values_list(group, period, 'total', 'samples')
+        }
+        upsert_rows(
+            model,
+            (group, period, 'total', 'samples'),
+            (
+                (key[0], key[1], existing.get(key, (0, 0))[0] + delta, existing.get(key, (0, 0))[1] + samples)
+                for key, (delta, samples) in deltas.items()
+            ),
+            unique_fields=(group, period),
+            update_fields=('total', 'samples'),
+        )
+        if any(samples < 0 for _, samples in deltas.values()):
+            model.objects.filter(samples__lte=0).delete()
+
+    def remove_product(self, product_id: int):
+        """Subtract every hot and archived count of a product that is about to be deleted"""
+        first = self.archive.earliest_date()
+        if first is None:
+            return
+        window = self.archive.read_window(first, date.today(), [product_id])
+        self.apply(
+            (product_id, day, count, None)
+            for day, count in zip(days_to_dates(window.day), window.count.tolist())
+        )
+
+    # Backfill
+
+    def rebuild(self, start: Optional[date] = None, end: Optional[date] = None) -> Dict[str, int]:
+        """
+        Recompute the rollups of every month overlapping [start, end].
+
+        The range is widened to whole months, and then to whole weeks, so
+        every rewritten row is a complete sum. Runs under the writer lock.
+        """
+        with write_transaction():
+            start = start or self.archive.earliest_date()
+            if start is None:
+                return {'category-day': 0, 'category-week': 0, 'product-month': 0}
+            end = end or date.today()
+            first_month = month_start(start)
+            last_month = month_start(end)
+            lo = week_start(first_month)
+            hi = month_bounds(month_key(end))[1] - timedelta(days=1)
+            hi = week_start(hi) + timedelta(days=6)
+
+            categories = dict(Product.objects.values_list('id', 'category'))
+            names = sorted({c or '' for c in categories.values()})
+            codes = {name: i for i, name in enumerate(names)}
+            product_code = {pid: codes[c or ''] for pid, c in categories.items()}
+
+            daily, weekly, monthly = [], [], []
+            week_totals = defaultdict(lambda: [0, 0])
+            key = month_key(lo)
+            while month_bounds(key)[0] <= hi:
+                bounds = month_bounds(key)
+                window = self.archive.read_window(max(bounds[0], lo), min(bounds[1] - timedelta(days=1), hi))
+                key = month_key(bounds[1])
+                if not len(window):
+                    continue
+                known = np.isin(window.product, np.fromiter(product_code, dtype=np.int32))
+                product, day, count = window.product[known], window.day[known], window.count[known]
+                category = np.array([product_code[p] for p in product.tolist()], dtype=np.int32)
+
+                for code, d, total, samples in _group_sum(category, day, count):
+                    daily.append(CategoryDailyRollup(
+                        category=names[code], day=EPOCH + timedelta(days=d), total=total, samples=samples
+                    ))
+                monday = day - (day + 3) % 7  # 1970-01-01 was a Thursday
+                for code, d, total, samples in _group_sum(category, monday, count):
+                    bucket = week_totals[(names[code], d)]
+                    bucket[0] += total
+                    bucket[1] += samples
+                if bounds[0] >= first_month and bounds[0] <= last_month:
+                    for pid, _, total, samples in _group_sum(product, np.zeros_like(day), count):
+                        monthly.append(ProductMonthlyRollup(
+                            product_id=pid, month=bounds[0], total=total, samples=samples
+                        ))
+
+            for (name, d), (total, samples) in week_totals.items():
+                weekly.append(CategoryWeeklyRollup(
+                    category=name, week=EPOCH + timedelta(days=d), total=total, samples=samples
+                ))
+
+            CategoryDailyRollup.objects.filter(day__gte=lo, day__lte=hi).delete()
+            CategoryWeeklyRollup.objects.filter(week__gte=lo, week__lte=hi).delete()
+            ProductMonthlyRollup.objects.filter(month__gte=first_month, month__lte=last_month).delete()
+            for model, rows in ((CategoryDailyRollup, daily), (CategoryWeeklyRollup, weekly),
+                                (ProductMonthlyRollup, monthly)):
+                model.objects.bulk_create(rows, batch_size=self.batch_size)
+            # Readers validate cached rollups against the change sequence
+            next_change_seqs(1)
+
+        return {'category-day': len(daily), 'category-week': len(weekly), 'product-month': len(monthly)}
+
+    # Reading
+
+    def query(self, grain: str, start: date, end: date,
+              category: Optional[str] = None, product_id: Optional[int] = None) -> List[Dict]:
+        """Rollup rows of grain whose period overlaps [start, end], oldest first"""
+        if grain == 'category-day':
+            rows = CategoryDailyRollup.objects.filter(day__gte=start, day__lte=end)
+            period = 'day'
+        elif grain == 'category-week':
+            rows = CategoryWeeklyRollup.objects.filter(week__gte=week_start(start), week__lte=end)
+            period = 'week'
+        elif grain == 'product-month':
+            rows = ProductMonthlyRollup.objects.filter(month__gte=month_start(start), month__lte=end)
+            period = 'month'
+        else:
+            raise ValueError(f'Unknown grain {grain!r}, expected one of {", ".join(GRAINS)}')
+
+        if grain == 'product-month':
+            group = 'product_id'
+            if product_id is not None:
+                rows = rows.filter(product_id=product_id)
+        else:
+            group = 'category'
+            if category is not None:
+                rows = rows.filter(category=category)
+
+        return [
+            {
+                group: key,
+                'period': when,
+                'total': total,
+                'samples': samples,
+                'average': round(total / samples, 2) if samples else 0,
+            }
+            for key, when, total, samples
+            in rows.order_by(period, group).values_list(group, period, 'total', 'samples')
+        ]
@@ -69,8 +69,8 @@ class RecommendationService:
             counts = data["counts"]
             dates = data["dates"]
             
-            # Calculate analytics
-            analytics = self.analytics_service.calculate_product_analytics(
+            # Calculate analytics, unless the caller already did
+            analytics = data.get("analytics") or self.analytics_service.calculate_product_analytics(
                 product_id=product.id,
                 product_name=product.name,
                 counts=counts,
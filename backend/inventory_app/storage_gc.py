@@ -0,0 +1,145 @@
+"""
+Mark-and-sweep garbage collection for stored images
+"""
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Iterator, List, Set, Tuple
+from django.conf import settings
+from .models import Image, UploadSession
+from .database import write_transaction
+
+
+@dataclass
+class GCReport:
+    """Outcome of a single garbage collection run"""
+    files_scanned: int = 0
+    rows_scanned: int = 0
+    orphan_files: List[str] = field(default_factory=list)
+    stale_rows: List[int] = field(default_factory=list)
+    files_deleted: int = 0
+    rows_deleted: int = 0
+    skipped_recent: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def files_per_second(self) -> float:
+        return self.files_scanned / self.elapsed if self.elapsed > 0 else 0.0
+
+
+class StorageGarbageCollector:
+    """
+    Finds files in the image storage tree with no Image row (orphan files)
+    and Image rows whose file no longer exists (stale rows).
+
+    The storage tree is walked once into a set of relative paths, then the
+    images table is streamed in batches and each row's path is struck from
+    that set. Whatever is left in the set is an orphan, and every row that
+    did not find its path is stale. No per-file queries are issued.
+    """
+
+    def __init__(self, batch_size: int = 5000, min_age_seconds: int = 3600):
+        self.batch_size = batch_size
+        # Files younger than this may belong to an upload that has not
+        # created its Image row yet, so they are never treated as orphans
+        self.min_age_seconds = min_age_seconds
+        self.media_root = getattr(settings, 'MEDIA_ROOT', os.path.join(settings.BASE_DIR, 'media'))
+        self.storage_root = os.path.join(self.media_root, 'images')
+
+    def _walk_storage(self, cutoff: float, report: GCReport) -> Iterator[str]:
+        """Yield storage paths relative to MEDIA_ROOT, as stored in Image.path"""
+        stack = [self.storage_root]
+        while stack:
+            current = stack.pop()
+            try:
+                entries = os.scandir(current)
+            except FileNotFoundError:
+                continue
+            with entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                        continue
+                    report.files_scanned += 1
+                    if entry.stat(follow_symlinks=False).st_mtime > cutoff:
+                        report.skipped_recent += 1
+                        continue
+                    yield os.path.relpath(entry.path, self.media_root).replace('\\', '/')
+
+    def _iter_rows(self, report: GCReport) -> Iterator[List[Tuple[int, str]]]:
+        """Stream (id, path) pairs from the images table in keyed batches"""
+        last_id = 0
+        while True:
+            batch = list(
+                Image.objects.filter(id__gt=last_id)
+                .order_by('id')
+                .values_list('id', 'path')[:self.batch_size]
+            )
+            if not batch:
+                return
+            report.rows_scanned += len(batch)
+            last_id = batch[-1][0]
+            yield batch
+
+    def mark(self) -> GCReport:
+        """Compute orphan files and stale rows without changing anything"""
+        report = GCReport()
+        started = time.time()
+        cutoff = started - self.min_age_seconds
+
+        unreferenced: Set[str] = set(self._walk_storage(cutoff, report))
+        # Files of resumable uploads still receiving chunks have no Image row yet
+        unreferenced.difference_update(UploadSession.objects.filter(status='open').values_list('path', flat=True))
+        for batch in self._iter_rows(report):
+            for image_id, path in batch:
+                if path.startswith('s3://'):
+                    continue
+                if path in unreferenced:
+                    unreferenced.discard(path)
+                elif not os.path.exists(os.path.join(self.media_root, path)):
+                    # Only reached for rows whose file was not in the walk:
+                    # either a recent file that was skipped or a missing one
+                    report.stale_rows.append(image_id)
+
+        report.orphan_files = sorted(unreferenced)
+        report.elapsed = time.time() - started
+        return report
+
+    def sweep(self, report: GCReport) -> GCReport:
+        """Delete what mark() found, re-checking each batch against the database"""
+        started = time.time()
+
+        for i in range(0, len(report.orphan_files), self.batch_size):
+            batch = report.orphan_files[i:i + self.batch_size]
+            # An upload may have claimed the file since the mark phase
+            claimed = set(Image.objects.filter(path__in=batch).values_list('path', flat=True))
+            claimed.update(UploadSession.objects.filter(path__in=batch).values_list('path', flat=True))
+            for path in batch:
+                if path in claimed:
+                    continue
+                try:
+                    os.remove(os.path.join(self.media_root, path))
+                    report.files_deleted += 1
+                except FileNotFoundError:
+                    pass
+
+        for i in range(0, len(report.stale_rows), self.batch_size):
+            batch = report.stale_rows[i:i + self.batch_size]
+            with write_transaction():
+                rows = Image.objects.filter(id__in=batch).values_list('id', 'path')
+                missing = [
+                    image_id for image_id, path in rows
+                    if not os.path.exists(os.path.join(self.media_root, path))
+                ]
+                deleted, _ = Image.objects.filter(id__in=missing).delete()
+                report.rows_deleted += deleted
+
+        report.elapsed += time.time() - started
+        return report
+
+    def collect(self, delete: bool = False) -> GCReport:
+        """Run the mark phase and, when delete is set, the sweep phase"""
+        report = self.mark()
+        if delete:
+            self.sweep(report)
+        return report
@@ -0,0 +1,146 @@
+"""
+Query-count and latency budgets of the read endpoints, see inventory_app/budgets.py
+
+    python manage.py test inventory_app.tests.test_budgets
+    PERF_LATENCY=1 python manage.py test inventory_app.tests.test_budgets
+    PERF_BASELINE_UPDATE=1 python manage.py test inventory_app.tests.test_budgets
+"""
+import os
+import shutil
+import tempfile
+from typing import Dict
+from django.db import connection
+from django.test import Client, SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from inventory_app import views
+from inventory_app.benchmarks import timed
+from inventory_app.budgets import (
+    ENDPOINTS, LATENCY_SLACK_MS, LATENCY_TOLERANCE, environment, fetch, load_baseline, save_baseline, seed
+)
+
+
+def _flag(name: str) -> bool:
+    return os.getenv(name, '').lower() in ('1', 'true', 'yes')
+
+
+UPDATE = _flag('PERF_BASELINE_UPDATE')
+CHECK_LATENCY = _flag('PERF_LATENCY')
+
+BASELINE = load_baseline()
+# {name: {scale: {'queries', 'latency_ms'}}} measured by this run when updating
+_measured: Dict[str, Dict[str, Dict]] = {}
+_measured_environment = None
+
+
+def _expected() -> Dict[str, Dict[str, Dict]]:
+    """The baseline's endpoints, with this run's measurements applied when updating"""
+    endpoints = {name: {scale: dict(entry) for scale, entry in by_scale.items()}
+                 for name, by_scale in BASELINE.get('endpoints', {}).items()}
+    for name, by_scale in _measured.items():
+        for scale, entry in by_scale.items():
+            endpoints.setdefault(name, {}).setdefault(scale, {}).update(entry)
+    return endpoints
+
+
+def _growing(endpoints: Dict[str, Dict[str, Dict]]) -> Dict[str, Dict[str, int]]:
+    """Query counts by scale of the endpoints that must have one count but have several"""
+    growing = {}
+    for name, _, constant in ENDPOINTS:
+        counts = {scale: entry['queries'] for scale, entry in endpoints.get(name, {}).items() if 'queries' in entry}
+        if constant and len(set(counts.values())) > 1:
+            growing[name] = counts
+    return growing
+
+
+def tearDownModule():
+    # Never record an N+1 loop as the new budget (ConstantQueryCountTests reports it)
+    if UPDATE and _measured and not _growing(_expected()):
+        save_baseline({
+            # Latencies, and so the machine they were measured on, only change when they were measured
+            'environment': _measured_environment or BASELINE.get('environment'),
+            'endpoints': _expected(),
+        })
+
+
+class BudgetTests:
+    """Budgets of every endpoint at one scale; subclassed with TestCase per scale"""
+    scale: int
+
+    @classmethod
+    def setUpClass(cls):
+        # The views' archive was created with the configured path; keep its partitions out of the test
+        cls._archive_path = views.count_archive.path
+        views.count_archive.path = tempfile.mkdtemp(prefix='budget-archive-')
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(views.count_archive.path, ignore_errors=True)
+        views.count_archive.path = cls._archive_path
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ids = seed(cls.scale, views.count_archive)
+
+    def _paths(self):
+        for name, path, _ in ENDPOINTS:
+            yield name, path.format(**self.ids)
+
+    def _record(self, name: str, **values):
+        _measured.setdefault(name, {}).setdefault(str(self.scale), {}).update(values)
+
+    def test_query_counts(self):
+        client = Client()
+        for name, path in self._paths():
+            with self.subTest(endpoint=name):
+                fetch(client, path)  # warm up imports and per-process caches
+                if UPDATE:
+                    with CaptureQueriesContext(connection) as queries:
+                        self.assertEqual(fetch(client, path), 200)
+                    self._record(name, queries=len(queries))
+                    continue
+                expected = BASELINE.get('endpoints', {}).get(name, {}).get(str(self.scale))
+                if expected is None:
+                    self.fail(f'No baseline for {name} at {self.scale} products; record one with PERF_BASELINE_UPDATE=1')
+                with self.assertNumQueries(expected['queries']):
+                    status = fetch(client, path)
+                self.assertEqual(status, 200)
+
+    def test_latency(self):
+        global _measured_environment
+        if not (UPDATE or CHECK_LATENCY):
+            self.skipTest('set PERF_LATENCY=1 to check latencies')
+        if not UPDATE and BASELINE.get('environment') != environment():
+            self.skipTest(f"baseline recorded on {BASELINE.get('environment')}, this is {environment()}")
+        client = Client()
+        for name, path in self._paths():
+            with self.subTest(endpoint=name):
+                fetch(client, path)
+                latency_ms = round(timed(lambda: fetch(client, path)) * 1000, 2)
+                if UPDATE:
+                    self._record(name, latency_ms=latency_ms)
+                    _measured_environment = environment()
+                    continue
+                expected = BASELINE['endpoints'][name][str(self.scale)]['latency_ms']
+                self.assertLessEqual(latency_ms, expected * (1 + LATENCY_TOLERANCE) + LATENCY_SLACK_MS)
+
+
+class BudgetTests10(BudgetTests, TestCase):
+    scale = 10
+
+
+class BudgetTests100(BudgetTests, TestCase):
+    scale = 100
+
+
+class BudgetTests1000(BudgetTests, TestCase):
+    scale = 1000
+
+
+class ConstantQueryCountTests(SimpleTestCase):
+    """Runs after the TestCases, so an update is checked before it is written"""
+
+    def test_no_query_count_grows_with_the_data(self):
+        growing = _growing(_expected())
+        self.assertFalse(growing, f'query counts grow with the data (N+1?): {growing}')
@@ -0,0 +1,232 @@
+"""
+Intra-day count series: raw observations, hourly and daily rollups
+
+Every upload writes one CountObservation per detected product. A
+scheduled `python manage.py rollup_counts` folds complete hours of raw
+observations into HourlyCount, folds those hours into the existing
+DailyCount table and then drops rows that are past their retention:
+
+    raw observations   COUNT_RETENTION['raw'] days (default 14)
+    hourly rollups     COUNT_RETENTION['hourly'] days (default 180)
+    daily counts       kept
+
+Readers go through CountSeriesService.series(), which picks the coarsest
+table that still answers the requested window; daily points come from
+the hot DailyCount table and the monthly archive together.
+"""
+from datetime import datetime, timedelta
+from itertools import groupby
+from typing import Dict, Iterable, List, Optional, Tuple
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+from .models import CountObservation, HourlyCount, DailyCount
+from .database import write_transaction
+from .archive import DailyCountArchive, days_to_dates
+from .rollups import RollupService
+from .changes import next_change_seqs
+
+
+RESOLUTIONS = ('raw', 'hourly', 'daily')
+DEFAULT_RETENTION = {'raw': 14, 'hourly': 180}
+
+
+def floor_hour(moment: datetime) -> datetime:
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+class CountSeriesService:
+    """Service for writing, downsampling and reading the count series"""
+
+    def __init__(self, archive: Optional[DailyCountArchive] = None, batch_size: int = 5000):
+        self.batch_size = batch_size
+        self.retention = {**DEFAULT_RETENTION, **getattr(settings, 'COUNT_RETENTION', {})}
+        self.archive = archive or DailyCountArchive()
+        self.rollup_service = RollupService(archive=self.archive)
+
+    def record(self, image, product_counts: Dict[int, int], observed_at: datetime):
+        """Store one observation per product for an uploaded image"""
+        CountObservation.objects.bulk_create([
+            CountObservation(product_id=product_id, image=image, observed_at=observed_at, count=count)
+            for product_id, count in product_counts.items()
+        ])
+
+    def rolled_until(self) -> Optional[datetime]:
+        """End of the last hour already folded into HourlyCount"""
+        last_hour = HourlyCount.objects.aggregate(last=Max('hour'))['last']
+        return last_hour + timedelta(hours=1) if last_hour else None
+
+    def _hourly_buckets(self, rows: Iterable[Tuple[int, datetime, int]]) -> Iterable[HourlyCount]:
+        """Group (product_id, observed_at, count) rows, ordered by product then time, by hour"""
+        for (product_id, hour), group in groupby(rows, key=lambda r: (r[0], floor_hour(r[1]))):
+            counts = [count for _, _, count in group]
+            yield HourlyCount(
+                product_id=product_id,
+                hour=hour,
+                count=counts[-1],
+                min_count=min(counts),
+                max_count=max(counts),
+                observations=len(counts),
+            )
+
+    def rollup_hourly(self, since: Optional[datetime] = None, now: Optional[datetime] = None) -> int:
+        """Fold every complete hour from since (default: the watermark) into HourlyCount"""
+        now = now or timezone.now()
+        end = floor_hour(now)
+        start = since or self.rolled_until()
+        if start is None:
+            first = CountObservation.objects.order_by('observed_at').values_list('observed_at', flat=True).first()
+            if first is None:
+                return 0
+            start = first
+        start = floor_hour(start)
+        if start >= end:
+            return 0
+
+        rows = (
+            CountObservation.objects
+            .filter(observed_at__gte=start, observed_at__lt=end)
+            .order_by('product_id', 'observed_at')
+            .values_list('product_id', 'observed_at', 'count')
+            .iterator(chunk_size=self.batch_size)
+        )
+        written = 0
+        batch = []
+        for bucket in self._hourly_buckets(rows):
+            batch.append(bucket)
+            if len(batch) >= self.batch_size:
+                written += self._upsert_hourly(batch)
+                batch = []
+        if batch:
+            written += self._upsert_hourly(batch)
+
+        self.rollup_daily(start, end)
+        return written
+
+    def _upsert_hourly(self, rows: List[HourlyCount]) -> int:
+        with write_transaction():
+            HourlyCount.objects.bulk_create(
+                rows,
+                update_conflicts=True,
+                unique_fields=['product', 'hour'],
+                update_fields=['count', 'min_count', 'max_count', 'observations'],
+            )
+        return len(rows)
+
+    def rollup_daily(self, start: datetime, end: datetime) -> int:
+        """
+        Set DailyCount to the last hourly count of each day touched by [start, end).
+
+        Days whose DailyCount was written at or after end are left alone:
+        an upload in the still-open hour already stored a newer count.
+        """
+        last_by_day: Dict[Tuple[int, object], int] = {}
+        rows = (
+            HourlyCount.objects
+            .filter(hour__gte=start, hour__lt=end)
+            .order_by('hour')
+            .values_list('product_id', 'hour', 'count')
+            .iterator(chunk_size=self.batch_size)
+        )
+        for product_id, hour, count in rows:
+            last_by_day[(product_id, timezone.localdate(hour))] = count
+
+        if not last_by_day:
+            return 0
+        with write_transaction():
+            days = [day for _, day in last_by_day]
+            previous = {}
+            for product_id, day, count, updated_at in DailyCount.objects.filter(
+                product_id__in={product_id for product_id, _ in last_by_day},
+                date__gte=min(days), date__lte=max(days)
+            ).values_list('product_id', 'date', 'count', 'updated_at'):
+                if updated_at is not None and updated_at >= end:
+                    last_by_day.pop((product_id, day), None)
+                else:
+                    previous[(product_id, day)] = count
+            # Unchanged days need neither a write nor a change_seq for the sync feed
+            changed = {key: count for key, count in last_by_day.items() if previous.get(key) != count}
+            if not changed:
+                return 0
+
+            daily = [
+                DailyCount(product_id=product_id, date=day, count=count, change_seq=seq)
+                for ((product_id, day), count), seq in zip(changed.items(), next_change_seqs(len(changed)))
+            ]
+            DailyCount.objects.bulk_create(
+                daily,
+                batch_size=self.batch_size,
+                update_conflicts=True,
+                unique_fields=['product', 'date'],
+                update_fields=['count', 'change_seq', 'updated_at'],
+            )
+            self.rollup_service.apply(
+                (product_id, day, previous.get((product_id, day)), count)
+                for (product_id, day), count in changed.items()
+            )
+        return len(daily)
+
+    def apply_retention(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        """Delete raw and hourly rows older than their retention window"""
+        now = now or timezone.now()
+        raw_cutoff = now - timedelta(days=self.retention['raw'])
+        # Never drop raw rows that have not been rolled up yet
+        rolled = self.rolled_until()
+        raw_cutoff = min(raw_cutoff, rolled) if rolled else None
+        hourly_cutoff = now - timedelta(days=self.retention['hourly'])
+
+        deleted = {'raw': 0, 'hourly': 0}
+        with write_transaction():
+            if raw_cutoff is not None:
+                deleted['raw'], _ = CountObservation.objects.filter(observed_at__lt=raw_cutoff).delete()
+            deleted['hourly'], _ = HourlyCount.objects.filter(hour__lt=hourly_cutoff).delete()
+        return deleted
+
+    def choose_resolution(self, start: datetime, end: datetime, now: Optional[datetime] = None) -> str:
+        """Coarsest stored resolution that still has enough points for the window"""
+        now = now or timezone.now()
+        span = end - start
+        if span > timedelta(days=14) or start < now - timedelta(days=self.retention['hourly']):
+            return 'daily'
+        if span > timedelta(days=1) or start < now - timedelta(days=self.retention['raw']):
+            return 'hourly'
+        return 'raw'
+
+    def series(self, product_id: int, start: datetime, end: datetime, resolution: str = 'auto') -> Tuple[str, List[Dict]]:
+        """Return (resolution, points) for a product between start and end"""
+        if resolution == 'auto':
+            resolution = self.choose_resolution(start, end)
+
+        if resolution == 'raw':
+            rows = CountObservation.objects.filter(
+                product_id=product_id, observed_at__gte=start, observed_at__lte=end
+            ).order_by('observed_at').values_list('observed_at', 'count')
+            return resolution, [
+                {'time': t, 'count': c, 'min_count': c, 'max_count': c} for t, c in rows
+            ]
+
+        if resolution == 'hourly':
+            rolled = self.rolled_until() or start
+            points = [
+                {'time': t, 'count': c, 'min_count': lo, 'max_count': hi}
+                for t, c, lo, hi in HourlyCount.objects.filter(
+                    product_id=product_id, hour__gte=floor_hour(start), hour__lt=min(rolled, end)
+                ).order_by('hour').values_list('hour', 'count', 'min_count', 'max_count')
+            ]
+            # Hours after the watermark are not rolled up yet; bucket them on the fly
+            if rolled <= end:
+                tail = CountObservation.objects.filter(
+                    product_id=product_id, observed_at__gte=max(rolled, start), observed_at__lte=end
+                ).order_by('observed_at').values_list('product_id', 'observed_at', 'count')
+                points.extend(
+                    {'time': b.hour, 'count': b.count, 'min_count': b.min_count, 'max_count': b.max_count}
+                    for b in self._hourly_buckets(tail)
+                )
+            return resolution, points
+
+        # Closed months may have been moved to the archive
+        window = self.archive.read_window(start.date(), end.date(), [product_id])
+        return 'daily', [
+            {'time': d, 'count': c, 'min_count': c, 'max_count': c}
+            for d, c in zip(days_to_dates(window.day), window.count.tolist())
+        ]
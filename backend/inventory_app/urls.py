@@ -7,19 +7,43 @@ from . import views
 urlpatterns = [
     # Images
     path('images/upload', views.upload_image, name='upload_image'),
+    path('images/upload/batch', views.upload_batch, name='upload_batch'),
     path('images', views.get_images, name='get_images'),
+    path('images/<int:image_id>/detections', views.image_detections, name='image_detections'),
+    path('jobs/<str:job_id>', views.upload_job, name='upload_job'),
+    path('uploads', views.create_upload_session, name='create_upload_session'),
+    path('uploads/<str:upload_id>', views.upload_session, name='upload_session'),
+    path('uploads/<str:upload_id>/finalize', views.finalize_upload_session, name='finalize_upload_session'),
     
     # Products
     path('products', views.products, name='products'),
     path('products/<int:product_id>', views.delete_product, name='delete_product'),
     path('products/<int:product_id>/counts', views.product_counts, name='product_counts'),
+    path('products/<int:product_id>/series', views.product_series, name='product_series'),
+    path('counts/import', views.import_counts, name='import_counts'),
     
     # Analytics
     path('analytics/weekly', views.weekly_analytics, name='weekly_analytics'),
     path('analytics/daily', views.daily_summary, name='daily_summary'),
+    path('analytics/rollups/<str:grain>', views.rollups, name='rollups'),
+    
+    # Sync
+    path('sync', views.sync, name='sync'),
+    
+    # Live events
+    path('events', views.events, name='events'),
+    
+    # Export
+    path('export/<str:dataset>', views.export_data, name='export_data'),
     
     # Recommendations
     path('recommendations/weekly', views.weekly_recommendations, name='weekly_recommendations'),
+    
+    # Dashboard
+    path('dashboard/bootstrap', views.dashboard_bootstrap, name='dashboard_bootstrap'),
+
+    # Operations
+    path('admin/profile', views.profile_process, name='profile_process'),
 ]
 
 
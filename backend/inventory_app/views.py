@@ -1,24 +1,55 @@
 """
 Django REST API views
 """
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
 from rest_framework import status
 from django.utils import timezone
 from django.shortcuts import render, redirect
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET
+from django.http import HttpResponse, HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.urls import reverse
+from django.conf import settings
 # Authentication removed - no login required
 from django.utils import timezone as tz
+from django.utils.dateparse import parse_datetime
 from datetime import date, timedelta, datetime
+import asyncio
 import json
 from .models import Product, DailyCount, Image
 from .serializers import (
-    ProductSerializer, DailyCountSerializer, ImageSerializer,
+    ProductSerializer,
     ImageUploadResponseSerializer, WeeklyAnalyticsResponseSerializer,
     RecommendationsResponseSerializer
 )
 from .services import AnalyticsService, RecommendationService
 from .inference_service import InferenceService, StorageService
+from .ingest_service import IngestService, NoDetectionsError, UploadPipeline
+from .batch_upload import BatchError, BatchUploadService, iter_entries
+from .resumable import OffsetConflict, ResumableUploadError, ResumableUploadService
+from .jobs import UploadQueue
+from .idempotency import idempotent
+from .admission import AdmissionController, Rejected, request_deadline, request_priority
+from .timeseries import CountSeriesService, RESOLUTIONS
+from .archive import DailyCountArchive, days_to_dates
+from .rollups import RollupService, GRAINS
+from .export import ExportService, ExportError, FORMATS
+from .bulk_import import CountImporter, detect_format, FORMATS as IMPORT_FORMATS
+from .changes import ChangeFeed, DEFAULT_SYNC_LIMIT, MAX_SYNC_LIMIT, decode_since, encode_since
+from .database import replica_reads, write_transaction
+from .caching import conditional
+from .events import astream, broker, stream
+from .metrics import render_metrics
+from .profiling import FORMATS as PROFILE_FORMATS, ProfilerBusy, profile
+from .dashboard import DashboardService, SECTIONS, parse_known, section_etag
+from .renderers import PACKED_RENDERERS
+from .detections import detections_to_dicts, unpack_detections
+from .pagination import (
+    InvalidCursor, decode_cursor, encode_cursor, paginate_keyset, parse_page_size, set_pagination_headers
+)
 import os
 import tempfile
 import time
@@ -27,14 +58,42 @@ import time
 # Initialize services
 inference_service = InferenceService()
 storage_service = StorageService()
+ingest_service = IngestService()
+upload_pipeline = UploadPipeline(inference_service, storage_service, ingest_service)
+batch_upload_service = BatchUploadService(inference_service, storage_service, ingest_service)
+resumable_uploads = ResumableUploadService(storage_service, upload_pipeline)
+upload_queue = UploadQueue()
+admission = AdmissionController()
+count_archive = DailyCountArchive()
+series_service = CountSeriesService(archive=count_archive)
+rollup_service = RollupService(archive=count_archive)
+export_service = ExportService(archive=count_archive)
+change_feed = ChangeFeed()
 analytics_service = AnalyticsService()
 recommendation_service = RecommendationService()
+dashboard_service = DashboardService(count_archive, analytics_service, recommendation_service)
 
 
 @csrf_exempt
 @api_view(['POST'])
+@idempotent('upload_image')
 def upload_image(request):
-    """Upload a shelf image, run YOLO inference, and store results"""
+    """
+    Upload a shelf image, run YOLO inference, and store results.
+
+    With ?async=1, a Prefer: respond-async header or UPLOAD_ASYNC set, the
+    image is queued for the upload workers instead and the response is 202
+    with the job id; poll GET /jobs/<job_id> for the result.
+
+    Synchronous uploads go through admission control (admission.py): when
+    too many are in progress the response is 503 with Retry-After.
+    X-Priority (low, normal, high) orders waiting uploads and
+    X-Request-Timeout bounds how long one may wait.
+
+    Retries sending the same Idempotency-Key header get the first
+    attempt's response back instead of uploading again (idempotency.py).
+    """
+    received = time.monotonic()
     try:
         # Check if file is provided
         if 'file' not in request.FILES:
@@ -52,6 +111,17 @@ def upload_image(request):
                 'message': 'لطفاً یک فایل تصویر (JPG, PNG, GIF) ارسال کنید'
             }, status=status.HTTP_400_BAD_REQUEST)
         
+        if _wants_async(request):
+            job_id = upload_queue.enqueue(uploaded_file.chunks(), uploaded_file.name)
+            status_url = request.build_absolute_uri(reverse('upload_job', args=[job_id]))
+            response = Response({
+                'job_id': job_id,
+                'status': 'queued',
+                'status_url': status_url
+            }, status=status.HTTP_202_ACCEPTED)
+            response['Location'] = status_url
+            return response
+        
         # Save uploaded file temporarily
         tmp_path = None
         try:
@@ -60,64 +130,24 @@ def upload_image(request):
                     tmp_file.write(chunk)
                 tmp_path = tmp_file.name
             
-            # Run inference (IF/ELSE for two image types)
-            start_time = time.time()
-            detections = inference_service.run_inference(tmp_path)
-            processing_time = time.time() - start_time
-            
-            if not detections:
+            # Run inference, copy to storage, save image, detections and daily counts
+            try:
+                with admission.admit(request_priority(request), request_deadline(request, received)):
+                    result = upload_pipeline.run(tmp_path, uploaded_file.name)
+            except Rejected as e:
+                response = Response({
+                    'error': 'سرور در حال حاضر مشغول است',
+                    'message': str(e)
+                }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+                response['Retry-After'] = str(e.retry_after)
+                return response
+            except NoDetectionsError:
                 return Response({
                     'error': 'هیچ محصولی شناسایی نشد',
                     'message': 'لطفاً یک تصویر معتبر از قفسه ارسال کنید'
                 }, status=status.HTTP_400_BAD_REQUEST)
             
-            # Upload to storage
-            storage_path = storage_service.upload_file(tmp_path, uploaded_file.name)
-            
-            # Save image metadata
-            confidence_summary = str({d["product_name"]: d["confidence"] for d in detections}) if detections else ""
-            db_image = Image.objects.create(
-                date=timezone.now(),
-                path=storage_path,
-                confidence_summary=confidence_summary
-            )
-            
-            # Update daily counts
-            today = date.today()
-            detection_results = []
-            total_products = 0
-            
-            for detection in detections:
-                product_name = detection["product_name"]
-                count = detection["count"]
-                confidence = detection["confidence"]
-                
-                # Get or create product
-                product, _ = Product.objects.get_or_create(
-                    name=product_name,
-                    defaults={'category': None}
-                )
-                
-                # Update or create daily count
-                daily_count, _ = DailyCount.objects.update_or_create(
-                    product=product,
-                    date=today,
-                    defaults={'count': count}
-                )
-                
-                detection_results.append({
-                    'product_name': product_name,
-                    'count': count,
-                    'confidence': confidence
-                })
-                total_products += count
-            
-            return Response({
-                'image_id': db_image.id,
-                'detections': detection_results,
-                'total_products': total_products,
-                'processing_time': round(processing_time, 2)
-            }, status=status.HTTP_200_OK)
+            return Response(result, status=status.HTTP_200_OK)
         
         finally:
             # Clean up temporary file
@@ -139,20 +169,250 @@ def upload_image(request):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+def _wants_async(request) -> bool:
+    if request.GET.get('async') in ('1', 'true'):
+        return True
+    if 'respond-async' in request.META.get('HTTP_PREFER', ''):
+        return True
+    return getattr(settings, 'UPLOAD_ASYNC', False)
+
+
+@csrf_exempt
+@api_view(['POST'])
+@idempotent('upload_batch')
+def upload_batch(request):
+    """
+    Upload many shelf images at once: several files, a ZIP archive of
+    images, or both, under any form field names.
+
+    All images are analysed and their counts stored in one transaction.
+    The response lists the outcome of every image and a summary; images
+    that fail (not an image, no product detected) do not fail the others.
+    Goes through the same admission control as single uploads.
+    """
+    received = time.monotonic()
+    try:
+        files = [uploaded for name in request.FILES for uploaded in request.FILES.getlist(name)]
+        if not files:
+            return Response({
+                'error': 'فایل ارسال نشده است',
+                'message': 'لطفاً چند تصویر یا یک فایل ZIP انتخاب کنید'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            with admission.admit(request_priority(request), request_deadline(request, received)):
+                result = batch_upload_service.run(iter_entries(files))
+        except Rejected as e:
+            response = Response({
+                'error': 'سرور در حال حاضر مشغول است',
+                'message': str(e)
+            }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+            response['Retry-After'] = str(e.retry_after)
+            return response
+        except BatchError as e:
+            return Response({
+                'error': 'فایل‌های ارسالی نامعتبر است',
+                'message': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        if not result['summary']['succeeded']:
+            return Response({
+                'error': 'هیچ محصولی شناسایی نشد',
+                'message': 'هیچ‌یک از تصاویر پردازش نشد',
+                **result
+            }, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result, status=status.HTTP_200_OK)
+    
+    except Exception as e:
+        import traceback
+        print(f"=== BATCH UPLOAD ERROR ===")
+        print(f"Error: {str(e)}")
+        print(traceback.format_exc())
+        return Response({
+            'error': 'خطا در پردازش تصاویر',
+            'message': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+def _session_response(session, status_code=status.HTTP_200_OK, request=None):
+    data = {
+        'upload_id': session.id,
+        'filename': session.filename,
+        'offset': session.offset,
+        'length': session.length,
+        'status': session.status,
+        'expires_at': session.expires_at,
+    }
+    response = Response(data, status=status_code)
+    if request is not None:
+        response['Location'] = request.build_absolute_uri(reverse('upload_session', args=[session.id]))
+    response['Upload-Offset'] = str(session.offset)
+    response['Upload-Length'] = str(session.length)
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
+def _resumable_error(e: ResumableUploadError) -> Response:
+    response = Response({
+        'error': 'خطا در آپلود تکه‌ای',
+        'message': str(e)
+    }, status=e.status_code)
+    if isinstance(e, OffsetConflict):
+        response['Upload-Offset'] = str(e.offset)
+    return response
+
+
+@csrf_exempt
+@api_view(['POST'])
+def create_upload_session(request):
+    """
+    Start a resumable upload (resumable.py).
+
+    Body: filename, length (bytes) and optionally the sha256 of the whole
+    file, checked on finalize. Returns 201 with the upload URL.
+    """
+    try:
+        try:
+            length = int(request.data.get('length'))
+        except (TypeError, ValueError):
+            return Response({
+                'error': 'طول فایل نامعتبر است',
+                'message': 'length must be the file size in bytes'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        session = resumable_uploads.create(
+            request.data.get('filename', ''), length, request.data.get('sha256', '')
+        )
+        return _session_response(session, status.HTTP_201_CREATED, request)
+    except ResumableUploadError as e:
+        return _resumable_error(e)
+    except Exception as e:
+        import traceback
+        print(f"=== UPLOAD SESSION ERROR ===")
+        print(f"Error: {str(e)}")
+        print(traceback.format_exc())
+        return Response({
+            'error': 'خطا در ایجاد آپلود',
+            'message': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@csrf_exempt
+@api_view(['GET', 'HEAD', 'PATCH', 'DELETE'])
+def upload_session(request, upload_id):
+    """
+    GET/HEAD: offset received so far (also in the Upload-Offset header).
+    PATCH: append the raw request body at the Upload-Offset header, which
+    must equal the current offset (409 with the right offset otherwise).
+    DELETE: cancel the upload.
+    """
+    try:
+        if request.method in ('GET', 'HEAD'):
+            return _session_response(resumable_uploads.get(upload_id))
+        if request.method == 'DELETE':
+            resumable_uploads.cancel(upload_id)
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        
+        try:
+            offset = int(request.META['HTTP_UPLOAD_OFFSET'])
+            content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except (KeyError, ValueError):
+            return Response({
+                'error': 'هدر Upload-Offset نامعتبر است',
+                'message': 'Send the byte offset of the chunk in the Upload-Offset header'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        # Read the raw body as a stream; request.data would buffer and parse it
+        session = resumable_uploads.append(upload_id, offset, request._request, content_length)
+        return _session_response(session)
+    except ResumableUploadError as e:
+        return _resumable_error(e)
+    except Exception as e:
+        import traceback
+        print(f"=== UPLOAD SESSION ERROR ===")
+        print(f"Error: {str(e)}")
+        print(traceback.format_exc())
+        return Response({
+            'error': 'خطا در آپلود تکه‌ای',
+            'message': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@csrf_exempt
+@api_view(['POST'])
+def finalize_upload_session(request, upload_id):
+    """
+    Run inference on a completely received resumable upload and store the
+    results; the response is the one of images/upload plus the file's
+    sha256. Finalizing again returns the same response.
+    """
+    received = time.monotonic()
+    try:
+        try:
+            with admission.admit(request_priority(request), request_deadline(request, received)):
+                result = resumable_uploads.finalize(upload_id)
+        except Rejected as e:
+            response = Response({
+                'error': 'سرور در حال حاضر مشغول است',
+                'message': str(e)
+            }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+            response['Retry-After'] = str(e.retry_after)
+            return response
+        except NoDetectionsError:
+            return Response({
+                'error': 'هیچ محصولی شناسایی نشد',
+                'message': 'لطفاً یک تصویر معتبر از قفسه ارسال کنید'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result, status=status.HTTP_200_OK)
+    except ResumableUploadError as e:
+        return _resumable_error(e)
+    except Exception as e:
+        import traceback
+        print(f"=== UPLOAD FINALIZE ERROR ===")
+        print(f"Error: {str(e)}")
+        print(traceback.format_exc())
+        return Response({
+            'error': 'خطا در پردازش تصویر',
+            'message': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
 @api_view(['GET'])
-def get_images(request):
-    """Get recent images"""
+def upload_job(request, job_id):
+    """Progress and, once done, the result of an async upload"""
     try:
-        limit = int(request.GET.get('limit', 10))
-        if limit < 1 or limit > 100:
-            limit = 10
-    except (ValueError, TypeError):
-        limit = 10
+        job = upload_queue.get(job_id)
+        if job is None:
+            return Response({'error': 'Job not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(job)
+    except Exception as e:
+        import traceback
+        print(f"=== UPLOAD JOB ERROR ===")
+        print(f"Error: {str(e)}")
+        print(traceback.format_exc())
+        return Response({
+            'error': 'خطا در دریافت وضعیت پردازش',
+            'message': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['GET'])
+@renderer_classes(PACKED_RENDERERS)
+@conditional()
+def get_images(request):
+    """Get recent images, newest first, one keyset page at a time"""
+    limit = parse_page_size(request.GET.get('limit'), default=10)
     
     try:
-        images = Image.objects.all().order_by('-date')[:limit]
-        serializer = ImageSerializer(images, many=True)
-        return Response(serializer.data)
+        # Plain dicts from values() render several times faster than
+        # ImageSerializer output and produce the same JSON
+        images, next_cursor = paginate_keyset(
+            Image.objects.values('id', 'date', 'path', 'confidence_summary', 'uploaded_at'),
+            keys=[('date', True), ('id', True)],
+            cursor=request.GET.get('cursor'),
+            limit=limit
+        )
+        return set_pagination_headers(Response(images), request, next_cursor)
+    except InvalidCursor as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         import traceback
         print(f"=== GET IMAGES ERROR ===")
@@ -164,15 +424,49 @@ def get_images(request):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@api_view(['GET'])
+@conditional(max_age=300)
+def image_detections(request, image_id):
+    """Get every stored detection (product, bbox, confidence) of an image"""
+    try:
+        row = Image.objects.filter(id=image_id).values('detections').first()
+        if row is None:
+            return Response({'error': 'Image not found'}, status=status.HTTP_404_NOT_FOUND)
+        
+        array = unpack_detections(row['detections'])
+        return Response({
+            'image_id': image_id,
+            'total_detections': len(array),
+            'detections': detections_to_dicts(array)
+        })
+    except Exception as e:
+        import traceback
+        print(f"=== IMAGE DETECTIONS ERROR ===")
+        print(f"Error: {str(e)}")
+        print(traceback.format_exc())
+        return Response({
+            'error': 'خطا در دریافت تشخیص‌ها',
+            'message': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
 @csrf_exempt
 @api_view(['GET', 'POST'])
+@renderer_classes(PACKED_RENDERERS)
+@conditional()
 def products(request):
     """Get all products or create a new product"""
     if request.method == 'GET':
         try:
-            products = Product.objects.all().order_by('-id')
-            serializer = ProductSerializer(products, many=True)
-            return Response(serializer.data)
+            products, next_cursor = paginate_keyset(
+                Product.objects.values('id', 'name', 'category'),
+                keys=[('id', True)],
+                cursor=request.GET.get('cursor'),
+                limit=parse_page_size(request.GET.get('limit'))
+            )
+            return set_pagination_headers(Response(products), request, next_cursor)
+        except InvalidCursor as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response({
                 'error': 'خطا در دریافت محصولات',
@@ -244,12 +538,47 @@ def products(request):
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@csrf_exempt
+@api_view(['POST'])
+def import_counts(request):
+    """Bulk import daily counts from an uploaded CSV or NDJSON file"""
+    if 'file' not in request.FILES:
+        return Response({
+            'error': 'فایل ارسال نشده است',
+            'message': 'لطفاً یک فایل CSV یا NDJSON انتخاب کنید'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    uploaded_file = request.FILES['file']
+    fmt = request.data.get('input_format') or detect_format(uploaded_file.name)
+    if fmt not in IMPORT_FORMATS:
+        return Response({
+            'error': 'فرمت فایل نامعتبر است',
+            'message': 'فایل باید CSV یا NDJSON باشد (یا input_format را مشخص کنید)'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        report = CountImporter().import_file(uploaded_file.file, fmt)
+        return Response(report.as_dict())
+    except Exception as e:
+        import traceback
+        print(f"=== IMPORT COUNTS ERROR ===")
+        print(f"Error: {str(e)}")
+        print(traceback.format_exc())
+        return Response({
+            'error': 'خطا در وارد کردن داده‌ها',
+            'message': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
 @api_view(['DELETE'])
 def delete_product(request, product_id):
     """Delete a product"""
     try:
         product = Product.objects.get(id=product_id)
-        product.delete()
+        with write_transaction():
+            rollup_service.remove_product(product.id)
+            product.delete()
+            # Last, so a failure rolls the delete back instead of leaving archived rows behind
+            count_archive.purge_product(product_id)
         return Response({'message': 'Product deleted successfully'}, status=status.HTTP_200_OK)
     except Product.DoesNotExist:
         return Response({'error': 'Product not found'}, status=status.HTTP_404_NOT_FOUND)
@@ -265,6 +594,8 @@ def delete_product(request, product_id):
 
 
 @api_view(['GET'])
+@renderer_classes(PACKED_RENDERERS)
+@conditional()
 def product_counts(request, product_id):
     """Get daily counts for a specific product"""
     try:
@@ -276,18 +607,52 @@ def product_counts(request, product_id):
     
     try:
         start_date = date.today() - timedelta(days=days)
+        cursor = request.GET.get('cursor')
+        limit = parse_page_size(request.GET.get('limit'), default=366)
         
-        counts = DailyCount.objects.filter(
+        # (product_id, date) is unique, so date alone is a total order here
+        # and every page is a range scan on the unique index
+        hot = DailyCount.objects.filter(
             product_id=product_id,
             date__gte=start_date
         ).order_by('date')
+        cold_from = start_date
+        if cursor:
+            try:
+                after = date.fromisoformat(decode_cursor(cursor, 1)[0])
+            except (TypeError, ValueError) as e:
+                raise InvalidCursor('Invalid cursor') from e
+            hot = hot.filter(date__gt=after)
+            cold_from = max(start_date, after + timedelta(days=1))
         
-        if not counts.exists():
+        # Months moved to the archive are merged in by date; hot rows win.
+        # Rows are built from values_list() rather than DailyCountSerializer,
+        # with the nested product fetched once
+        rows = {}
+        _, cold_days, cold_counts = count_archive.read_cold(cold_from, date.today(), [product_id])
+        for day, count in zip(days_to_dates(cold_days[:limit + 1]), cold_counts[:limit + 1].tolist()):
+            rows[day] = (None, count)
+        for row_id, day, count in hot.values_list('id', 'date', 'count')[:limit + 1]:
+            rows[day] = (row_id, count)
+        
+        product = None
+        if rows:
+            product = Product.objects.filter(id=product_id).values('id', 'name', 'category').first()
+        page = [
+            {'id': rows[day][0], 'product': product, 'date': day, 'count': rows[day][1]}
+            for day in sorted(rows)
+        ]
+        if not page and not cursor:
             return Response({'error': 'Product not found or no counts available'}, 
                            status=status.HTTP_404_NOT_FOUND)
         
-        serializer = DailyCountSerializer(counts, many=True)
-        return Response(serializer.data)
+        next_cursor = None
+        if len(page) > limit:
+            page = page[:limit]
+            next_cursor = encode_cursor([page[-1]['date']])
+        return set_pagination_headers(Response(page), request, next_cursor)
+    except InvalidCursor as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         import traceback
         print(f"=== PRODUCT COUNTS ERROR ===")
@@ -300,6 +665,52 @@ def product_counts(request, product_id):
 
 
 @api_view(['GET'])
+@replica_reads(max_lag=60)
+@conditional()
+def product_series(request, product_id):
+    """Get the intra-day count series of a product at the coarsest sufficient resolution"""
+    resolution = request.GET.get('resolution', 'auto')
+    if resolution != 'auto' and resolution not in RESOLUTIONS:
+        return Response(
+            {'error': f"Invalid resolution. Use auto, {', '.join(RESOLUTIONS)}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    end = parse_datetime(request.GET['end']) if request.GET.get('end') else tz.now()
+    start = parse_datetime(request.GET['start']) if request.GET.get('start') else end - timedelta(days=1)
+    if start is None or end is None:
+        return Response(
+            {'error': 'Invalid datetime format. Use ISO 8601, e.g. 2026-01-01T08:00:00+00:00'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if tz.is_naive(start):
+        start = tz.make_aware(start)
+    if tz.is_naive(end):
+        end = tz.make_aware(end)
+    
+    try:
+        resolution, points = series_service.series(product_id, start, end, resolution)
+        return Response({
+            'product_id': product_id,
+            'start': start,
+            'end': end,
+            'resolution': resolution,
+            'points': points
+        })
+    except Exception as e:
+        import traceback
+        print(f"=== PRODUCT SERIES ERROR ===")
+        print(f"Error: {str(e)}")
+        print(traceback.format_exc())
+        return Response({
+            'error': 'خطا در دریافت سری زمانی',
+            'message': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['GET'])
+@replica_reads(max_lag=300)
+@conditional(max_age=60)
 def weekly_analytics(request):
     """Get weekly analytics for all products"""
     try:
@@ -313,20 +724,19 @@ def weekly_analytics(request):
         end_date = date.today()
         start_date = end_date - timedelta(days=days - 1)
         
-        products = Product.objects.all()
+        # One pass over the window (hot table plus archived months)
+        series = {
+            product_id: (dates_list, count_values)
+            for product_id, dates_list, count_values
+            in count_archive.read_window(start_date, end_date).by_product()
+        }
+        products = Product.objects.filter(id__in=list(series)).only('id', 'name')
         summaries = []
         
         for product in products:
-            counts = DailyCount.objects.filter(
-                product=product,
-                date__gte=start_date,
-                date__lte=end_date
-            ).order_by('date')
+            dates_list, count_values = series[product.id]
             
-            if counts.count() >= 2:
-                count_values = [c.count for c in counts]
-                dates_list = [c.date for c in counts]
-                
+            if len(count_values) >= 2:
                 summary = analytics_service.calculate_product_analytics(
                     product_id=product.id,
                     product_name=product.name,
@@ -352,6 +762,8 @@ def weekly_analytics(request):
 
 
 @api_view(['GET'])
+@replica_reads(max_lag=60)
+@conditional(max_age=60)
 def daily_summary(request):
     """Get daily summary for a specific date"""
     try:
@@ -367,19 +779,24 @@ def daily_summary(request):
         else:
             target_date = date.today()
         
-        counts = DailyCount.objects.filter(date=target_date)
+        window = count_archive.read_window(target_date, target_date)
+        product_ids = window.product.tolist()
+        counts = window.count.tolist()
+        names = dict(Product.objects.filter(id__in=product_ids).values_list('id', 'name'))
         
         return Response({
             'date': target_date,
-            'total_products': counts.count(),
-            'total_items': sum(c.count for c in counts),
+            'total_products': len(counts),
+            'total_items': sum(counts),
             'products': [
                 {
-                    'product_id': c.product_id,
-                    'product_name': c.product.name,
-                    'count': c.count
+                    'product_id': product_id,
+                    'product_name': names.get(product_id),
+                    'count': count
                 }
-                for c in counts
+                for product_id, count in sorted(
+                    zip(product_ids, counts), key=lambda item: names.get(item[0]) or ''
+                )
             ]
         })
     except Exception as e:
@@ -394,6 +811,9 @@ def daily_summary(request):
 
 
 @api_view(['GET'])
+@renderer_classes(PACKED_RENDERERS)
+@replica_reads(max_lag=300)
+@conditional(max_age=60)
 def weekly_recommendations(request):
     """Get weekly investment and restocking recommendations"""
     try:
@@ -407,20 +827,19 @@ def weekly_recommendations(request):
         end_date = date.today()
         start_date = end_date - timedelta(days=days - 1)
         
-        products = Product.objects.all()
+        # One pass over the window (hot table plus archived months)
+        series = {
+            product_id: (dates_list, count_values)
+            for product_id, dates_list, count_values
+            in count_archive.read_window(start_date, end_date).by_product()
+        }
+        products = Product.objects.filter(id__in=list(series))
         product_data = []
         
         for product in products:
-            counts = DailyCount.objects.filter(
-                product=product,
-                date__gte=start_date,
-                date__lte=end_date
-            ).order_by('date')
+            dates_list, count_values = series[product.id]
             
-            if counts.count() >= 3:
-                count_values = [c.count for c in counts]
-                dates_list = [c.date for c in counts]
-                
+            if len(count_values) >= 3:
                 product_data.append({
                     'product': product,
                     'counts': count_values,
@@ -450,6 +869,241 @@ def weekly_recommendations(request):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@api_view(['GET'])
+@renderer_classes(PACKED_RENDERERS)
+@replica_reads(max_lag=60)
+@conditional()
+def dashboard_bootstrap(request):
+    """
+    Products, today's summary, weekly analytics, weekly recommendations
+    and recent images in one response (dashboard.py), each section with
+    its own ETag. Sections whose ETag is listed in ?known=name:etag,...
+    are sent as {"etag": ..., "not_modified": true}.
+    """
+    try:
+        days = int(request.GET.get('days', 7))
+        if days < 1 or days > 365:
+            days = 7
+    except (ValueError, TypeError):
+        days = 7
+    images = parse_page_size(request.GET.get('images'), default=50)
+    
+    try:
+        sections = dashboard_service.bootstrap(days=days, images=images)
+        known = parse_known(request.GET.get('known'))
+        payload = {}
+        for name in SECTIONS:
+            etag = section_etag(sections[name])
+            if known.get(name) == etag:
+                payload[name] = {'etag': etag, 'not_modified': True}
+            else:
+                payload[name] = {'etag': etag, 'data': sections[name]}
+        return Response({
+            'generated_at': timezone.now(),
+            'sections': payload
+        })
+    except Exception as e:
+        import traceback
+        print(f"=== DASHBOARD BOOTSTRAP ERROR ===")
+        print(f"Error: {str(e)}")
+        print(traceback.format_exc())
+        return Response({
+            'error': 'خطا در بارگذاری داشبورد',
+            'message': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['GET'])
+@replica_reads(max_lag=300)
+@conditional(max_age=60)
+def rollups(request, grain):
+    """Pre-aggregated count totals by category and day or week, or by product and month"""
+    if grain not in GRAINS:
+        return Response(
+            {'error': f'Unknown grain. Use one of: {", ".join(GRAINS)}'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    default_days = {'category-day': 30, 'category-week': 84, 'product-month': 365}[grain]
+    try:
+        end_date = datetime.strptime(request.GET['end'], '%Y-%m-%d').date() if request.GET.get('end') else date.today()
+        start_date = (
+            datetime.strptime(request.GET['start'], '%Y-%m-%d').date() if request.GET.get('start')
+            else end_date - timedelta(days=default_days - 1)
+        )
+        product_id = int(request.GET['product_id']) if request.GET.get('product_id') else None
+    except ValueError:
+        return Response(
+            {'error': 'Invalid parameters. Use YYYY-MM-DD dates and an integer product_id'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    try:
+        rows = rollup_service.query(
+            grain, start_date, end_date,
+            category=request.GET.get('category'),
+            product_id=product_id
+        )
+        return Response({
+            'grain': grain,
+            'start': start_date,
+            'end': end_date,
+            'rows': rows
+        })
+    except Exception as e:
+        import traceback
+        print(f"=== ROLLUPS ERROR ===")
+        print(f"Error: {str(e)}")
+        print(traceback.format_exc())
+        return Response({
+            'error': 'خطا در دریافت گزارش تجمیعی',
+            'message': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+async def events(request):
+    """
+    Server-Sent Events stream of 'detection' and 'counts' events published
+    by uploads (events.py). Resumes after the Last-Event-ID header (or
+    ?last_event_id=) when the client reconnects.
+    """
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    try:
+        last_event_id = int(request.META.get('HTTP_LAST_EVENT_ID') or request.GET.get('last_event_id'))
+    except (TypeError, ValueError):
+        last_event_id = None
+    
+    if isinstance(request, ASGIRequest):
+        subscriber = broker.subscribe(last_event_id, asyncio.get_running_loop())
+        content = astream(subscriber) if subscriber else None
+    else:
+        subscriber = broker.subscribe(last_event_id)
+        content = stream(subscriber) if subscriber else None
+    if content is None:
+        response = JsonResponse({
+            'error': 'سرور در حال حاضر مشغول است',
+            'message': 'Too many event subscribers'
+        }, status=503)
+        response['Retry-After'] = '30'
+        return response
+    
+    response = StreamingHttpResponse(content, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # no proxy buffering (nginx)
+    return response
+
+
+@api_view(['GET'])
+def sync(request):
+    """Rows created, updated or deleted since the client's cursor"""
+    try:
+        since = decode_since(request.GET.get('since'))
+    except InvalidCursor as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        limit = int(request.GET.get('limit', DEFAULT_SYNC_LIMIT))
+    except (ValueError, TypeError):
+        limit = DEFAULT_SYNC_LIMIT
+    limit = min(max(limit, 1), MAX_SYNC_LIMIT)
+
+    try:
+        changes, last_seq, has_more = change_feed.changes(since, limit)
+        return Response({
+            'cursor': encode_since(last_seq),
+            'has_more': has_more,
+            **changes
+        })
+    except Exception as e:
+        import traceback
+        print(f"=== SYNC ERROR ===")
+        print(f"Error: {str(e)}")
+        print(traceback.format_exc())
+        return Response({
+            'error': 'خطا در همگام‌سازی',
+            'message': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@require_GET
+def export_data(request, dataset):
+    """Stream a dataset as CSV, NDJSON or Parquet (plain view: DRF reserves ?format=)"""
+    fmt = request.GET.get('format', 'csv')
+    grain = request.GET.get('grain', 'category-day')
+    try:
+        export_service.validate(dataset, fmt, grain)
+        start_date = datetime.strptime(request.GET['start'], '%Y-%m-%d').date() if request.GET.get('start') else None
+        end_date = datetime.strptime(request.GET['end'], '%Y-%m-%d').date() if request.GET.get('end') else None
+        product_ids = (
+            [int(value) for value in request.GET['product_id'].split(',')]
+            if request.GET.get('product_id') else None
+        )
+    except ExportError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except ValueError:
+        return JsonResponse(
+            {'error': 'Invalid parameters. Use YYYY-MM-DD dates and comma-separated integer product_id values'},
+            status=400
+        )
+
+    response = StreamingHttpResponse(
+        export_service.stream(dataset, fmt, start_date, end_date, product_ids, grain),
+        content_type=FORMATS[fmt]
+    )
+    filename = export_service.filename(dataset, fmt, start_date, end_date, grain)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+@require_GET
+def metrics(request):
+    """Request, SQL and stage histograms of this process in the Prometheus text format (metrics.py)"""
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def profile_process(request):
+    """
+    Sample the stacks of this server process for ?seconds= (at most
+    PROFILER_MAX_SECONDS) every ?interval= milliseconds and return the
+    profile as collapsed stacks or, with ?output=speedscope, speedscope
+    JSON (profiling.py). Staff users only; waiting threads are left out
+    unless ?idle=1.
+    """
+    max_seconds = getattr(settings, 'PROFILER_MAX_SECONDS', 60)
+    # ?format= is taken by DRF's renderer selection
+    output_format = request.GET.get('output', 'collapsed')
+    try:
+        seconds = float(request.GET.get('seconds', 10))
+        interval = float(request.GET.get('interval', 5)) / 1000
+    except (ValueError, TypeError):
+        seconds, interval = -1, -1
+    if not 0 < seconds <= max_seconds or not 0.001 <= interval <= 1 or output_format not in PROFILE_FORMATS:
+        return Response({
+            'error': 'پارامترهای پروفایل نامعتبر است',
+            'message': f'seconds: 0-{max_seconds}, interval: 1-1000 ms, output: {", ".join(PROFILE_FORMATS)}'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        result = profile(seconds, interval, include_idle=request.GET.get('idle') == '1')
+    except ProfilerBusy as e:
+        return Response({
+            'error': 'پروفایل دیگری در حال اجراست',
+            'message': str(e)
+        }, status=status.HTTP_409_CONFLICT)
+    
+    pid = os.getpid()
+    if output_format == 'speedscope':
+        response = HttpResponse(result.render(output_format, name=f'pid {pid}'), content_type='application/json')
+        response['Content-Disposition'] = f'attachment; filename="profile-{pid}.json"'
+    else:
+        response = HttpResponse(result.render(output_format), content_type='text/plain; charset=utf-8')
+    response['X-Profile-Pid'] = str(pid)
+    response['X-Profile-Samples'] = str(result.samples)
+    response['X-Profile-Overhead'] = f'{result.overhead:.4f}'
+    return response
+
+
 def home(request):
     """Home page view - redirect to dashboard"""
     return redirect('dashboard')
@@ -3,6 +3,7 @@ Django settings for inventory_project project.
 """
 import os
 from pathlib import Path
+from corsheaders.defaults import default_headers
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -29,7 +30,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so it times the whole request (inventory_app/metrics.py)
+    'inventory_app.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'inventory_app.compression.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -37,6 +41,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'inventory_app.database.ReadYourWritesMiddleware',
 ]
 
 ROOT_URLCONF = 'inventory_project.urls'
@@ -60,12 +65,48 @@ TEMPLATES = [
 WSGI_APPLICATION = 'inventory_project.wsgi.application'
 
 # Database
+# DB_PROFILE=sqlite-production enables WAL, persistent connections and the
+# writer lock; see inventory_app/database.py
+DB_PROFILE = os.getenv('DB_PROFILE', 'default')
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
     }
 }
+DB_WRITER_LOCK = False
+
+# Applied in order on every new connection of the sqlite-production profile
+SQLITE_PRODUCTION_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 10000,       # ms
+    "cache_size": -64000,        # negative = KiB, so 64 MB
+    "mmap_size": 268435456,      # 256 MB
+    "temp_store": "MEMORY",
+}
+
+if DB_PROFILE == 'sqlite-production':
+    DATABASES["default"].update({
+        "CONN_MAX_AGE": int(os.getenv('DB_CONN_MAX_AGE', 600)),
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {"timeout": 10},
+        "PRAGMAS": SQLITE_PRODUCTION_PRAGMAS,
+    })
+    DB_WRITER_LOCK = True
+
+# Optional read replica for analytics traffic; with SQLite it is a copy of
+# the primary kept in sync by `manage.py replicate_db`
+DB_REPLICA_NAME = os.getenv('DB_REPLICA_NAME')
+if DB_REPLICA_NAME:
+    DATABASES["replica"] = {
+        **DATABASES["default"],
+        "NAME": DB_REPLICA_NAME,
+        "TEST": {"MIRROR": "default"},
+    }
+
+DATABASE_ROUTERS = ['inventory_app.database.PrimaryReplicaRouter']
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -106,7 +147,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'inventory_app.renderers.FastJSONRenderer',
     ],
     'DEFAULT_PARSER_CLASSES': [
         'rest_framework.parsers.JSONParser',
@@ -121,12 +162,74 @@ CORS_ALLOWED_ORIGINS = [
     "http://localhost:8000",
     "http://127.0.0.1:8000",
 ]
+# Pagination cursors travel in response headers
+CORS_EXPOSE_HEADERS = ['X-Next-Cursor', 'Link', 'Retry-After', 'Idempotent-Replayed', 'Location', 'Upload-Offset', 'Upload-Length']
+# Upload priority and deadline (inventory_app/admission.py), retry key (inventory_app/idempotency.py)
+# and chunk offset (inventory_app/resumable.py)
+CORS_ALLOW_HEADERS = [*default_headers, 'x-priority', 'x-request-timeout', 'idempotency-key', 'upload-offset']
 
 # Storage settings
 STORAGE_TYPE = os.getenv('STORAGE_TYPE', 'local')
 LOCAL_STORAGE_PATH = os.getenv('LOCAL_STORAGE_PATH', os.path.join(BASE_DIR, 'storage', 'images'))
 MODEL_PATH = os.getenv('MODEL_PATH', os.path.join(BASE_DIR, 'models', 'yolov8_inventory.onnx'))
 
+# Retention (days) of the intra-day count series, see inventory_app/timeseries.py
+COUNT_RETENTION = {
+    'raw': int(os.getenv('COUNT_RETENTION_RAW_DAYS', 14)),
+    'hourly': int(os.getenv('COUNT_RETENTION_HOURLY_DAYS', 180)),
+}
+
+# Closed months of daily counts are moved here by `manage.py archive_counts`
+COUNT_ARCHIVE_PATH = os.getenv('COUNT_ARCHIVE_PATH', os.path.join(BASE_DIR, 'archive', 'daily_counts'))
+COUNT_ARCHIVE_HOT_MONTHS = int(os.getenv('COUNT_ARCHIVE_HOT_MONTHS', 3))
+
+# Async uploads (?async=1 or UPLOAD_ASYNC=1), see inventory_app/jobs.py
+UPLOAD_ASYNC = os.getenv('UPLOAD_ASYNC', '0') == '1'
+UPLOAD_QUEUE_PATH = os.getenv('UPLOAD_QUEUE_PATH', os.path.join(BASE_DIR, 'queue', 'uploads.sqlite3'))
+UPLOAD_SPOOL_PATH = os.getenv('UPLOAD_SPOOL_PATH', os.path.join(BASE_DIR, 'queue', 'spool'))
+UPLOAD_VISIBILITY_TIMEOUT = int(os.getenv('UPLOAD_VISIBILITY_TIMEOUT', 300))
+UPLOAD_MAX_ATTEMPTS = int(os.getenv('UPLOAD_MAX_ATTEMPTS', 3))
+
+# Admission control of synchronous uploads, see inventory_app/admission.py
+UPLOAD_MAX_IN_FLIGHT = int(os.getenv('UPLOAD_MAX_IN_FLIGHT', os.cpu_count() or 2))
+UPLOAD_MAX_QUEUE = int(os.getenv('UPLOAD_MAX_QUEUE', 2 * (os.cpu_count() or 2)))
+UPLOAD_DEADLINE = float(os.getenv('UPLOAD_DEADLINE', 30))
+
+# Batch uploads (images/upload/batch), see inventory_app/batch_upload.py
+BATCH_UPLOAD_MAX_FILES = int(os.getenv('BATCH_UPLOAD_MAX_FILES', 100))
+BATCH_UPLOAD_MAX_FILE_SIZE = int(os.getenv('BATCH_UPLOAD_MAX_FILE_SIZE', 20 * 1024 * 1024))
+BATCH_UPLOAD_SIZE = int(os.getenv('BATCH_UPLOAD_SIZE', 8))
+
+# Resumable chunked uploads (uploads/...), see inventory_app/resumable.py
+RESUMABLE_UPLOAD_EXPIRY = int(os.getenv('RESUMABLE_UPLOAD_EXPIRY', 24 * 3600))
+RESUMABLE_UPLOAD_MAX_LENGTH = int(os.getenv('RESUMABLE_UPLOAD_MAX_LENGTH', 200 * 1024 * 1024))
+RESUMABLE_UPLOAD_LOCK = int(os.getenv('RESUMABLE_UPLOAD_LOCK', 600))
+
+# Live event stream (events), see inventory_app/events.py
+SSE_QUEUE_SIZE = int(os.getenv('SSE_QUEUE_SIZE', 100))
+SSE_HISTORY = int(os.getenv('SSE_HISTORY', 256))
+SSE_MAX_SUBSCRIBERS = int(os.getenv('SSE_MAX_SUBSCRIBERS', 10000))
+SSE_HEARTBEAT = float(os.getenv('SSE_HEARTBEAT', 15))
+SSE_MAX_AGE = float(os.getenv('SSE_MAX_AGE', 600))
+
+# Per-request timing breakdown in a Server-Timing response header, see inventory_app/metrics.py
+SERVER_TIMING = os.getenv('SERVER_TIMING', str(DEBUG)).lower() in ('1', 'true', 'yes')
+
+# On-demand sampling profiler, see inventory_app/profiling.py
+PROFILER_MAX_SECONDS = float(os.getenv('PROFILER_MAX_SECONDS', 60))
+PROFILER_DIR = os.getenv('PROFILER_DIR', os.path.join(BASE_DIR, 'profiles'))
+
+# Recorded query counts and latencies of the read endpoints, see inventory_app/budgets.py
+PERF_BASELINE_PATH = os.getenv('PERF_BASELINE_PATH', os.path.join(BASE_DIR, 'perf_baseline.json'))
+
+# Idempotency-Key handling of uploads, see inventory_app/idempotency.py
+IDEMPOTENCY_TTL = int(os.getenv('IDEMPOTENCY_TTL', 24 * 3600))
+IDEMPOTENCY_LOCK = int(os.getenv('IDEMPOTENCY_LOCK', 120))
+IDEMPOTENCY_WAIT = float(os.getenv('IDEMPOTENCY_WAIT', 30))
+
+# Responses smaller than this are not compressed, see inventory_app/compression.py
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', 1024))
+
 # Email settings (for password reset)
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'  # For development
 # For production, use SMTP:
@@ -10,6 +10,8 @@ from inventory_app import views
 urlpatterns = [
     path('', views.home, name='home'),
     path('dashboard/', views.dashboard, name='dashboard'),
+    # Prometheus scrape target
+    path('metrics', views.metrics, name='metrics'),
     # API endpoints
     path('api/v1/', include('inventory_app.urls')),
 ]
@@ -7,9 +7,8 @@ document.addEventListener('DOMContentLoaded', function() {
     setupNavigation();
     setupUpload();
     setupProductForm();
-    loadProducts();
-    loadImages();
-    loadAnalytics();
+    loadDashboard();
+    subscribeToEvents();
 });
 
 // Navigation
@@ -50,11 +49,50 @@ function switchSection(section) {
     document.getElementById('page-title').textContent = titles[section] || 'پنل مدیریت';
 }
 
+// Initial load: every section in one request (/dashboard/bootstrap)
+const sectionEtags = {};
+
+async function loadDashboard() {
+    try {
+        // Sections whose ETag we already hold come back as not_modified
+        const known = Object.entries(sectionEtags).map(([name, etag]) => `${name}:${etag}`).join(',');
+        const url = known
+            ? `${API_BASE}/dashboard/bootstrap?known=${encodeURIComponent(known)}`
+            : `${API_BASE}/dashboard/bootstrap`;
+        const response = await fetch(url);
+        const data = await response.json();
+        const renderers = {
+            'products': displayProducts,
+            'images': displayImages,
+            'analytics': displayAnalytics
+        };
+        Object.entries(renderers).forEach(([name, render]) => {
+            const section = data.sections[name];
+            if (section && !section.not_modified) {
+                sectionEtags[name] = section.etag;
+                render(section.data);
+            }
+        });
+    } catch (error) {
+        showToast('خطا در بارگذاری داشبورد', 'error');
+        console.error('Error loading dashboard:', error);
+    }
+}
+
 // Products Management
 async function loadProducts() {
     try {
-        const response = await fetch(`${API_BASE}/products`);
-        const products = await response.json();
+        // The list is keyset-paginated; follow X-Next-Cursor until exhausted
+        const products = [];
+        let cursor = null;
+        do {
+            const url = cursor
+                ? `${API_BASE}/products?limit=500&cursor=${encodeURIComponent(cursor)}`
+                : `${API_BASE}/products?limit=500`;
+            const response = await fetch(url);
+            products.push(...await response.json());
+            cursor = response.headers.get('X-Next-Cursor');
+        } while (cursor);
         displayProducts(products);
     } catch (error) {
         showToast('خطا در بارگذاری محصولات', 'error');
@@ -385,6 +423,33 @@ function displayAnalytics(data) {
     }
 }
 
+// Live updates pushed by the server (Server-Sent Events)
+function subscribeToEvents() {
+    if (!window.EventSource) {
+        return;
+    }
+    // The browser reconnects by itself and resumes after the last event id
+    const source = new EventSource(`${API_BASE}/events`);
+    const reloadSoon = debounce(loadDashboard, 1000);
+    
+    source.addEventListener('detection', function(e) {
+        const data = JSON.parse(e.data);
+        showToast(`تصویر ${data.image_id} پردازش شد: ${data.total_products} محصول`, 'info');
+        reloadSoon();
+    });
+    source.addEventListener('counts', reloadSoon);
+    // Events were missed; reload everything
+    source.addEventListener('reset', reloadSoon);
+}
+
+function debounce(func, wait) {
+    let timer = null;
+    return function() {
+        clearTimeout(timer);
+        timer = setTimeout(func, wait);
+    };
+}
+
 // Toast Notifications
 function showToast(message, type = 'info') {
     const container = document.getElementById('toast-container');